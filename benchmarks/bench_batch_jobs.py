@@ -0,0 +1,140 @@
+"""
+Benchmark: batch transcription jobs against a stand-in Whisper endpoint
+
+Usage:
+    python benchmarks/bench_batch_jobs.py [files] [workers] [server_ms]
+
+Submits a job of distinct clips through the jobs API and reports wall-clock
+time against the serial cost, job throughput, and the latency of a plain
+request served while the batch runs (the web tier must stay responsive).
+Then leaves a job half-done as a crashed worker would and checks that a
+fresh runner resumes it from the SQLite state, and that a file which crashes
+its worker every time ends up failed instead of being retried forever.
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+JOBS_DIR = tempfile.mkdtemp(prefix='whisper-jobs-')
+os.environ['WHISPER_JOBS_DIR'] = JOBS_DIR
+os.environ['WHISPER_BATCH_POLL'] = '0.2'
+os.environ['WHISPER_BATCH_STREAM_INTERVAL'] = '0.2'
+os.environ['OPENAI_API_KEY'] = 'sk-bench'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from flask import Flask
+from werkzeug.datastructures import FileStorage
+from bench_whisper_client import TranscriptionHandler, start_server
+from src.transcription.jobs import JobStore, BatchRunner, batch_runner, ITEM_RUNNING
+
+CLIP_BYTES = 32 * 1024
+
+
+def build_app():
+    from src.routes.transcription_jobs import jobs_bp
+    app = Flask('batch_bench')
+    app.register_blueprint(jobs_bp, url_prefix='/api/whisper')
+
+    @app.route('/ping')
+    def ping():
+        return {'ok': True}
+
+    return app
+
+
+def submit(client, count):
+    files = [(io.BytesIO(os.urandom(CLIP_BYTES)), f"consult-{n}.webm") for n in range(count)]
+    response = client.post('/api/whisper/jobs', data={'audio': files}, content_type='multipart/form-data')
+    assert response.status_code == 202, response.json
+    return response.json['job_id']
+
+
+def probe_while(client, running):
+    """Latency of a plain request while the batch is in flight"""
+    latencies = []
+    while running.is_set():
+        started = time.perf_counter()
+        client.get('/ping')
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.01)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    TranscriptionHandler.server_ms = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    server, base_url = start_server(None)
+    os.environ['OPENAI_BASE_URL'] = base_url
+    batch_runner.workers = workers
+
+    app = build_app()
+    client = app.test_client()
+    client.get('/ping')  # first request starts the runner
+
+    print(f"stand-in server: {base_url}, {files} clips, {workers} workers, {TranscriptionHandler.server_ms} ms per call")
+
+    started = time.perf_counter()
+    job_id = submit(client, files)
+    submitted = time.perf_counter() - started
+
+    running = threading.Event()
+    running.set()
+    probes = []
+    prober = threading.Thread(target=lambda: probes.extend(probe_while(app.test_client(), running)))
+    prober.start()
+
+    events = client.get(f'/api/whisper/jobs/{job_id}/stream').get_data(as_text=True)
+    elapsed = time.perf_counter() - started
+    running.clear()
+    prober.join()
+
+    job = client.get(f'/api/whisper/jobs/{job_id}?items=0').json
+    serial = files * TranscriptionHandler.server_ms / 1000
+    print(f"submit: {submitted * 1000:.0f} ms, job {job['status']}, {job['counts']['done']}/{job['total']} done, "
+          f"{events.count('event: item')} item events")
+    print(f"wall clock: {elapsed:.2f}s vs serial upstream time {serial:.2f}s ({serial / elapsed:.1f}x)")
+    print(f"throughput: {job['throughput']}")
+    if probes:
+        print(f"web tier during batch: {len(probes)} requests, p50 {probes[len(probes) // 2] * 1000:.2f} ms, "
+              f"p99 {probes[min(len(probes) - 1, int(len(probes) * 0.99))] * 1000:.2f} ms")
+
+    # Crash recovery: items claimed by a process that no longer exists get requeued
+    # Separate store so the running pool above cannot claim these first
+    store = JobStore(tempfile.mkdtemp(prefix='whisper-jobs-'))
+    uploads = [FileStorage(io.BytesIO(os.urandom(1024)), filename=f"recover-{n}.wav") for n in range(6)]
+    recover_id = store.create_job(uploads, 'nl', '')
+    for _ in range(3):
+        store.claim(owner=2 ** 22 + 1)  # beyond pid_max: never alive
+    assert store.job(recover_id)['counts'][ITEM_RUNNING] == 3
+    runner = BatchRunner(store, workers=2, poll_interval=0.1)
+    runner.start()
+    deadline = time.time() + 10
+    while store.job(recover_id, items=False)['status'] != 'completed' and time.time() < deadline:
+        time.sleep(0.05)
+    recovered = store.job(recover_id, items=False)
+    print(f"recovery: job {recovered['status']} with {recovered['counts']['done']}/6 done after restart")
+
+    # A file that kills its worker every time fails after max_attempts instead of looping
+    store = JobStore(tempfile.mkdtemp(prefix='whisper-jobs-'))
+    poison_id = store.create_job([FileStorage(io.BytesIO(os.urandom(1024)), filename='poison.wav')], 'nl', '')
+    crashes = 0
+    while store.claim(owner=2 ** 22 + 1) and crashes < 10:
+        crashes += 1
+        store.recover(lease=900, max_attempts=2)
+    poisoned = store.job(poison_id)
+    assert poisoned['status'] == 'failed' and crashes == 2, poisoned
+    print(f"poison file: job {poisoned['status']} after {crashes} crashed attempts ({poisoned['items'][0]['error']})")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Microbenchmark: full JSON decode vs fast-path routing of upstream Realtime events
+
+Usage:
+    python benchmarks/bench_event_router.py [recorded_events.jsonl]
+
+A recorded stream has one raw upstream frame per line. Without one, a
+synthetic stream is generated (mostly 100 ms audio deltas, like a spoken
+response, with the usual control events in between).
+"""
+
+import base64
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.realtime.event_router import AUDIO_DELTA, peek_event_type, extract_string
+
+
+def synthetic_stream(responses=50, deltas_per_response=40, delta_ms=100):
+    """Raw frames shaped like a gpt-4o-realtime response stream"""
+    rng = random.Random(42)
+    chunk = bytes(rng.getrandbits(8) for _ in range(int(24000 * delta_ms / 1000) * 2))
+    audio = base64.b64encode(chunk).decode('ascii')
+    frames = []
+    for r in range(responses):
+        response_id = f"resp_{r:06d}"
+        item_id = f"item_{r:06d}"
+        frames.append(json.dumps({"type": "input_audio_buffer.speech_stopped", "event_id": f"ev_{r}_a", "audio_end_ms": 1000 * r, "item_id": item_id}))
+        frames.append(json.dumps({"type": "response.created", "event_id": f"ev_{r}_b", "response": {"id": response_id, "object": "realtime.response", "status": "in_progress", "output": []}}))
+        for d in range(deltas_per_response):
+            frames.append(json.dumps({
+                "type": "response.audio.delta",
+                "event_id": f"ev_{r}_{d}",
+                "response_id": response_id,
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "delta": audio
+            }, separators=(',', ':')))
+        frames.append(json.dumps({"type": "response.audio.done", "event_id": f"ev_{r}_c", "response_id": response_id, "item_id": item_id}))
+        frames.append(json.dumps({"type": "response.done", "event_id": f"ev_{r}_d", "response": {"id": response_id, "status": "completed"}}))
+    return frames
+
+
+def current_path(frames):
+    """json.loads every frame, then re-wrap the delta (handle_event before the fast path)"""
+    emitted = 0
+    for message in frames:
+        event = json.loads(message)
+        if event.get('type') == AUDIO_DELTA:
+            payload = {'audio': event.get('delta')}
+            emitted += len(payload['audio'])
+    return emitted
+
+
+def fast_path(frames):
+    """Slice audio deltas out of the raw frame, full parse for everything else"""
+    emitted = 0
+    for message in frames:
+        if peek_event_type(message) == AUDIO_DELTA:
+            delta = extract_string(message, 'delta')
+            if delta is not None:
+                payload = {'audio': delta}
+                emitted += len(payload['audio'])
+                continue
+        event = json.loads(message)
+        if event.get('type') == AUDIO_DELTA:
+            payload = {'audio': event.get('delta')}
+            emitted += len(payload['audio'])
+    return emitted
+
+
+def measure(func, frames, repeat=5):
+    """Best wall-clock time over several runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(frames)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            frames = [line.rstrip('\n') for line in f if line.strip()]
+        source = sys.argv[1]
+    else:
+        frames = synthetic_stream()
+        source = 'synthetic'
+
+    if current_path(frames) != fast_path(frames):
+        raise SystemExit("Fast path forwarded different audio than the full decode")
+
+    total_bytes = sum(len(f) for f in frames)
+    deltas = sum(1 for f in frames if peek_event_type(f) == AUDIO_DELTA)
+
+    slow = measure(current_path, frames)
+    fast = measure(fast_path, frames)
+
+    print(f"stream: {source}, {len(frames)} events ({deltas} audio deltas), {total_bytes / 1e6:.1f} MB")
+    print(f"{'path':<14}{'total ms':>10}{'us/event':>10}{'MB/s':>10}")
+    for name, elapsed in (('json.loads', slow), ('fast path', fast)):
+        print(f"{name:<14}{elapsed * 1000:>10.1f}{elapsed / len(frames) * 1e6:>10.2f}{total_bytes / elapsed / 1e6:>10.0f}")
+    print(f"speedup: {slow / fast:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark: G.711 codec negotiation for realtime sessions
+
+Usage:
+    python benchmarks/bench_g711.py [seconds] [streams]
+
+Pushes `seconds` of synthetic voice through CodecBridge in 20 ms packets for
+each client/upstream codec combination, both directions (microphone to
+upstream, model audio to client), and reports the bytes per second on the
+client link and the upstream link (raw and as base64 JSON), the transcoding
+cost per packet scaled to `streams` concurrent sessions, and the SNR of what
+comes out against the 24 kHz original. The lookup tables are also checked
+against the stdlib audioop reference where it still exists (Python < 3.13).
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.realtime import codec
+from src.realtime.audio_transport import encode_append
+from src.realtime.resampler import StreamResampler
+
+PACKET_MS = 20
+COMBINATIONS = (
+    (codec.PCM16, codec.PCM16),
+    (codec.ULAW, codec.ULAW),
+    (codec.ALAW, codec.ALAW),
+    (codec.PCM16, codec.ULAW),
+    (codec.ULAW, codec.PCM16)
+)
+
+
+def voice(rate, seconds, rng):
+    """Harmonic voice with a syllable envelope, int16"""
+    t = np.arange(int(rate * seconds)) / rate
+    pitch = rng.uniform(110, 220)
+    signal = sum(np.sin(2 * np.pi * pitch * h * t) / h for h in range(1, 12) if pitch * h < 3400)
+    envelope = 0.3 + 0.7 * np.abs(np.sin(2 * np.pi * 2.5 * t))
+    return (signal * envelope * 6000).astype('<i2')
+
+
+def client_payload(samples_24k, client_codec):
+    """What the client sends: pcm16 at 24 kHz, or G.711 at 8 kHz"""
+    if client_codec == codec.PCM16:
+        return samples_24k.tobytes()
+    down = StreamResampler(codec.SAMPLE_RATE, codec.G711_RATE)
+    return codec.encode(down.process(samples_24k.tobytes()), client_codec)
+
+
+def upstream_payload(samples_24k, upstream_codec):
+    """What the model sends back in the upstream codec"""
+    if upstream_codec == codec.PCM16:
+        return samples_24k.tobytes()
+    down = StreamResampler(codec.SAMPLE_RATE, codec.G711_RATE)
+    return codec.encode(down.process(samples_24k.tobytes()), upstream_codec)
+
+
+def packets(data, bytes_per_second):
+    size = bytes_per_second * PACKET_MS // 1000
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def snr_db(reference, received):
+    """SNR after aligning for the resampler delay (best lag within 5 ms)"""
+    reference = reference.astype(np.float64)
+    received = received.astype(np.float64)
+    best = -np.inf
+    for lag in range(0, 120):
+        count = min(len(reference), len(received) - lag) - 240
+        a = reference[240:count]
+        b = received[240 + lag:count + lag]
+        best = max(best, 10 * np.log10(np.sum(a ** 2) / max(np.sum((a - b) ** 2), 1e-9)))
+    return best
+
+
+def run(client_codec, upstream_codec, samples, seconds):
+    bridge = codec.CodecBridge(client_codec, upstream_codec)
+    inbound = packets(client_payload(samples, client_codec), codec.bytes_per_second(client_codec))
+    model = packets(upstream_payload(samples, upstream_codec), codec.bytes_per_second(upstream_codec))
+
+    appended = []
+    started = time.perf_counter()
+    for packet in inbound:
+        appended.append(bridge.to_upstream(bridge.from_client(packet)))
+    up_seconds = time.perf_counter() - started
+
+    played = []
+    started = time.perf_counter()
+    for delta in model:
+        if bridge.passthrough:
+            bridge.count_passthrough(len(delta))
+            played.append(delta)
+        else:
+            played.append(bridge.to_client(bridge.from_upstream(delta)))
+    down_seconds = time.perf_counter() - started
+
+    # Appends and deltas are both base64 inside a small JSON envelope
+    json_bytes = sum(len(encode_append(payload)) for payload in appended + model)
+
+    heard = b''.join(played)
+    if client_codec != codec.PCM16:
+        up = StreamResampler(codec.G711_RATE, codec.SAMPLE_RATE)
+        heard = up.process(codec.decode(heard, client_codec))
+    quality = snr_db(samples, np.frombuffer(heard, '<i2'))
+
+    stats = bridge.stats
+    return {
+        'client': (stats['client_in'] + stats['client_out']) / seconds,
+        'upstream': (stats['upstream_in'] + stats['upstream_out']) / seconds,
+        'upstream_json': json_bytes / seconds,
+        'up_us': up_seconds / len(inbound) * 1e6,
+        'down_us': down_seconds / len(model) * 1e6,
+        'snr': quality
+    }
+
+
+def conformance():
+    try:
+        import warnings
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            import audioop
+    except ImportError:
+        return "audioop not available, skipped"
+    samples = np.arange(-32768, 32768, dtype='<i2').tobytes()
+    codes = bytes(range(256))
+    results = []
+    for name, lin2, tolin in ((codec.ULAW, audioop.lin2ulaw, audioop.ulaw2lin),
+                              (codec.ALAW, audioop.lin2alaw, audioop.alaw2lin)):
+        ok = codec.encode(samples, name) == lin2(samples, 2) and codec.decode(codes, name) == tolin(codes, 2)
+        results.append(f"{name} {'identical' if ok else 'MISMATCH'}")
+    return ", ".join(results) + " to audioop over all 65536 samples / 256 codes"
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    streams = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = np.random.default_rng(25)
+    samples = voice(codec.SAMPLE_RATE, seconds, rng)
+    codec.tables(codec.ULAW)
+    codec.tables(codec.ALAW)
+
+    print(f"{seconds:g} s of voice each way, {PACKET_MS} ms packets, cost scaled to {streams} sessions")
+    print(f"{'client -> upstream':<24}{'client kB/s':>12}{'upstream kB/s':>15}{'as JSON':>9}"
+          f"{'us/pkt up':>11}{'us/pkt down':>13}{f'cores @ {streams}':>12}{'SNR':>8}")
+    baseline = None
+    for client_codec, upstream_codec in COMBINATIONS:
+        result = run(client_codec, upstream_codec, samples, seconds)
+        baseline = baseline or result
+        snr = 'exact' if result['snr'] > 100 else f"{result['snr']:.1f}dB"
+        cores = (result['up_us'] + result['down_us']) * streams * (1000 / PACKET_MS) / 1e6
+        print(f"{f'{client_codec} -> {upstream_codec}':<24}{result['client'] / 1000:>12.1f}"
+              f"{result['upstream'] / 1000:>15.1f}{result['upstream_json'] / 1000:>9.1f}"
+              f"{result['up_us']:>11.1f}{result['down_us']:>13.1f}{cores:>12.2f}{snr:>8}"
+              f"  (client link {baseline['client'] / result['client']:.1f}x smaller)")
+
+    print(conformance())
+
+
+if __name__ == '__main__':
+    main()
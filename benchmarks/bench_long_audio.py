@@ -0,0 +1,125 @@
+"""
+Benchmark: one long Whisper call vs split-at-pauses parallel segments
+
+Usage:
+    python benchmarks/bench_long_audio.py [minutes] [ms_per_audio_second]
+
+Synthesizes a consultation-length 16 kHz WAV (tone bursts for speech, quiet
+room noise for pauses) and sends it to a local stand-in for
+/v1/audio/transcriptions whose latency grows with the audio duration, as
+Whisper's does. Reports the wall-clock time of a single upload against
+transcribe_long_audio at several concurrency levels, where the cuts landed
+relative to the pauses, and a check of the overlap de-duplication.
+"""
+
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+import wave
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_whisper_client import TranscriptionHandler, start_server
+from src.transcription import chunking
+from src.transcription.cache import transcription_cache
+from src.transcription.clients import get_openai_client
+
+RATE = 16000
+
+
+class DurationHandler(TranscriptionHandler):
+    """Latency proportional to the uploaded audio length"""
+
+    ms_per_audio_second = 3
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        time.sleep(length / (RATE * 2) * self.ms_per_audio_second / 1000)
+        body = json.dumps({'text': 'Ik heb pijn op de borst.'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def synth_consultation(minutes, seed=7):
+    """Alternating 4-15 s speech bursts and 0.4-2 s pauses; returns (wav bytes, pause midpoints in s)"""
+    rng = random.Random(seed)
+    samples = array('h')
+    pauses = []
+    total = int(minutes * 60 * RATE)
+    while len(samples) < total:
+        burst = int(rng.uniform(4, 15) * RATE)
+        freq = rng.uniform(120, 300)
+        step = 2 * math.pi * freq / RATE
+        samples.extend(int(6000 * math.sin(step * n)) for n in range(burst))
+        pause = int(rng.uniform(0.4, 2.0) * RATE)
+        pauses.append((len(samples) + pause / 2) / RATE)
+        # Low room noise
+        samples.extend(b - 128 for b in os.urandom(pause))
+    del samples[total:]
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue(), pauses
+
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    DurationHandler.ms_per_audio_second = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    started = time.perf_counter()
+    clip, pauses = synth_consultation(minutes)
+    print(f"synthesized {minutes:.0f} min ({len(clip) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+
+    server, base_url = start_server(None)
+    server.RequestHandlerClass = DurationHandler
+    client = get_openai_client('sk-bench', base_url)
+
+    started = time.perf_counter()
+    client.audio.transcriptions.create(model='whisper-1', file=('consult.wav', io.BytesIO(clip)), language='nl')
+    single = time.perf_counter() - started
+    print(f"{'single upload':<24}{single:>8.2f}s")
+
+    for concurrency in (1, 2, 4, 8):
+        chunking.CHUNK_CONCURRENCY = concurrency
+        transcription_cache.entries.clear()
+        stream = io.BytesIO(clip)
+        source = chunking.open_audio(stream, 'consult.wav')
+        result = chunking.transcribe_long_audio(client, source, 'consult.wav', 'nl', '')
+        timing = result['timing']
+        print(f"{f'{concurrency} parallel segments':<24}{timing['wall_seconds']:>8.2f}s  "
+              f"{len(result['segments'])} segments, {single / timing['wall_seconds']:.1f}x vs single")
+
+    # Cut quality: distance from each cut to the nearest pause midpoint
+    source = chunking.open_audio(io.BytesIO(clip), 'consult.wav')
+    plan = chunking.plan_segments(source)
+    overlap = chunking.CHUNK_OVERLAP
+    cuts = [(end / RATE) - overlap for _, end in plan[:-1]]
+    distances = sorted(min(abs(cut - pause) for pause in pauses) for cut in cuts)
+    print(f"cuts: {len(cuts)}, median distance to a pause midpoint {distances[len(distances) // 2]:.2f}s, "
+          f"max {distances[-1]:.2f}s")
+
+    stitched = chunking.stitch([
+        'De patiënt heeft sinds gisteren pijn op de borst',
+        'pijn op de borst die uitstraalt naar de linkerarm',
+        'linkerarm en is kortademig'
+    ])
+    expected = 'De patiënt heeft sinds gisteren pijn op de borst die uitstraalt naar de linkerarm en is kortademig'
+    print(f"stitch de-duplication: {'ok' if stitched == expected else 'MISMATCH: ' + stitched}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: upload normalization (downmix, 16 kHz resample, trim, re-encode)
+
+Usage:
+    python benchmarks/bench_normalize.py [uplink_kbit]
+
+Builds a corpus of synthetic consultation clips the way phones upload them
+(44.1/48 kHz, mono and stereo WAV, 5-60 s of voiced bursts between a few
+seconds of leading and trailing room noise) and runs each through
+normalize_upload. Reports bytes in/out, processing time and real-time factor
+per clip, the upload time saved on a slow uplink, a per-stage breakdown, and
+resampler quality (passband SNR, rejection above the new Nyquist).
+"""
+
+import io
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.transcription import normalize
+
+RATES = (44100, 48000)
+CHANNELS = (1, 2)
+DURATIONS = (5, 20, 60)
+
+
+def synth_clip(rate, channels, seconds, rng):
+    """Voiced bursts with a syllable envelope between leading/trailing room noise; WAV bytes"""
+    lead, tail = rng.uniform(1.0, 3.0), rng.uniform(1.5, 4.0)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = rng.uniform(110, 240)
+    voice = sum(np.sin(2 * np.pi * pitch * h * t) / h for h in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 3.5 * t), 0, None) * (np.sin(2 * np.pi * 0.2 * t) > -0.6)
+    speech = 0.25 * voice * envelope
+    noise = lambda n: rng.normal(0, 0.002, n)
+    mono = np.concatenate([noise(int(lead * rate)), speech + noise(len(speech)), noise(int(tail * rate))])
+    frames = np.repeat(mono[:, None], channels, axis=1)
+    if channels > 1:
+        frames[:, 1] *= 0.8  # slightly different level per mic
+    pcm = (np.clip(frames, -1, 1) * 32767).astype('<i2').tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue(), lead + seconds + tail
+
+
+def stage_breakdown(clip):
+    stream = io.BytesIO(clip)
+    timings = {}
+    started = time.perf_counter()
+    frames, rate = normalize.decode(stream, 'clip.wav')
+    timings['decode'] = time.perf_counter() - started
+    started = time.perf_counter()
+    mono = normalize.downmix(frames)
+    timings['downmix'] = time.perf_counter() - started
+    started = time.perf_counter()
+    resampled = normalize.resample(mono, rate)
+    timings['resample'] = time.perf_counter() - started
+    started = time.perf_counter()
+    trimmed = normalize.trim_silence(resampled, normalize.TARGET_RATE)
+    timings['trim'] = time.perf_counter() - started
+    started = time.perf_counter()
+    normalize.encode(trimmed)
+    timings['encode'] = time.perf_counter() - started
+    return timings
+
+
+def resampler_quality(rate):
+    t = np.arange(rate * 2) / rate
+    passband = np.sin(2 * np.pi * 1000 * t).astype(np.float32)
+    out = normalize.resample(passband, rate)
+    n = np.arange(len(out)) / normalize.TARGET_RATE
+    reference = np.sin(2 * np.pi * 1000 * n)
+    core = slice(200, len(out) - 200)
+    snr = 10 * np.log10(np.sum(reference[core] ** 2) / np.sum((out[core] - reference[core]) ** 2))
+
+    stopband = np.sin(2 * np.pi * 12000 * t).astype(np.float32)
+    leaked = normalize.resample(stopband, rate)[core]
+    rejection = -20 * np.log10(np.sqrt(np.mean(leaked ** 2)) / np.sqrt(0.5))
+    return snr, rejection
+
+
+def main():
+    uplink_kbit = float(sys.argv[1]) if len(sys.argv) > 1 else 256
+    rng = np.random.default_rng(22)
+    print(f"codec: {normalize.normalization_stats()['codec']}, uplink {uplink_kbit:.0f} kbit/s")
+    print(f"{'clip':<18}{'in KB':>9}{'out KB':>9}{'reduction':>11}{'ms':>8}{'RTF':>8}{'upload saved':>14}")
+
+    total_in = total_out = total_ms = total_audio = 0
+    for rate in RATES:
+        for channels in CHANNELS:
+            for seconds in DURATIONS:
+                clip, duration = synth_clip(rate, channels, seconds, rng)
+                _, _, stats = normalize.normalize_upload(io.BytesIO(clip), 'clip.wav')
+                saved = (stats['input_bytes'] - stats['output_bytes']) * 8 / (uplink_kbit * 1000)
+                name = f"{rate / 1000:g}k {'stereo' if channels == 2 else 'mono'} {seconds}s"
+                print(f"{name:<18}{stats['input_bytes'] / 1024:>9.0f}{stats['output_bytes'] / 1024:>9.0f}"
+                      f"{1 - stats['output_bytes'] / stats['input_bytes']:>10.1%}{stats['ms']:>8.1f}"
+                      f"{stats['ms'] / 1000 / duration:>8.4f}{saved:>13.1f}s")
+                total_in += stats['input_bytes']
+                total_out += stats['output_bytes']
+                total_ms += stats['ms']
+                total_audio += duration
+
+    print(f"total: {total_in / 1e6:.1f} MB -> {total_out / 1e6:.1f} MB ({1 - total_out / total_in:.1%} fewer bytes), "
+          f"{total_ms:.0f} ms for {total_audio:.0f} s of audio (RTF {total_ms / 1000 / total_audio:.4f})")
+
+    clip, _ = synth_clip(48000, 2, 60, rng)
+    stages = stage_breakdown(clip)
+    print("stages (48k stereo 60 s): " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in stages.items()))
+
+    for rate in RATES:
+        snr, rejection = resampler_quality(rate)
+        print(f"resampler {rate} -> 16000: 1 kHz SNR {snr:.1f} dB, 12 kHz rejection {rejection:.1f} dB")
+
+
+if __name__ == '__main__':
+    main()
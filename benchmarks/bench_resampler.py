@@ -0,0 +1,104 @@
+"""
+Benchmark: streaming realtime resampler at browser capture rates
+
+Usage:
+    python benchmarks/bench_resampler.py [streams] [seconds]
+
+Runs `streams` StreamResampler sessions round-robin, one 20 ms PCM16 packet
+each per turn (the way send_audio sees them), for 48, 44.1, 16 and 8 kHz
+input to the session's 24 kHz. Reports the cost per packet, the real-time
+factor, how many streams one core sustains and what the requested number of
+streams costs in cores. Also checks that chunking doesn't change the output
+(random chunk sizes including odd byte counts against a single call) and the
+filter quality (1 kHz SNR, rejection of a tone 4 kHz above the lower Nyquist).
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.realtime.resampler import StreamResampler
+
+RATES = (48000, 44100, 16000, 8000)
+TARGET = 24000
+PACKET_MS = 20
+
+
+def tone(rate, seconds, freq, level=8000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (level * np.sin(2 * np.pi * freq * t)).astype('<i2')
+
+
+def throughput(rate, streams, seconds, rng):
+    packet = rate * PACKET_MS // 1000
+    audio = np.clip(rng.normal(0, 3000, rate * 2), -32768, 32767).astype('<i2').tobytes()
+    packets = [audio[i:i + packet * 2] for i in range(0, len(audio), packet * 2)]
+    sessions = [StreamResampler(rate, TARGET) for _ in range(streams)]
+    rounds = int(seconds * 1000 / PACKET_MS)
+
+    started = time.perf_counter()
+    for index in range(rounds):
+        chunk = packets[index % len(packets)]
+        for session in sessions:
+            session.process(chunk)
+    elapsed = time.perf_counter() - started
+    return elapsed / (rounds * streams)
+
+
+def chunking_difference(rate, rng):
+    """Largest sample difference between chunked and single-call output"""
+    audio = np.clip(rng.normal(0, 6000, rate * 5), -32768, 32767).astype('<i2').tobytes()
+    whole = np.frombuffer(StreamResampler(rate, TARGET).process(audio), '<i2').astype(np.int32)
+    session = StreamResampler(rate, TARGET)
+    parts = []
+    position = 0
+    while position < len(audio):
+        size = int(rng.integers(1, 3000))
+        parts.append(session.process(audio[position:position + size]))
+        position += size
+    chunked = np.frombuffer(b''.join(parts), '<i2').astype(np.int32)
+    return int(np.abs(chunked - whole[:len(chunked)]).max())
+
+
+def quality(rate):
+    out = np.frombuffer(StreamResampler(rate, TARGET).process(tone(rate, 2, 1000).tobytes()), '<i2')
+    n = np.arange(len(out))
+    core = slice(200, len(out) - 200)
+    # The filter delays the output by half its length; fit the reference phase instead of assuming it
+    basis = np.stack([np.sin(2 * np.pi * 1000 * n / TARGET), np.cos(2 * np.pi * 1000 * n / TARGET)], axis=1)
+    coefficients = np.linalg.lstsq(basis[core], out[core], rcond=None)[0]
+    reference = basis @ coefficients
+    snr = 10 * np.log10(np.sum(reference[core] ** 2) / np.sum((out[core] - reference[core]) ** 2))
+
+    stop = min(rate, TARGET) * 0.5 + 4000
+    if stop >= rate / 2:
+        return snr, None
+    leaked = np.frombuffer(StreamResampler(rate, TARGET).process(tone(rate, 2, stop).tobytes()), '<i2')[core]
+    rejection = 20 * np.log10((8000 / np.sqrt(2)) / max(np.sqrt(np.mean(leaked.astype(np.float64) ** 2)), 1e-9))
+    return snr, rejection
+
+
+def main():
+    streams = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+    rng = np.random.default_rng(24)
+    budget = PACKET_MS / 1000
+
+    print(f"{streams} streams, {seconds:g} s of audio each, {PACKET_MS} ms packets -> {TARGET} Hz")
+    print(f"{'input':<10}{'us/packet':>11}{'RTF':>10}{'streams/core':>14}{f'cores @ {streams}':>13}"
+          f"{'chunk diff':>12}{'1k SNR':>9}{'reject':>9}")
+    for rate in RATES:
+        per_packet = throughput(rate, streams, seconds, rng)
+        difference = chunking_difference(rate, rng)
+        snr, rejection = quality(rate)
+        print(f"{f'{rate / 1000:g} kHz':<10}{per_packet * 1e6:>11.1f}{per_packet / budget:>10.5f}"
+              f"{budget / per_packet:>14.0f}{per_packet * streams / budget:>13.2f}"
+              f"{f'{difference} LSB':>12}{snr:>8.1f}dB"
+              f"{(f'{rejection:.1f}dB' if rejection is not None else '-'):>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: realtime silence gate on a synthetic consultation
+
+Usage:
+    python benchmarks/bench_silence_gate.py [minutes] [streams]
+
+Generates 24 kHz PCM16 microphone audio: utterances that start with a quiet
+fricative (noise burst) and continue voiced, separated by 1-8 s thinking
+pauses over room noise. Feeds it through SilenceGate in 20 ms packets for
+both VAD settings in the tree (main.py 200 ms, realtime_proxy.py 500 ms) and
+reports kept/dropped audio-seconds, speech recall, whether every onset kept
+its pre-roll, whether every utterance was followed by at least the VAD
+silence, and the CPU cost per packet scaled to concurrent streams.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.realtime.silence_gate import SilenceGate, FRAME_MS
+
+RATE = 24000
+FRAME = RATE * FRAME_MS // 1000
+
+
+def synth_consultation(minutes, rng):
+    """(pcm16 bytes, [(onset_frame, end_frame)]) on a 20 ms frame grid"""
+    total = int(minutes * 60 * 1000 / FRAME_MS)
+    audio = rng.normal(0, 40, total * FRAME)  # room noise
+    utterances = []
+    position = int(rng.integers(25, 100))
+    while position < total - 300:
+        fricative = int(rng.integers(3, 8))
+        voiced = int(rng.integers(40, 250))
+        start = position * FRAME
+        audio[start:start + fricative * FRAME] += rng.normal(0, 220, fricative * FRAME)
+        t = np.arange(voiced * FRAME) / RATE
+        pitch = rng.uniform(100, 250)
+        envelope = 0.4 + 0.6 * np.abs(np.sin(2 * np.pi * 3 * t))
+        voice = sum(np.sin(2 * np.pi * pitch * h * t) / h for h in range(1, 6)) * 2500 * envelope
+        audio[start + fricative * FRAME:start + (fricative + voiced) * FRAME] += voice
+        utterances.append((position, position + fricative + voiced))
+        position += fricative + voiced + int(rng.integers(50, 400))
+    return np.clip(audio, -32768, 32767).astype('<i2').tobytes(), utterances, total
+
+
+def run(pcm, total, vad_ms):
+    gate = SilenceGate(vad_ms, sample_rate=RATE)
+    forwarded = np.zeros(total, bool)
+    frame_bytes = FRAME * 2
+    started = time.perf_counter()
+    for index in range(total):
+        out = gate.process(pcm[index * frame_bytes:(index + 1) * frame_bytes])
+        count = len(out) // frame_bytes
+        if count:
+            # Pre-roll frames are the ones right before this packet
+            forwarded[index - count + 1:index + 1] = True
+    elapsed = time.perf_counter() - started
+    return gate, forwarded, elapsed
+
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    streams = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = np.random.default_rng(23)
+    pcm, utterances, total = synth_consultation(minutes, rng)
+    speech = np.zeros(total, bool)
+    for onset, end in utterances:
+        speech[onset:end] = True
+    print(f"{minutes:g} min, {len(utterances)} utterances, {speech.mean():.0%} speech")
+
+    for vad_ms in (200, 500):
+        gate, forwarded, elapsed = run(pcm, total, vad_ms)
+        stats = gate.snapshot()
+        recall = forwarded[speech].mean()
+        preroll_frames = gate.preroll.maxlen
+        onsets_ok = sum(forwarded[max(0, onset - preroll_frames):onset].all() for onset, _ in utterances)
+        needed = -(-vad_ms // FRAME_MS)
+        tails_ok = sum(forwarded[end:end + needed].all() for _, end in utterances)
+        per_packet_us = elapsed / total * 1e6
+        cores = per_packet_us * streams * (1000 / FRAME_MS) / 1e6
+
+        print(f"\nVAD silence {vad_ms} ms (hangover {stats['hangover_ms']} ms, pre-roll {stats['preroll_ms']} ms)")
+        print(f"  kept {stats['kept_seconds']:.1f}s, dropped {stats['dropped_seconds']:.1f}s "
+              f"({stats['dropped_ratio']:.0%} fewer upstream audio-seconds), {stats['openings']} openings")
+        print(f"  speech recall {recall:.2%}, onsets with full pre-roll {onsets_ok}/{len(utterances)}, "
+              f"utterances followed by >= {vad_ms} ms silence {tails_ok}/{len(utterances)}")
+        print(f"  {per_packet_us:.1f} us per 20 ms packet -> {cores:.2f} cores for {streams} streams")
+
+
+if __name__ == '__main__':
+    main()
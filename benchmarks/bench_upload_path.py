@@ -0,0 +1,99 @@
+"""
+Benchmark: tempfile round-trip vs in-memory upload path for transcriptions
+
+Usage:
+    python benchmarks/bench_upload_path.py [iterations]
+
+Posts clips of increasing size through a Flask test client to two endpoints
+that do everything transcribe_audio does locally before the network call:
+the old path (default request class, save to NamedTemporaryFile, reopen,
+read, unlink) and the new one (SpooledUploadRequest, stream handed over as
+is). The upstream client is stood in for by a reader draining the stream in
+64 KB blocks, like httpx's multipart encoder.
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+from flask import Flask, request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.transcription.uploads import SpooledUploadRequest, UPLOAD_MEMORY_LIMIT, upload_payload, upload_in_memory
+
+SIZES = [16 * 1024, 128 * 1024, 512 * 1024, 2 * 1024 * 1024, 8 * 1024 * 1024, 16 * 1024 * 1024]
+
+
+def drain(stream):
+    """What the HTTP client does with the file part"""
+    total = 0
+    while True:
+        block = stream.read(65536)
+        if not block:
+            return total
+        total += len(block)
+
+
+def tempfile_app():
+    app = Flask('tempfile_path')
+
+    @app.route('/transcribe', methods=['POST'])
+    def transcribe():
+        file = request.files['audio']
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
+            file.save(temp_file.name)
+            temp_file_path = temp_file.name
+        try:
+            with open(temp_file_path, 'rb') as audio_file:
+                return {'bytes': drain(audio_file), 'memory': False}
+        finally:
+            os.unlink(temp_file_path)
+
+    return app
+
+
+def memory_app():
+    app = Flask('memory_path')
+    app.request_class = SpooledUploadRequest
+
+    @app.route('/transcribe', methods=['POST'])
+    def transcribe():
+        file = request.files['audio']
+        _, stream = upload_payload(file)
+        return {'bytes': drain(stream), 'memory': upload_in_memory(file)}
+
+    return app
+
+
+def measure(app, clip, iterations):
+    client = app.test_client()
+    timings = []
+    memory = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = client.post('/transcribe', data={'audio': (io.BytesIO(clip), 'clip.webm')},
+                               content_type='multipart/form-data')
+        timings.append(time.perf_counter() - started)
+        assert response.json['bytes'] == len(clip)
+        memory = response.json['memory']
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, memory
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    apps = (tempfile_app(), memory_app())
+
+    print(f"memory threshold: {UPLOAD_MEMORY_LIMIT // 1024} KB, median of {iterations} requests")
+    print(f"{'clip':>10}{'tempfile ms':>14}{'in-memory ms':>15}{'speedup':>10}  path")
+    for size in SIZES:
+        clip = os.urandom(size)
+        old_ms, _ = measure(apps[0], clip, iterations)
+        new_ms, in_memory = measure(apps[1], clip, iterations)
+        print(f"{size // 1024:>8}KB{old_ms:>14.3f}{new_ms:>15.3f}{old_ms / new_ms:>9.1f}x  {'memory' if in_memory else 'spooled'}")
+
+
+if __name__ == '__main__':
+    main()
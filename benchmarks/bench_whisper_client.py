@@ -0,0 +1,153 @@
+"""
+Benchmark: OpenAI client per request vs the shared pooled client
+
+Usage:
+    python benchmarks/bench_whisper_client.py [requests] [threads] [--no-tls]
+
+Runs a local stand-in for /v1/audio/transcriptions (HTTPS with a throwaway
+self-signed certificate when openssl is available) and sends the same clip
+through both client strategies: a fresh OpenAI client per request, as
+transcribe_audio used to do, and get_openai_client's keep-alive pool.
+Reports requests/sec and p50/p99 latency for each.
+"""
+
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.transcription.clients import get_openai_client, close_clients
+
+API_KEY = 'sk-bench'
+CLIP = b'RIFF' + os.urandom(32 * 1024)  # ~1 s of 16 kHz pcm16
+
+
+class TranscriptionHandler(BaseHTTPRequestHandler):
+    """Answers every transcription request with a fixed transcript"""
+
+    protocol_version = 'HTTP/1.1'
+    server_ms = 5
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        time.sleep(self.server_ms / 1000)
+        body = json.dumps({'text': 'Ik heb pijn op de borst.'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def self_signed_cert(directory):
+    """Certificate/key pair for 127.0.0.1, or None without openssl"""
+    if not shutil.which('openssl'):
+        return None
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-keyout', key, '-out', cert, '-subj', '/CN=127.0.0.1',
+        '-addext', 'subjectAltName=IP:127.0.0.1'
+    ], check=True, capture_output=True)
+    return cert, key
+
+
+def start_server(tls_files):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TranscriptionHandler)
+    server.daemon_threads = True
+    scheme = 'http'
+    if tls_files:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*tls_files)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def transcribe(client):
+    return client.audio.transcriptions.create(model='whisper-1', file=('clip.wav', CLIP), language='nl').text
+
+
+def per_request_client(base_url):
+    """Old behaviour: a new client (and connection pool) per transcription"""
+    def call():
+        client = OpenAI(api_key=API_KEY, base_url=base_url, http_client=httpx.Client())
+        try:
+            return transcribe(client)
+        finally:
+            client.close()
+    return call
+
+
+def pooled_client(base_url):
+    def call():
+        return transcribe(get_openai_client(API_KEY, base_url))
+    return call
+
+
+def run(call, requests, threads):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        call()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    # Warm-up outside the measurement
+    call()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(requests)))
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    return requests / total, p50, p99
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    requests = int(args[0]) if args else 400
+    threads = int(args[1]) if len(args) > 1 else 8
+    use_tls = '--no-tls' not in sys.argv
+
+    with tempfile.TemporaryDirectory() as directory:
+        tls_files = self_signed_cert(directory) if use_tls else None
+        if tls_files:
+            # httpx picks this up for both client strategies
+            os.environ['SSL_CERT_FILE'] = tls_files[0]
+        server, base_url = start_server(tls_files)
+
+        print(f"stand-in server: {base_url}, {requests} requests, {threads} threads, clip {len(CLIP) // 1024} KB")
+        print(f"{'strategy':<22}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, factory in (('client per request', per_request_client), ('pooled client', pooled_client)):
+            rps, p50, p99 = run(factory(base_url), requests, threads)
+            print(f"{name:<22}{rps:>10.1f}{p50:>10.1f}{p99:>10.1f}")
+
+        close_clients()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
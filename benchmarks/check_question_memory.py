@@ -0,0 +1,60 @@
+"""
+Check: QuestionMemory maps paraphrases, not near-misses, onto canonical questions
+
+Usage:
+    python benchmarks/check_question_memory.py
+
+Runs assistant sentences against the proxy's own question phases. Paraphrases
+must land on their canonical question; sentences that only share one topic
+word with a canonical question (a near-miss) must not be recorded as asked.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.realtime.question_memory import QuestionMemory
+from src.routes.realtime_proxy import OpenAIRealtimeProxy
+
+# sentence -> expected question ID, or None for "not a canonical question"
+CASES = {
+    "Kunt u uw klachten eens beschrijven?": 'initial:1',
+    "Gebruikt u medicijnen?": 'medical_history:1',
+    "Heeft u eerder problemen met uw hart gehad?": 'medical_history:0',
+    "Wat maakt de pijn erger?": 'triggers:0',
+    "Ervaart u stress op uw werk?": 'lifestyle:3',
+    "Ervaart u hartkloppingen?": 'symptoms:5',
+    # Near-misses: one shared topic word, different question
+    "Heeft u last van hoofdpijn?": None,
+    "Heeft u last van misselijkheid?": None
+}
+
+# Near-misses that must at least stay off the question they resemble
+NOT = {
+    "Kunt u de pijn beschrijven?": 'initial:1'
+}
+
+
+def main():
+    phases = OpenAIRealtimeProxy('test-key').question_phases
+    memory = QuestionMemory(phases)
+
+    checks = {}
+    for sentence, expected in CASES.items():
+        matched = memory.match(sentence)
+        checks[f"{sentence} -> {expected}"] = matched == expected
+        print(f"{sentence!r}: {matched}")
+    for sentence, avoided in NOT.items():
+        matched = memory.match(sentence)
+        checks[f"{sentence} not {avoided}"] = matched != avoided
+        print(f"{sentence!r}: {matched}")
+
+    for name, ok in checks.items():
+        print(f"  [{'ok' if ok else 'FAIL'}] {name}")
+    ok = all(checks.values())
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Fault injection: upstream drops mid-response, client reconnects and replays
+
+Usage:
+    python benchmarks/fault_injection_reconnect.py
+
+Starts a local fake Realtime server and points OpenAIRealtimeClient at it.
+The first upstream connection is aborted in the middle of a response, the
+next handshake is refused with HTTP 503, the one after that succeeds. Audio
+sent while the upstream is gone must arrive on the new session, after the
+session.update and the replayed conversation items.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault('REALTIME_RECONNECT_BASE', '0.05')
+os.environ.setdefault('REALTIME_RECONNECT_CAP', '0.5')
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.main as app_main
+from src.realtime.metrics import metrics
+
+CHUNK_BYTES = 4800  # 100 ms of pcm16 at 24 kHz
+
+
+class FakeRealtimeServer:
+    """Speaks just enough of the Realtime protocol; injects faults per connection"""
+
+    def __init__(self):
+        self.handshakes = 0
+        self.connections = []
+        self.port = None
+        self.loop = None
+        self.ready = threading.Event()
+
+    def process_request(self, path, headers):
+        self.handshakes += 1
+        if self.handshakes == 2:
+            # Second handshake hits an "overloaded" upstream
+            return 503, [], b'overloaded\n'
+        return None
+
+    async def handler(self, websocket, path=None):
+        index = len(self.connections)
+        received = []
+        self.connections.append(received)
+        await websocket.send(json.dumps({"type": "session.created", "session": {"id": f"sess_{index}"}}))
+        try:
+            async for raw in websocket:
+                event = json.loads(raw)
+                received.append(event)
+                if event['type'] == 'response.create':
+                    await self.respond(websocket, index, drop=(index == 0))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def respond(self, websocket, index, drop):
+        response_id = f"resp_{index}"
+        await websocket.send(json.dumps({"type": "response.created", "response": {"id": response_id}}))
+        delta = base64.b64encode(b'\x00\x01' * 1200).decode('ascii')
+        for _ in range(5):
+            await websocket.send(json.dumps({"type": "response.audio.delta", "response_id": response_id, "delta": delta}))
+            await asyncio.sleep(0.01)
+        if drop:
+            # No close frame: the connection just disappears mid-response
+            websocket.transport.abort()
+            return
+        await websocket.send(json.dumps({"type": "response.audio.done", "response_id": response_id}))
+        await websocket.send(json.dumps({"type": "response.audio_transcript.done", "transcript": "Sinds wanneer heeft u deze klachten?"}))
+        await websocket.send(json.dumps({"type": "response.done", "response": {"id": response_id}}))
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        async def serve():
+            server = await websockets.serve(self.handler, '127.0.0.1', 0, process_request=self.process_request)
+            self.port = server.sockets[0].getsockname()[1]
+            self.ready.set()
+            await asyncio.Future()
+
+        self.loop.run_until_complete(serve())
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        self.ready.wait(5)
+
+
+class EmitRecorder:
+    """Replaces socketio.emit so the script sees what the browser would"""
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, data=None, room=None, **kwargs):
+        self.events.append((event, data))
+
+    def names(self):
+        return [name for name, _ in self.events]
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def appended_audio(events):
+    return b''.join(base64.b64decode(e['audio']) for e in events if e['type'] == 'input_audio_buffer.append')
+
+
+def main():
+    server = FakeRealtimeServer()
+    server.start()
+    app_main.REALTIME_URL = f"ws://127.0.0.1:{server.port}"
+    recorder = EmitRecorder()
+    app_main.socketio.emit = recorder
+
+    client = app_main.OpenAIRealtimeClient('sk-test', 'fault-sid')
+    client.conversation_history = [
+        {'role': 'assistant', 'content': 'Wat is uw belangrijkste hartklacht?', 'timestamp': ''},
+        {'role': 'user', 'content': 'Ik heb pijn op de borst bij het traplopen.', 'timestamp': ''}
+    ]
+    client.medical_data['symptoms'].append('pijn')
+
+    loop = app_main.get_upstream_loop()
+    assert loop.submit(client.connect()).result(timeout=10), 'initial connect failed'
+
+    before = b'\x11\x11' * (CHUNK_BYTES // 2)
+    for _ in range(5):
+        client.send_audio(before)
+    client.commit_audio()
+
+    # Connection 0 aborts mid-response; the client notices and starts reconnecting
+    dropped = wait_for(lambda: client.reconnecting)
+
+    # Patient keeps talking through the gap
+    during = b'\x22\x22' * (CHUNK_BYTES // 2)
+    acks = [client.send_audio(during) for _ in range(10)]
+
+    reconnected = wait_for(lambda: 'realtime_reconnected' in recorder.names() and client.ready)
+    client.commit_audio()
+    answered = wait_for(lambda: len(server.connections) > 1 and any(e['type'] == 'response.create' for e in server.connections[-1]))
+    wait_for(lambda: client.conversation_history[-1]['content'].startswith('Sinds'), timeout=3)
+
+    fresh = server.connections[-1] if len(server.connections) > 1 else []
+    types = [e['type'] for e in fresh]
+    first_append = types.index('input_audio_buffer.append') if 'input_audio_buffer.append' in types else -1
+    replayed = [e for e in fresh if e['type'] == 'conversation.item.create']
+    replay_before_audio = bool(replayed) and first_append > types.index('conversation.item.create')
+    gap_audio = appended_audio(fresh).count(b'\x22\x22') * 2
+
+    checks = {
+        'upstream dropped mid-response': dropped,
+        'reconnected': reconnected,
+        'refused handshake was retried': server.handshakes >= 3,
+        'session.update first on new upstream': bool(types) and types[0] == 'session.update',
+        'history replayed before audio': replay_before_audio,
+        'medical data in replay': 'symptomen: pijn' in json.dumps(replayed, ensure_ascii=False),
+        'gap audio buffered, not rejected': all(ack.get('accepted') for ack in acks),
+        'gap audio delivered': gap_audio == len(during) * 10,
+        'response after reconnect': answered,
+        'reconnect counted': metrics.get('upstream_reconnects') == 1
+    }
+
+    print(f"handshakes: {server.handshakes}, upstream connections: {len(server.connections)}")
+    print(f"replayed items: {len(replayed)}, gap audio delivered: {gap_audio} bytes")
+    print(f"client events: {', '.join(n for n in recorder.names() if n != 'audio_delta')}")
+    print(f"reconnect latency: {metrics.latency().get('reconnect')}")
+    for name, ok in checks.items():
+        print(f"  [{'ok' if ok else 'FAIL'}] {name}")
+
+    loop.submit(client.disconnect()).result(timeout=5)
+    ok = all(checks.values())
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+Load test: many concurrent proxy sessions stay isolated in the session registry
+
+Usage:
+    python benchmarks/load_session_registry.py [sessions] [frames_per_session]
+
+Every session gets a fake upstream socket and streams audio tagged with its
+own index from a pool of handler threads (the way Socket.IO workers call in),
+while upstream audio deltas for all sessions are injected on the shared loop
+and a share of the clients disconnect and reconnect mid-run. Afterwards each
+upstream must hold only its own session's audio and text, each Socket.IO room
+only its own deltas, and the registry must refuse sessions beyond capacity.
+A second, smaller run goes through the real Socket.IO handlers (init_socketio)
+with test clients against a local fake upstream: connect_realtime, send_audio,
+commit_audio and disconnect must leave no session or upstream socket behind.
+"""
+
+import base64
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import websockets
+from flask import Flask
+from flask_socketio import SocketIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.routes.realtime_proxy as realtime_proxy
+from src.realtime.upstream_loop import get_upstream_loop
+from src.realtime.send_queue import SendQueue
+from src.realtime.coalescer import AudioCoalescer
+from src.realtime.registry import SessionRegistry
+from src.routes.realtime_proxy import OpenAIRealtimeProxy, init_socketio, proxy_sessions
+
+FRAME_BYTES = 960  # 20 ms of pcm16 at 24 kHz
+
+
+class FakeSocketIO:
+    """Collects emits per room"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rooms = defaultdict(list)
+
+    def emit(self, event, data=None, room=None):
+        with self.lock:
+            self.rooms[room].append((event, data))
+
+
+class FakeUpstream:
+    """Stands in for the OpenAI websocket; records every frame sent"""
+
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+
+    async def send(self, message):
+        self.frames.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+def tag(index):
+    return struct.pack('<H', index)
+
+
+def sid_for(index):
+    return f"sid-{index:05d}"
+
+
+def open_session(registry, socketio, index):
+    """Register a proxy for one sid and wire it to a fake upstream"""
+    sid = sid_for(index)
+    proxy = OpenAIRealtimeProxy('sk-test', socketio, client_sid=sid)
+    upstream = FakeUpstream()
+
+    async def wire():
+        proxy.openai_ws = upstream
+        send_queue = SendQueue(sid)
+        send_queue.start(upstream.send)
+        proxy.coalescer = AudioCoalescer(send_queue.put_audio)
+        proxy.send_queue = send_queue
+
+    get_upstream_loop().submit(wire()).result(timeout=5)
+    with registry.lock_for(sid):
+        accepted, _ = registry.add(sid, proxy)
+    if not accepted:
+        get_upstream_loop().submit(proxy.disconnect()).result(timeout=5)
+        return None, None
+    return proxy, upstream
+
+
+def client_worker(registry, index, frames, reconnect):
+    """One client's traffic, as handler threads would deliver it"""
+    sid = sid_for(index)
+    chunk = base64.b64encode(tag(index) * (FRAME_BYTES // 2)).decode('ascii')
+    for n in range(frames):
+        proxy = registry.get(sid)
+        if proxy is None or not proxy.send_queue:
+            continue
+        with registry.lock_for(sid):
+            proxy.send_audio_to_openai(chunk)
+            if n % 25 == 24:
+                proxy.commit_audio_and_respond()
+            if n == frames // 2:
+                proxy.send_text_to_openai(f"tekst van {sid}")
+        if reconnect and n == frames // 3:
+            with registry.lock_for(sid):
+                registry.remove(sid)
+            return 'reconnect'
+    return 'done'
+
+
+def inject_deltas(registry, rounds):
+    """Upstream audio deltas for every live session, delivered on the loop"""
+    loop = get_upstream_loop()
+    for _ in range(rounds):
+        futures = []
+        for sid, proxy in registry.items():
+            index = int(sid.split('-')[1])
+            frame = json.dumps({
+                "type": "response.audio.delta",
+                "response_id": "resp_1",
+                "item_id": "item_1",
+                "delta": base64.b64encode(tag(index) * 1200).decode('ascii')
+            })
+            futures.append(loop.submit(proxy.handle_openai_message(frame)))
+        for future in futures:
+            future.result(timeout=10)
+
+
+def wait_drained(registry, proxies, timeout=30):
+    deadline = time.time() + timeout
+    # Proxies replaced by a reconnect were torn down; their queues never drain again
+    proxies = [p for p in proxies if registry.get(p.client_sid) is p]
+    for proxy in proxies:
+        if proxy.coalescer:
+            proxy.coalescer.flush()
+    while time.time() < deadline:
+        if all(not p.send_queue or p.send_queue.status()['queued'] == 0 for p in proxies):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def check_upstream(index, upstream):
+    """All audio/text on an upstream must belong to its session"""
+    expected = tag(index)
+    sid = sid_for(index)
+    errors = 0
+    audio_bytes = 0
+    for raw in upstream.frames:
+        event = json.loads(raw)
+        if event['type'] == 'input_audio_buffer.append':
+            pcm = base64.b64decode(event['audio'])
+            audio_bytes += len(pcm)
+            if pcm != expected * (len(pcm) // 2):
+                errors += 1
+        elif event['type'] == 'conversation.item.create':
+            if event['item']['content'][0]['text'] != f"tekst van {sid}":
+                errors += 1
+    return errors, audio_bytes
+
+
+def check_room(index, emits):
+    expected = tag(index)
+    errors = 0
+    for event, data in emits:
+        if event == 'audio_delta':
+            pcm = base64.b64decode(data['audio'])
+            if pcm != expected * (len(pcm) // 2):
+                errors += 1
+    return errors
+
+
+class FakeRealtimeServer:
+    """Local websocket upstream for the handler run; records each connection's frames"""
+
+    def __init__(self):
+        self.connections = []
+        self.server = None
+
+    async def handler(self, websocket, path=None):
+        connection = {'frames': [], 'closed': False}
+        self.connections.append(connection)
+        try:
+            async for message in websocket:
+                connection['frames'].append(message)
+        except websockets.ConnectionClosed:
+            pass
+        connection['closed'] = True
+
+    def start(self):
+        async def serve():
+            self.server = await websockets.serve(self.handler, '127.0.0.1', 0)
+            return self.server.sockets[0].getsockname()[1]
+        return get_upstream_loop().submit(serve()).result(timeout=5)
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def handler_run(clients, frames):
+    """connect_realtime / send_audio / commit_audio / disconnect through init_socketio"""
+    server = FakeRealtimeServer()
+    realtime_proxy.REALTIME_URL = f"ws://127.0.0.1:{server.start()}"
+    app = Flask('load_handlers')
+    socketio = SocketIO(app, async_mode='threading')
+    init_socketio(socketio)
+
+    sockets = [socketio.test_client(app) for _ in range(clients)]
+    for client in sockets:
+        client.emit('connect_realtime', {'api_key': 'sk-test'})
+    connected = wait_for(lambda: len(proxy_sessions) == clients
+                         and all(proxy.send_queue for _, proxy in proxy_sessions.items()))
+
+    def talk(index):
+        client = sockets[index]
+        chunk = base64.b64encode(tag(index) * (FRAME_BYTES // 2)).decode('ascii')
+        acks = [client.emit('send_audio', {'audio': chunk}, callback=True) for _ in range(frames)]
+        client.emit('commit_audio', callback=True)
+        client.disconnect()
+        return all(ack and ack.get('accepted') for ack in acks)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        accepted = all(pool.map(talk, range(clients)))
+
+    closed = wait_for(lambda: len(server.connections) == clients and all(c['closed'] for c in server.connections))
+    cross_talk = 0
+    for connection in server.connections:
+        tags = set()
+        for raw in connection['frames']:
+            event = json.loads(raw)
+            if event['type'] == 'input_audio_buffer.append':
+                pcm = base64.b64decode(event['audio'])
+                tags.update(pcm[i:i + 2] for i in range(0, len(pcm), 2))
+        # Exactly one tag: audio arrived, and only this client's
+        cross_talk += len(tags) != 1
+
+    print(f"handler run:          {clients} test clients, connected {connected}, acks accepted {accepted}")
+    print(f"handler cleanup:      {len(proxy_sessions)} sessions left, upstreams closed {closed}, cross-talk {cross_talk}")
+    return connected and accepted and closed and not cross_talk and len(proxy_sessions) == 0
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    loop = get_upstream_loop()
+    loop.start()
+    socketio = FakeSocketIO()
+    registry = SessionRegistry('load-test', capacity=sessions)
+    registry.on_remove.append(lambda sid, proxy: loop.submit(proxy.disconnect()))
+
+    upstreams = {}
+    proxies = []
+    for index in range(sessions):
+        proxy, upstream = open_session(registry, socketio, index)
+        upstreams[index] = upstream
+        proxies.append(proxy)
+
+    # Capacity is enforced: one more sid is refused
+    overflow, _ = open_session(registry, socketio, sessions)
+
+    rng = random.Random(7)
+    reconnecting = set(rng.sample(range(sessions), max(1, sessions // 10)))
+
+    started = time.perf_counter()
+    injector = threading.Thread(target=inject_deltas, args=(registry, 5))
+    injector.start()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(
+            lambda i: client_worker(registry, i, frames, i in reconnecting),
+            range(sessions)
+        ))
+    injector.join()
+
+    # Reconnected clients come back on the same sid with a fresh upstream
+    for index in reconnecting:
+        proxy, upstream = open_session(registry, socketio, index)
+        upstreams[index] = upstream
+        proxies.append(proxy)
+        client_worker(registry, index, frames // 4, False)
+    drained = wait_drained(registry, proxies)
+    elapsed = time.perf_counter() - started
+
+    upstream_errors = 0
+    room_errors = 0
+    total_audio = 0
+    for index, upstream in upstreams.items():
+        errors, audio_bytes = check_upstream(index, upstream)
+        upstream_errors += errors
+        total_audio += audio_bytes
+        room_errors += check_room(index, socketio.rooms.get(sid_for(index), []))
+    stray_rooms = [room for room in socketio.rooms if room is None or room not in {sid_for(i) for i in range(sessions)}]
+
+    stats = registry.snapshot()
+    print(f"sessions:             {sessions} ({len(reconnecting)} reconnected mid-run)")
+    print(f"elapsed:              {elapsed:.2f} s, upstream audio {total_audio / 1e6:.1f} MB")
+    print(f"queues drained:       {drained}")
+    print(f"overflow rejected:    {overflow is None}")
+    print(f"upstream cross-talk:  {upstream_errors}")
+    print(f"room cross-talk:      {room_errors}")
+    print(f"stray rooms:          {len(stray_rooms)}")
+    print(f"registry:             {stats}")
+
+    for sid, _ in registry.items():
+        registry.remove(sid)
+    time.sleep(0.2)
+
+    handlers_ok = handler_run(min(sessions, 20), min(frames, 50))
+    loop.stop()
+
+    ok = drained and overflow is None and not upstream_errors and not room_errors and not stray_rooms and handlers_ok
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
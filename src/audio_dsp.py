@@ -0,0 +1,55 @@
+"""
+Shared DSP helpers for realtime and upload audio
+Kept outside the realtime and transcription packages so neither has to
+import the other for a signal-level or a resampling filter
+"""
+
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FILTER_TAPS = 32
+FILTER_PHASES = 256
+
+_filter_banks = {}
+
+
+def speech_rms(pcm, stride=4):
+    """RMS of PCM16 audio, sampling every stride-th sample"""
+    usable = len(pcm) - len(pcm) % 2
+    if not usable:
+        return 0
+    samples = array('h', pcm[:usable])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    samples = samples[::stride]
+    if not samples:
+        return 0
+    return int((sum(s * s for s in samples) / len(samples)) ** 0.5)
+
+
+def _blackman(distance, half):
+    window = 0.42 + 0.5 * np.cos(np.pi * distance / half) + 0.08 * np.cos(2 * np.pi * distance / half)
+    return np.where(np.abs(distance) < half, window, 0.0)
+
+
+def filter_bank(src_rate, dst_rate, taps=FILTER_TAPS, phases=FILTER_PHASES):
+    """Windowed-sinc lowpass sampled at `phases` fractional offsets: (bank[phases, taps], tap offsets)"""
+    key = (src_rate, dst_rate, taps, phases)
+    cached = _filter_banks.get(key)
+    if cached is not None:
+        return cached
+    half = taps // 2
+    # Cut off just below the lower Nyquist so nothing above it folds back
+    cutoff = min(1.0, dst_rate / src_rate) * 0.95
+    offsets = np.arange(-half + 1, half + 1)
+    distance = offsets[None, :] - (np.arange(phases) / phases)[:, None]
+    bank = cutoff * np.sinc(cutoff * distance) * _blackman(distance, half)
+    # Unity gain at DC for every phase
+    bank /= bank.sum(axis=1, keepdims=True)
+    cached = _filter_banks[key] = (bank.astype(np.float32), offsets)
+    return cached
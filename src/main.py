@@ -2,15 +2,38 @@ import os
 import sys
 import json
 import asyncio
+import binascii
 import logging
-import base64
+import threading
+import time
 import websockets
 from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-import threading
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.realtime.upstream_loop import get_upstream_loop
+from src.realtime.send_queue import SendQueue
+from src.realtime.coalescer import AudioCoalescer, SAMPLE_RATE
+from src.realtime.metrics import metrics
+from src.realtime.audio_transport import decode_client_audio, encode_client_audio, encode_client_pcm
+from src.realtime.audio_pacer import AudioPacer
+from src.realtime.playback import PlaybackTracker
+from src.realtime.turns import TurnManager
+from src.realtime.instructions import InstructionSync, render_medical_instructions
+from src.realtime.event_router import AUDIO_DELTA, peek_event_type, extract_string
+from src.realtime.registry import SessionRegistry
+from src.realtime.lifecycle import SessionLifecycle
+from src.realtime.connection_pool import UpstreamPool
+from src.realtime.preconnect import PreConnectBuffer
+from src.realtime.reconnect import Backoff, build_replay_items
+from src.audio_dsp import speech_rms
+from src.realtime.hibernation import WAKE_RMS, pack_state, unpack_state
+from src.realtime.silence_gate import SilenceGate, GATE_ENABLED, gate_available
+from src.realtime.resampler import parse_sample_rate
+from src.realtime.codec import CodecBridge, PCM16, parse_codec, bridge_available, bandwidth_by_codec
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,17 +49,159 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__, static_folder='static', template_folder='static')
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 CORS(app, origins="*")
-socketio = SocketIO(app, cors_allowed_origins="*", logger=True, engineio_logger=True)
+# Threading mode: emits come from the upstream loop's OS thread, which eventlet (in
+# requirements, auto-selected otherwise) doesn't allow without monkey-patching
+socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*", logger=True, engineio_logger=True)
 
 # Global state
-active_connections = {}
+active_connections = SessionRegistry('realtime')
+
+def run_upstream(coro, sid, label):
+    """Submit a coroutine to the upstream loop and report failures to the client"""
+    future = get_upstream_loop().submit(coro)
+    
+    def on_done(fut):
+        if fut.cancelled():
+            return
+        error = fut.exception()
+        if error:
+            logger.error(f"Error in upstream {label.lower()} for socket {sid}: {error}")
+            socketio.emit('realtime_error', {
+                'message': f'{label} error: {str(error)}'
+            }, room=sid)
+    
+    future.add_done_callback(on_done)
+    return future
+
+REALTIME_URL = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01"
+
+# Server-managed key for patients connecting without their own key (and for the
+# pre-warm pool). Off unless REALTIME_SERVER_KEY=1: otherwise any browser could
+# open sessions billed to OPENAI_API_KEY
+SERVER_API_KEY = os.environ.get('OPENAI_API_KEY') if os.environ.get('REALTIME_SERVER_KEY', '0') == '1' else None
+
+# Server VAD ends a turn after this much silence; the silence gate's hangover must outlast it
+VAD_SILENCE_MS = 200
+
+def build_session_config(instructions, codec=PCM16):
+    """session.update for a medical consultation"""
+    return {
+        "type": "session.update",
+        "session": {
+            "modalities": ["text", "audio"],
+            "instructions": instructions,
+            "voice": "alloy",
+            "input_audio_format": codec,
+            "output_audio_format": codec,
+            "input_audio_transcription": {
+                "model": "whisper-1"
+            },
+            "turn_detection": {
+                "type": "server_vad",
+                "threshold": 0.5,
+                "prefix_padding_ms": 300,
+                "silence_duration_ms": VAD_SILENCE_MS
+            },
+            "tools": [],
+            "tool_choice": "auto",
+            "temperature": 0.8,
+            "max_response_output_tokens": 4096
+        }
+    }
+
+async def open_upstream(api_key):
+    """Open an upstream Realtime websocket"""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "OpenAI-Beta": "realtime=v1"
+    }
+    return await websockets.connect(REALTIME_URL, extra_headers=headers)
+
+async def open_pooled_upstream():
+    """Connected and configured session for the pool, ready for a new consultation"""
+    websocket = await open_upstream(SERVER_API_KEY)
+    instructions = render_medical_instructions('hoofdklacht')
+    try:
+        await websocket.send(json.dumps(build_session_config(instructions)))
+    except Exception:
+        await websocket.close()
+        raise
+    return websocket, instructions
+
+# Pre-warmed sessions for the server key (REALTIME_SERVER_KEY=1 and REALTIME_POOL_MIN > 0 enable it)
+upstream_pool = UpstreamPool(open_pooled_upstream)
+if SERVER_API_KEY and upstream_pool.enabled:
+    upstream_pool.start()
+
+# Upstream events showing the patient or the model is talking
+VOICE_EVENTS = frozenset((
+    'input_audio_buffer.speech_started',
+    'input_audio_buffer.speech_stopped',
+    'response.created',
+    'response.done'
+))
+
+def teardown_client(sid, client):
+    """Close the upstream of a session leaving the registry"""
+    run_upstream(client.disconnect(), sid, 'Disconnect')
+
+def notify_reaped(sid, client, reason):
+    """Tell a (possibly still present) browser why its session was closed"""
+    socketio.emit('realtime_closed', {
+        'reason': reason,
+        'message': 'Verbinding gesloten wegens inactiviteit' if reason == 'idle' else 'Verbinding verbroken'
+    }, room=sid)
+
+active_connections.on_remove.append(teardown_client)
+
+# Idle and orphaned sessions are reaped so upstream sockets don't leak
+lifecycle = SessionLifecycle(
+    active_connections,
+    is_connected=lambda sid: socketio.server.manager.is_connected(sid, '/')
+)
+lifecycle.on_reap.append(notify_reaped)
 
 class OpenAIRealtimeClient:
-    def __init__(self, api_key, socket_id):
+    def __init__(self, api_key, socket_id, binary_audio=False, silence_gate=False, sample_rate=SAMPLE_RATE,
+                 codec=PCM16):
         self.api_key = api_key
         self.socket_id = socket_id
+        self.binary_audio = binary_audio
+        # Client and upstream codecs; everything in between is PCM16 at codec.rate
+        self.codec = CodecBridge(codec, client_rate=sample_rate)
+        rate = self.codec.rate
+        # Optional: silence between utterances stays off the (billed) upstream
+        self.gate = SilenceGate(VAD_SILENCE_MS, sample_rate=rate) if silence_gate and gate_available() else None
         self.websocket = None
+        self.listener_task = None
+        self.send_queue = SendQueue(socket_id, encode_audio=self.codec.to_upstream)
+        self.coalescer = AudioCoalescer(self.send_queue.put_audio, sample_rate=rate)
+        self.pacer = AudioPacer(self.emit_audio, bytes_per_ms=self.codec.bytes_per_ms)
+        self.playback = PlaybackTracker(bytes_per_ms=self.codec.bytes_per_ms)
+        # configure_session enables server_vad
+        self.turns = TurnManager(socket_id, server_vad=True)
+        self.instructions = InstructionSync(socket_id)
+        self.active_response_id = None
+        self.suppress_audio = False
         self.connected = False
+        # Audio is held in early_audio until the session is configured
+        self.connecting = True
+        self.ready = False
+        self.commit_pending = False
+        self.early_audio = PreConnectBuffer(sample_rate=rate)
+        self.capture_lock = threading.Lock()
+        # Dropped upstreams are re-opened unless the session is being closed
+        self.closing = False
+        self.reconnecting = False
+        self.reconnect_task = None
+        # Silent sessions give up their upstream; state waits in a compressed snapshot
+        self.hibernated = False
+        self.hibernation_snapshot = None
+        self.preroll = PreConnectBuffer(max_ms=int(os.environ.get('REALTIME_HIBERNATE_PREROLL_MS', 300)), sample_rate=rate,
+                                        metric_prefix='hibernation_preroll')
+        self.created_at = time.monotonic()
+        self.last_activity = self.created_at
+        self.last_voice = self.created_at
         self.conversation_history = []
         self.current_phase = 'hoofdklacht'
         self.questions_asked = 0
@@ -62,32 +227,78 @@ class OpenAIRealtimeClient:
         
         logger.info(f"OpenAI Realtime Client initialized for socket {socket_id}")
     
-    async def connect(self):
-        """Connect to OpenAI Realtime API"""
+    async def connect(self, pool=None):
+        """Connect to OpenAI Realtime API, taking a pre-warmed session from pool when one is ready"""
         try:
-            url = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "OpenAI-Beta": "realtime=v1"
-            }
+            started = time.perf_counter()
+            pooled = await pool.acquire() if pool else None
+            if self.closing:
+                # disconnect() ran while we waited; the warm session stays in the pool
+                if pooled:
+                    pool.release(pooled)
+                return False
             
-            logger.info(f"Connecting to OpenAI Realtime API for socket {self.socket_id}")
+            if pooled:
+                logger.info(f"Using pre-warmed OpenAI Realtime session for socket {self.socket_id}")
+                self.websocket = pooled.websocket
+                self.connected = True
+                
+                # The pool already sent session.update with these instructions
+                self.instructions.reset()
+                self.instructions.changed(pooled.instructions)
+            else:
+                logger.info(f"Connecting to OpenAI Realtime API for socket {self.socket_id}")
+                
+                websocket = await open_upstream(self.api_key)
+                if self.closing:
+                    # disconnect() already ran and can't have closed this one
+                    await websocket.close()
+                    logger.info(f"Socket {self.socket_id} closed while connecting, dropped the new upstream")
+                    return False
+                self.websocket = websocket
+                self.connected = True
+                
+                # Configure session
+                await self.configure_session()
+                if self.closing:
+                    # disconnect() took over the websocket while session.update was in flight
+                    return False
             
-            self.websocket = await websockets.connect(url, extra_headers=headers)
-            self.connected = True
+            # Single writer keeps outbound messages ordered
+            self.send_queue.start(self.websocket.send)
+            if pooled:
+                self.sync_instructions()
+                if self.codec.upstream_codec != PCM16:
+                    # Pre-warmed sessions are configured for pcm16
+                    self.send_queue.put_event({
+                        "type": "session.update",
+                        "session": {
+                            "input_audio_format": self.codec.upstream_codec,
+                            "output_audio_format": self.codec.upstream_codec
+                        }
+                    })
             
-            # Configure session
-            await self.configure_session()
+            # session.update is out; what the patient already said follows it
+            flushed_ms = self.open_for_audio()
             
-            # Start listening for events
-            asyncio.create_task(self.listen_for_events())
+            # Start listening for events on the upstream loop
+            self.listener_task = asyncio.create_task(self.listen_for_events())
             
-            logger.info(f"Successfully connected to OpenAI Realtime API for socket {self.socket_id}")
+            latency = time.perf_counter() - started
+            metrics.observe('connect_pooled' if pooled else 'connect_cold', latency)
+            logger.info(f"Successfully connected to OpenAI Realtime API for socket {self.socket_id} in {latency * 1000:.0f} ms")
             
             # Notify client of successful connection
             socketio.emit('realtime_connected', {
                 'status': 'connected',
                 'phase': self.current_phase,
+                'binary_audio': self.binary_audio,
+                'pooled': bool(pooled),
+                'buffered_ms': flushed_ms,
+                'silence_gate': self.gate is not None,
+                'sample_rate': self.codec.client_rate,
+                'codec': self.codec.client_codec,
+                'upstream_codec': self.codec.upstream_codec,
                 'message': 'Succesvol verbonden met OpenAI Realtime API'
             }, room=self.socket_id)
             
@@ -95,38 +306,112 @@ class OpenAIRealtimeClient:
             
         except Exception as e:
             logger.error(f"Failed to connect to OpenAI Realtime API: {e}")
+            # Leaves the session to the reaper as upstream_lost
+            self.connected = False
+            with self.capture_lock:
+                self.connecting = False
+                self.early_audio.clear()
             socketio.emit('realtime_error', {
                 'message': f'Verbindingsfout: {str(e)}'
             }, room=self.socket_id)
             return False
     
+    def open_for_audio(self):
+        """Flush audio captured while connecting, then let new audio pass straight through"""
+        with self.capture_lock:
+            flushed_ms = self.early_audio.buffered_ms()
+            for chunk in self.early_audio.drain():
+                self.coalescer.push(chunk)
+            self.ready = True
+            self.connecting = False
+            self.last_voice = time.monotonic()
+            commit_pending, self.commit_pending = self.commit_pending, False
+        
+        if flushed_ms:
+            logger.info(f"Flushed {flushed_ms} ms of early audio for socket {self.socket_id}")
+        if commit_pending:
+            self.commit_audio()
+        return flushed_ms
+    
+    def touch(self):
+        """Record patient or response activity (idle reaping)"""
+        self.last_activity = time.monotonic()
+    
+    def touch_voice(self):
+        """Record speech or a response in progress (hibernation)"""
+        self.last_voice = time.monotonic()
+    
+    async def hibernate(self):
+        """Close the upstream while the patient is silent; the consultation is kept as a snapshot"""
+        with self.capture_lock:
+            if not self.ready or self.closing or self.active_response_id or self.hibernated:
+                return False
+            
+            self.ready = False
+            self.connected = False
+            self.hibernated = True
+            
+            # Only silence is pending at this point
+            self.coalescer.clear()
+            self.send_queue.take_audio()
+            self.preroll.clear()
+            
+            self.hibernation_snapshot = pack_state({
+                'history': self.conversation_history,
+                'phase': self.current_phase,
+                'questions_asked': self.questions_asked,
+                'medical_data': self.medical_data
+            })
+            self.conversation_history = []
+        
+        self.pacer.clear()
+        self.playback.reset()
+        self.turns.reset()
+        
+        websocket, self.websocket = self.websocket, None
+        if self.listener_task:
+            self.listener_task.cancel()
+        self.listener_task = None
+        await self.send_queue.stop()
+        if websocket:
+            await websocket.close()
+        
+        metrics.incr('sessions_hibernated')
+        metrics.incr('hibernation_snapshot_bytes', len(self.hibernation_snapshot))
+        logger.info(f"Hibernated socket {self.socket_id} ({len(self.hibernation_snapshot)} byte snapshot)")
+        socketio.emit('realtime_hibernated', {'phase': self.current_phase}, room=self.socket_id)
+        return True
+    
+    def wake(self, audio):
+        """Patient speaks to a hibernated session; caller holds capture_lock"""
+        state = unpack_state(self.hibernation_snapshot)
+        self.conversation_history = state['history']
+        self.current_phase = state['phase']
+        self.questions_asked = state['questions_asked']
+        self.medical_data = state['medical_data']
+        self.hibernation_snapshot = None
+        
+        # The pre-roll gives server VAD the onset of the utterance
+        for chunk in self.preroll.drain():
+            self.early_audio.push(chunk)
+        status = self.early_audio.push(audio)
+        
+        self.hibernated = False
+        self.connecting = True
+        self.reconnecting = True
+        self.touch_voice()
+        get_upstream_loop().submit(self.reconnect(resume=True))
+        return dict(status, resuming=True)
+    
     async def configure_session(self):
         """Configure the Realtime session"""
         try:
+            instructions = self.get_medical_instructions()
+            self.instructions.reset()
+            self.instructions.changed(instructions)
+            
             # Session configuration
-            session_config = {
-                "type": "session.update",
-                "session": {
-                    "modalities": ["text", "audio"],
-                    "instructions": self.get_medical_instructions(),
-                    "voice": "alloy",
-                    "input_audio_format": "pcm16",
-                    "output_audio_format": "pcm16",
-                    "input_audio_transcription": {
-                        "model": "whisper-1"
-                    },
-                    "turn_detection": {
-                        "type": "server_vad",
-                        "threshold": 0.5,
-                        "prefix_padding_ms": 300,
-                        "silence_duration_ms": 200
-                    },
-                    "tools": [],
-                    "tool_choice": "auto",
-                    "temperature": 0.8,
-                    "max_response_output_tokens": 4096
-                }
-            }
+            session_config = build_session_config(instructions, self.codec.upstream_codec)
             
             await self.websocket.send(json.dumps(session_config))
             logger.info(f"Session configured for socket {self.socket_id}")
@@ -136,39 +421,33 @@ class OpenAIRealtimeClient:
             raise
     
     def get_medical_instructions(self):
-        """Get medical conversation instructions"""
-        return f"""Je bent een Nederlandse AI cardioloog die een systematische anamnese afneemt. 
-
-HUIDIGE FASE: {self.current_phase}
-VRAGEN GESTELD: {self.questions_asked}
-
-INSTRUCTIES:
-1. Spreek alleen Nederlands
-2. Stel één vraag per keer
-3. Luister aandachtig naar het antwoord
-4. Stel relevante vervolgvragen gebaseerd op het antwoord
-5. Voorkom herhaalde vragen - onthoud wat al is gevraagd
-6. Ga systematisch door de cardiologische anamnese
-
-FASES:
-- hoofdklacht: Wat is de hoofdklacht? Wanneer begon het?
-- symptomen: Pijn op borst, kortademigheid, hartkloppingen, duizeligheid
-- triggers: Wat maakt het erger/beter? Inspanning, rust, stress?
-- voorgeschiedenis: Eerdere hartproblemen, operaties, ziekenhuis opnames
-- medicatie: Huidige medicijnen, allergieën, bijwerkingen
-- familie: Familie geschiedenis van hartproblemen
-- leefstijl: Roken, alcohol, beweging, voeding
-
-Begin met een warme begroeting en de eerste vraag over de hoofdklacht.
-Houd de vragen kort en duidelijk.
-Toon empathie en begrip.
-"""
+        """Get medical conversation instructions (memoized per phase, shared across sessions)"""
+        return render_medical_instructions(self.current_phase)
+    
+    def sync_instructions(self):
+        """Queue a session.update only when the rendered instructions changed"""
+        instructions = self.get_medical_instructions()
+        if self.instructions.changed(instructions):
+            self.send_queue.put_event({
+                "type": "session.update",
+                "session": {
+                    "instructions": instructions
+                }
+            })
     
     async def listen_for_events(self):
         """Listen for events from OpenAI Realtime API"""
+        websocket = self.websocket
         try:
-            async for message in self.websocket:
+            async for message in websocket:
                 try:
+                    # Fast path: audio deltas are forwarded without decoding the frame
+                    if peek_event_type(message) == AUDIO_DELTA:
+                        audio_data = extract_string(message, 'delta')
+                        if audio_data is not None:
+                            self.handle_audio_delta(audio_data)
+                            continue
+                    
                     event = json.loads(message)
                     await self.handle_event(event)
                 except json.JSONDecodeError as e:
@@ -176,12 +455,127 @@ Toon empathie en begrip.
                 except Exception as e:
                     logger.error(f"Error handling event: {e}")
                     
-        except websockets.exceptions.ConnectionClosed:
-            logger.info(f"WebSocket connection closed for socket {self.socket_id}")
-            self.connected = False
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.info(f"WebSocket connection closed for socket {self.socket_id}: {e}")
         except Exception as e:
             logger.error(f"Error in event listener: {e}")
+        
+        if websocket is self.websocket:
+            self.upstream_lost()
+    
+    def upstream_lost(self):
+        """The upstream went away under us; keep capturing audio and reconnect"""
+        with self.capture_lock:
             self.connected = False
+            self.ready = False
+            if self.closing:
+                return
+            
+            # Audio that never made it upstream is replayed on the new session
+            self.coalescer.flush()
+            for chunk in self.send_queue.take_audio():
+                self.early_audio.push(chunk)
+            self.connecting = True
+            self.reconnecting = True
+        
+        metrics.incr('upstream_drops')
+        self.reconnect_task = asyncio.create_task(self.reconnect())
+    
+    async def reconnect(self, resume=False):
+        """Re-open the upstream with jittered backoff and replay the consultation
+        
+        resume=True wakes a hibernated session: its first attempt goes out without delay.
+        """
+        started = time.perf_counter()
+        backoff = Backoff()
+        self.reconnect_task = asyncio.current_task()
+        
+        old_websocket, self.websocket = self.websocket, None
+        await self.send_queue.stop()
+        if old_websocket:
+            await old_websocket.close()
+        
+        # The interrupted response is gone with the old session
+        self.pacer.finish()
+        if self.active_response_id:
+            socketio.emit('audio_done', {}, room=self.socket_id)
+        self.active_response_id = None
+        self.suppress_audio = False
+        self.playback.reset()
+        self.turns.reset()
+        
+        attempts = 0
+        while not self.closing:
+            if resume and not attempts:
+                delay = 0.0
+            else:
+                delay = backoff.next_delay()
+                if delay is None:
+                    break
+                socketio.emit('realtime_reconnecting', {
+                    'attempt': attempts + 1,
+                    'delay_ms': int(delay * 1000),
+                    'message': 'Verbinding wordt hersteld...'
+                }, room=self.socket_id)
+            attempts += 1
+            
+            if delay:
+                await asyncio.sleep(delay)
+            if self.closing:
+                return False
+            
+            try:
+                websocket = await open_upstream(self.api_key)
+            except Exception as e:
+                logger.warning(f"Reconnect attempt {attempts} failed for socket {self.socket_id}: {e}")
+                continue
+            
+            try:
+                self.websocket = websocket
+                self.connected = True
+                await self.configure_session()
+                
+                # Rebuild the conversation before any new audio reaches the session
+                replay = build_replay_items(self.conversation_history, self.medical_data, self.current_phase)
+                for item in replay:
+                    await websocket.send(json.dumps(item))
+            except Exception as e:
+                logger.warning(f"Replay after reconnect failed for socket {self.socket_id}: {e}")
+                self.connected = False
+                self.websocket = None
+                await websocket.close()
+                continue
+            
+            self.send_queue.start(websocket.send)
+            flushed_ms = self.open_for_audio()
+            self.listener_task = asyncio.create_task(self.listen_for_events())
+            self.reconnecting = False
+            
+            latency = time.perf_counter() - started
+            metrics.incr('upstream_resumes' if resume else 'upstream_reconnects')
+            metrics.observe('resume' if resume else 'reconnect', latency)
+            logger.info(f"{'Resumed' if resume else 'Reconnected'} socket {self.socket_id} after {attempts} attempt(s), replayed {len(replay)} items")
+            
+            socketio.emit('realtime_resumed' if resume else 'realtime_reconnected', {
+                'attempts': attempts,
+                'replayed_items': len(replay),
+                'buffered_ms': flushed_ms,
+                'phase': self.current_phase
+            }, room=self.socket_id)
+            return True
+        
+        # Out of attempts (or closing); the reaper cleans up the session
+        with self.capture_lock:
+            self.connecting = False
+            self.early_audio.clear()
+        self.reconnecting = False
+        if not self.closing:
+            metrics.incr('upstream_reconnect_failures')
+            logger.error(f"Giving up reconnecting socket {self.socket_id}")
+            socketio.emit('realtime_error', {
+                'message': 'Verbinding met OpenAI verloren, start het consult opnieuw'
+            }, room=self.socket_id)
+        return False
     
     async def handle_event(self, event):
         """Handle events from OpenAI Realtime API"""
@@ -189,6 +583,11 @@ Toon empathie en begrip.
         
         logger.info(f"Received event: {event_type} for socket {self.socket_id}")
         
+        self.touch()
+        if event_type in VOICE_EVENTS:
+            self.touch_voice()
+        self.turns.on_event(event_type, event)
+        
         if event_type == 'session.created':
             logger.info(f"Session created for socket {self.socket_id}")
             
@@ -220,21 +619,43 @@ Toon empathie en begrip.
                             'total_phases': len(self.phases)
                         }, room=self.socket_id)
             
+        elif event_type == 'response.created':
+            self.active_response_id = event.get('response', {}).get('id')
+            self.suppress_audio = False
+            
+        elif event_type == 'response.output_item.added':
+            item = event.get('item', {})
+            if item.get('type') == 'message':
+                self.playback.start_item(item.get('id'))
+            
+        elif event_type == 'response.done':
+            self.active_response_id = None
+            
+        elif event_type == 'response.audio_transcript.done':
+            # Spoken answers only exist as transcripts; needed to replay the consultation
+            transcript = event.get('transcript', '')
+            if transcript:
+                self.conversation_history.append({
+                    'role': 'assistant',
+                    'content': transcript,
+                    'timestamp': datetime.now().isoformat()
+                })
+            
         elif event_type == 'response.audio.delta':
-            # Stream audio to client
-            audio_data = event.get('delta')
-            if audio_data:
-                socketio.emit('audio_delta', {
-                    'audio': audio_data
-                }, room=self.socket_id)
+            self.handle_audio_delta(event.get('delta'))
                 
         elif event_type == 'response.audio.done':
+            # Remaining paced audio goes out before the done marker
+            self.pacer.finish()
             socketio.emit('audio_done', {}, room=self.socket_id)
             
         elif event_type == 'input_audio_buffer.speech_started':
+            self.handle_barge_in()
             socketio.emit('speech_started', {}, room=self.socket_id)
             
         elif event_type == 'input_audio_buffer.speech_stopped':
+            # Don't hold the tail of the utterance back in a partial frame
+            self.coalescer.flush()
             socketio.emit('speech_stopped', {}, room=self.socket_id)
             
         elif event_type == 'conversation.item.input_audio_transcription.completed':
@@ -250,12 +671,85 @@ Toon empathie en begrip.
                 self.extract_medical_info(transcript)
                 
         elif event_type == 'error':
+            if event.get('error', {}).get('code') == 'response_cancel_not_active':
+                # Server VAD already cancelled the response we interrupted
+                return
             error_message = event.get('error', {}).get('message', 'Unknown error')
             logger.error(f"OpenAI API error: {error_message}")
             socketio.emit('realtime_error', {
                 'message': f'OpenAI fout: {error_message}'
             }, room=self.socket_id)
     
+    def handle_audio_delta(self, audio_data):
+        """Stream an upstream audio delta to the client"""
+        if not audio_data:
+            return
+        
+        if self.suppress_audio:
+            # Tail of a response the patient interrupted
+            metrics.incr('interrupted_audio_deltas')
+            return
+        
+        if self.pacer.enabled:
+            self.pacer.push(self.codec.from_upstream(binascii.a2b_base64(audio_data)))
+        elif self.codec.passthrough:
+            size = len(audio_data) * 3 // 4 - audio_data[-2:].count('=')
+            self.codec.count_passthrough(size)
+            self.playback.sent(self.codec.pipeline_bytes(size))
+            socketio.emit('audio_delta', {
+                'audio': encode_client_audio(audio_data, self.binary_audio)
+            }, room=self.socket_id)
+        else:
+            self.emit_audio(self.codec.from_upstream(binascii.a2b_base64(audio_data)))
+    
+    def emit_audio(self, pcm):
+        """Send a merged audio chunk to the client in its codec"""
+        self.playback.sent(len(pcm))
+        audio = self.codec.to_client(pcm)
+        if not audio:
+            return
+        socketio.emit('audio_delta', {
+            'audio': encode_client_pcm(audio, self.binary_audio)
+        }, room=self.socket_id)
+    
+    def handle_barge_in(self):
+        """Cancel the response the patient is talking over and drop its queued audio"""
+        responding = self.active_response_id is not None
+        playing = self.playback.is_playing()
+        if not responding and not playing:
+            return
+        
+        played_ms = self.playback.played_ms()
+        events = []
+        
+        if responding:
+            events.append({"type": "response.cancel"})
+            self.suppress_audio = True
+            metrics.incr('responses_cancelled')
+        
+        if self.playback.item_id and played_ms < int(self.playback.sent_ms):
+            # Keep the conversation in line with what the patient actually heard
+            events.append({
+                "type": "conversation.item.truncate",
+                "item_id": self.playback.item_id,
+                "content_index": 0,
+                "audio_end_ms": played_ms
+            })
+        
+        if events:
+            # One urgent batch so the cancel still goes out before the truncate
+            self.send_queue.put_events(events, urgent=True)
+        
+        dropped = self.pacer.clear()
+        self.playback.reset()
+        metrics.incr('barge_ins')
+        logger.info(f"Barge-in for socket {self.socket_id}: played {played_ms} ms, dropped {dropped} bytes")
+        
+        socketio.emit('audio_interrupted', {
+            'played_ms': played_ms,
+            'dropped_bytes': dropped
+        }, room=self.socket_id)
+    
     def extract_medical_info(self, text):
         """Extract medical information from user input"""
         text_lower = text.lower()
@@ -272,55 +766,152 @@ Toon empathie en begrip.
             if med in text_lower and med not in self.medical_data['medications']:
                 self.medical_data['medications'].append(med)
     
-    async def send_audio(self, audio_data):
-        """Send audio data to OpenAI"""
-        try:
-            if not self.connected or not self.websocket:
-                logger.error("Not connected to OpenAI Realtime API")
-                return
+    def send_audio(self, audio_data):
+        """Queue audio (PCM16 bytes or base64) for OpenAI; returns the queue status for the client ack"""
+        audio = decode_client_audio(audio_data)
+        with self.capture_lock:
+            audio = self.codec.from_client(audio)
+            if not audio:
+                # Less than one resampler period; it goes out with the next chunk
+                return dict(self.send_queue.status(), buffered=True)
             
-            # Send audio data
-            message = {
-                "type": "input_audio_buffer.append",
-                "audio": audio_data
-            }
-            await self.websocket.send(json.dumps(message))
+            if self.hibernated:
+                self.touch()
+                if speech_rms(audio) < WAKE_RMS:
+                    # Silence never goes upstream while hibernated
+                    self.preroll.push(audio)
+                    return {'accepted': True, 'hibernated': True}
+                self.turns.note_audio()
+                return self.wake(audio)
             
-        except Exception as e:
-            logger.error(f"Failed to send audio: {e}")
+            if not self.ready:
+                if not self.connecting:
+                    logger.error("Not connected to OpenAI Realtime API")
+                    return {'accepted': False, 'reason': 'not_connected'}
+                
+                # Upstream still connecting; hold the first words instead of losing them
+                self.touch()
+                self.turns.note_audio()
+                return self.early_audio.push(audio)
+            
+            if self.gate:
+                audio = self.gate.process(audio)
+            if audio:
+                self.coalescer.push(audio)
+        
+        self.touch()
+        if not audio:
+            # Gated silence: nothing new upstream for a commit to pick up
+            return dict(self.send_queue.status(), gated=True)
+        self.turns.note_audio()
+        return self.send_queue.status()
     
-    async def commit_audio(self):
+    def commit_audio(self):
         """Commit audio buffer and generate response"""
-        try:
-            if not self.connected or not self.websocket:
-                logger.error("Not connected to OpenAI Realtime API")
-                return
+        with self.capture_lock:
+            if self.hibernated:
+                # Nothing but silence since the session went to sleep
+                return {'accepted': True, 'hibernated': True, 'deduplicated': True}
+            
+            if not self.ready:
+                if not self.connecting:
+                    logger.error("Not connected to OpenAI Realtime API")
+                    return {'accepted': False, 'reason': 'not_connected'}
+                
+                # Runs right after the early audio is flushed
+                self.commit_pending = True
+                return {'accepted': True, 'buffered': True, 'commit_pending': True}
             
-            # Commit audio buffer
-            commit_message = {
+            if self.gate:
+                tail = self.gate.flush()
+                if tail:
+                    self.coalescer.push(tail)
+        
+        self.touch()
+        self.touch_voice()
+        self.coalescer.flush()
+        
+        send_commit, send_create = self.turns.request_commit()
+        if not send_commit and not send_create:
+            # Server VAD already committed this turn and is responding
+            return dict(self.send_queue.status(), deduplicated=True)
+        
+        # Commit audio buffer behind any queued appends
+        if send_commit:
+            self.send_queue.put_event({
                 "type": "input_audio_buffer.commit"
+            })
+        
+        # Instructions live on the session; only resend them when they changed
+        self.sync_instructions()
+        
+        # Create response
+        return self.send_queue.put_event({
+            "type": "response.create",
+            "response": {
+                "modalities": ["text", "audio"]
             }
-            await self.websocket.send(json.dumps(commit_message))
-            
-            # Create response
-            response_message = {
-                "type": "response.create",
-                "response": {
-                    "modalities": ["text", "audio"],
-                    "instructions": self.get_medical_instructions()
-                }
-            }
-            await self.websocket.send(json.dumps(response_message))
-            
-        except Exception as e:
-            logger.error(f"Failed to commit audio: {e}")
+        })
+    
+    def stats(self):
+        """Per-session pipeline statistics"""
+        return {
+            'phase': self.current_phase,
+            'connected': self.connected,
+            'reconnecting': self.reconnecting,
+            'hibernated': self.hibernated,
+            'snapshot_bytes': len(self.hibernation_snapshot) if self.hibernation_snapshot else 0,
+            'idle_seconds': round(time.monotonic() - self.last_activity, 1),
+            'preconnect': self.early_audio.snapshot(),
+            'silence_gate': self.gate.snapshot() if self.gate else None,
+            'resampler': self.codec.inbound.snapshot() if self.codec.inbound else None,
+            'codec': self.codec.snapshot(),
+            'coalescer': self.coalescer.snapshot(),
+            'send_queue': self.send_queue.snapshot(),
+            'pacer': self.pacer.snapshot(),
+            'turns': self.turns.snapshot(),
+            'instructions': self.instructions.snapshot()
+        }
     
     async def disconnect(self):
-        """Disconnect from OpenAI Realtime API"""
+        """Disconnect from OpenAI Realtime API and release the session's buffers"""
         try:
+            was_connected = self.connected
             self.connected = False
-            if self.websocket:
-                await self.websocket.close()
+            self.closing = True
+            if self.reconnect_task and self.reconnect_task is not asyncio.current_task():
+                self.reconnect_task.cancel()
+            self.reconnect_task = None
+            self.reconnecting = False
+            with self.capture_lock:
+                self.ready = False
+                self.connecting = False
+                self.hibernated = False
+                self.hibernation_snapshot = None
+                self.early_audio.clear()
+                self.preroll.clear()
+                if self.gate:
+                    self.gate.reset()
+            if self.listener_task and self.listener_task is not asyncio.current_task():
+                self.listener_task.cancel()
+            self.listener_task = None
+            await self.send_queue.stop()
+            self.coalescer.clear()
+            self.pacer.clear()
+            self.playback.reset()
+            self.turns.reset()
+            
+            websocket, self.websocket = self.websocket, None
+            if websocket:
+                if was_connected and self.active_response_id:
+                    # Stop generation (and billing) before the socket goes away
+                    try:
+                        await asyncio.wait_for(websocket.send(json.dumps({"type": "response.cancel"})), timeout=2)
+                        metrics.incr('responses_cancelled')
+                    except Exception:
+                        pass
+                self.active_response_id = None
+                await websocket.close()
                 logger.info(f"Disconnected from OpenAI Realtime API for socket {self.socket_id}")
         except Exception as e:
             logger.error(f"Error disconnecting: {e}")
@@ -334,17 +925,22 @@ def handle_connect():
 def handle_disconnect():
     logger.info(f"Client disconnected: {request.sid}")
     
-    # Clean up OpenAI connection
-    if request.sid in active_connections:
-        client = active_connections[request.sid]
-        asyncio.create_task(client.disconnect())
-        del active_connections[request.sid]
+    # Clean up OpenAI connection (teardown runs in the registry's on_remove hook)
+    active_connections.remove(request.sid)
 
 @socketio.on('connect_realtime')
 def handle_connect_realtime(data):
     """Handle OpenAI Realtime API connection request"""
     try:
         api_key = data.get('api_key')
+        pool = None
+        if not api_key and SERVER_API_KEY:
+            # Server-managed key: hand out a pre-warmed session when the pool has one
+            api_key = SERVER_API_KEY
+            if upstream_pool.enabled:
+                upstream_pool.start()
+                pool = upstream_pool
+        
         if not api_key:
             emit('realtime_error', {'message': 'API key is required'})
             return
@@ -355,32 +951,40 @@ def handle_connect_realtime(data):
         
         logger.info(f"Connecting to OpenAI Realtime API for socket {request.sid}")
         
-        # Create OpenAI client
-        client = OpenAIRealtimeClient(api_key, request.sid)
-        active_connections[request.sid] = client
+        # Clients that can handle Socket.IO binary attachments skip base64 entirely
+        binary_audio = bool(data.get('binary_audio'))
         
-        # Connect in a new thread to avoid event loop issues
-        def connect_in_thread():
-            try:
-                # Create new event loop for this thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Run the connection
-                loop.run_until_complete(client.connect())
-                
-            except Exception as e:
-                logger.error(f"Error in connection thread: {e}")
-                socketio.emit('realtime_error', {
-                    'message': f'Connection thread error: {str(e)}'
-                }, room=request.sid)
-            finally:
-                loop.close()
-        
-        # Start connection in separate thread
-        thread = threading.Thread(target=connect_in_thread)
-        thread.daemon = True
-        thread.start()
+        # Drop silence server-side (default from REALTIME_SILENCE_GATE)
+        silence_gate = bool(data.get('silence_gate', GATE_ENABLED))
+        
+        # Capture rate of a pcm16 client's microphone; anything but 24 kHz is resampled here
+        try:
+            sample_rate = parse_sample_rate(data.get('sample_rate')) or SAMPLE_RATE
+        except (TypeError, ValueError) as e:
+            emit('realtime_error', {'message': f'Invalid sample_rate: {e}'})
+            return
+        
+        # pcm16 (default), g711_ulaw or g711_alaw; the upstream follows unless REALTIME_UPSTREAM_CODEC pins it
+        try:
+            codec = parse_codec(data.get('codec'))
+        except ValueError as e:
+            emit('realtime_error', {'message': f'Invalid codec: {e}'})
+            return
+        if not bridge_available(codec, sample_rate):
+            emit('realtime_error', {'message': f'Server cannot convert {codec} at {sample_rate} Hz, send pcm16 at {SAMPLE_RATE} Hz'})
+            return
+        
+        # Create OpenAI client; a second connect on the same socket replaces the first
+        client = OpenAIRealtimeClient(api_key, request.sid, binary_audio=binary_audio, silence_gate=silence_gate,
+                                      sample_rate=sample_rate, codec=codec)
+        accepted, _ = active_connections.add(request.sid, client)
+        if not accepted:
+            emit('realtime_error', {'message': 'Server is vol, probeer het later opnieuw'})
+            return
+        lifecycle.start()
+        
+        # Connect on the shared upstream loop
+        run_upstream(client.connect(pool=pool), request.sid, 'Connection')
         
     except Exception as e:
         logger.error(f"Error connecting to Realtime API: {e}")
@@ -390,36 +994,16 @@ def handle_connect_realtime(data):
 def handle_send_audio(data):
     """Handle audio data from client"""
     try:
-        if request.sid not in active_connections:
+        client = active_connections.get(request.sid)
+        if not client:
             emit('realtime_error', {'message': 'Not connected to OpenAI Realtime API'})
             return
         
-        client = active_connections[request.sid]
         audio_data = data.get('audio')
         
         if audio_data:
-            # Send audio in separate thread to avoid event loop issues
-            def send_audio_in_thread():
-                try:
-                    # Create new event loop for this thread
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    
-                    # Send the audio
-                    loop.run_until_complete(client.send_audio(audio_data))
-                    
-                except Exception as e:
-                    logger.error(f"Error in audio thread: {e}")
-                    socketio.emit('realtime_error', {
-                        'message': f'Audio thread error: {str(e)}'
-                    }, room=request.sid)
-                finally:
-                    loop.close()
-            
-            # Start audio sending in separate thread
-            thread = threading.Thread(target=send_audio_in_thread)
-            thread.daemon = True
-            thread.start()
+            # Returned status is delivered as the Socket.IO ack (backpressure signal)
+            return client.send_audio(audio_data)
         
     except Exception as e:
         logger.error(f"Error sending audio: {e}")
@@ -429,39 +1013,25 @@ def handle_send_audio(data):
 def handle_commit_audio():
     """Handle audio commit request"""
     try:
-        if request.sid not in active_connections:
+        client = active_connections.get(request.sid)
+        if not client:
             emit('realtime_error', {'message': 'Not connected to OpenAI Realtime API'})
             return
         
-        client = active_connections[request.sid]
-        
-        # Commit audio in separate thread to avoid event loop issues
-        def commit_audio_in_thread():
-            try:
-                # Create new event loop for this thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Commit the audio
-                loop.run_until_complete(client.commit_audio())
-                
-            except Exception as e:
-                logger.error(f"Error in commit thread: {e}")
-                socketio.emit('realtime_error', {
-                    'message': f'Commit thread error: {str(e)}'
-                }, room=request.sid)
-            finally:
-                loop.close()
-        
-        # Start commit in separate thread
-        thread = threading.Thread(target=commit_audio_in_thread)
-        thread.daemon = True
-        thread.start()
+        return client.commit_audio()
         
     except Exception as e:
         logger.error(f"Error committing audio: {e}")
         emit('realtime_error', {'message': f'Commit error: {str(e)}'})
 
+@socketio.on('audio_playback')
+def handle_audio_playback(data):
+    """Client-reported playback position, used to truncate on barge-in"""
+    client = active_connections.get(request.sid)
+    if client and data:
+        client.touch()
+        client.playback.report(data.get('item_id'), data.get('played_ms', 0))
+
 # Flask routes
 @app.route('/')
 def index():
@@ -479,7 +1049,30 @@ def health():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'active_connections': len(active_connections)
+        'active_connections': len(active_connections),
+        'sessions': lifecycle.snapshot()
+    })
+
+@app.route('/api/realtime/metrics')
+def realtime_metrics():
+    """Realtime pipeline counters (frame coalescing, send queues)"""
+    totals = metrics.snapshot()
+    frames = totals.get('audio_frames', 0)
+    totals['bytes_per_frame'] = round(totals.get('audio_frame_bytes', 0) / frames, 1) if frames else 0.0
+    totals['packets_per_frame'] = round(totals.get('audio_packets', 0) / frames, 2) if frames else 0.0
+    totals['gate_kept_seconds'] = round(totals.get('gate_ms_kept', 0) / 1000, 1)
+    totals['gate_dropped_seconds'] = round(totals.get('gate_ms_dropped', 0) / 1000, 1)
+    sessions = dict(active_connections.items())
+    
+    return jsonify({
+        'timestamp': datetime.now().isoformat(),
+        'totals': totals,
+        'latency': metrics.latency(),
+        'pool': upstream_pool.snapshot(),
+        'registry': active_connections.snapshot(),
+        'lifecycle': lifecycle.snapshot(),
+        'bandwidth': bandwidth_by_codec(client.codec for client in sessions.values()),
+        'sessions': {sid: client.stats() for sid, client in sessions.items()}
     })
 
 if __name__ == '__main__':
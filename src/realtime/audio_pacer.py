@@ -0,0 +1,139 @@
+"""
+Outbound audio scheduling towards the browser
+Upstream deltas are merged into windows and emitted at playback pace, so
+polling clients get a few steady packets instead of a burst of tiny ones
+"""
+
+import asyncio
+import logging
+import os
+
+from src.realtime.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Output audio is pcm16, 24 kHz mono
+BYTES_PER_MS = 24000 * 2 / 1000
+
+
+class AudioPacer:
+    """Per-session merge-and-pace scheduler; used only from the upstream loop"""
+
+    def __init__(self, emit, window_ms=None, lead_ms=None, bytes_per_ms=BYTES_PER_MS):
+        self.emit = emit
+        self.window_ms = int(os.environ.get('REALTIME_OUTPUT_WINDOW_MS', 100)) if window_ms is None else window_ms
+        self.lead_ms = int(os.environ.get('REALTIME_OUTPUT_LEAD_MS', 200)) if lead_ms is None else lead_ms
+        self.bytes_per_ms = bytes_per_ms
+        self.window_bytes = int(self.window_ms * bytes_per_ms) & ~1
+
+        self.buffer = bytearray()
+        self.task = None
+        self.more = None
+        self.clock_start = None
+        self.sent_ms = 0.0
+
+        self.stats = {
+            'deltas': 0,
+            'emits': 0,
+            'bytes': 0,
+            'flushes': 0,
+            'dropped_bytes': 0
+        }
+
+    @property
+    def enabled(self):
+        """Pacing is off when the window is 0 (deltas pass straight through)"""
+        return self.window_ms > 0
+
+    def push(self, pcm):
+        """Queue an upstream audio delta"""
+        self.stats['deltas'] += 1
+        self.buffer.extend(pcm)
+        if self.more is None:
+            self.more = asyncio.Event()
+        self.more.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def finish(self):
+        """End of response audio: emit everything that is still queued right away"""
+        self._cancel_task()
+        if self.buffer:
+            self.stats['flushes'] += 1
+            self._send(bytes(self.buffer))
+            self.buffer.clear()
+        self._reset_clock()
+
+    def clear(self):
+        """Drop queued audio immediately (user interrupted); returns the dropped bytes"""
+        self._cancel_task()
+        dropped = len(self.buffer)
+        if dropped:
+            self.stats['dropped_bytes'] += dropped
+            metrics.incr('output_audio_dropped_bytes', dropped)
+            self.buffer.clear()
+        self._reset_clock()
+        return dropped
+
+    def _cancel_task(self):
+        if self.task and not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+        self.task = None
+
+    def _reset_clock(self):
+        self.clock_start = None
+        self.sent_ms = 0.0
+
+    def _send(self, chunk):
+        self.stats['emits'] += 1
+        self.stats['bytes'] += len(chunk)
+        metrics.incr('output_audio_emits')
+        metrics.incr('output_audio_bytes', len(chunk))
+        self.emit(chunk)
+
+    async def run(self):
+        """Emit windows of audio, never more than lead_ms ahead of real time"""
+        loop = asyncio.get_running_loop()
+        try:
+            while self.buffer:
+                if self.clock_start is None:
+                    self.clock_start = loop.time()
+                    self.sent_ms = 0.0
+
+                # Merge: give upstream one window to top up a partial chunk
+                if len(self.buffer) < self.window_bytes:
+                    self.more.clear()
+                    try:
+                        await asyncio.wait_for(self.more.wait(), self.window_ms / 1000)
+                    except asyncio.TimeoutError:
+                        pass
+                    if len(self.buffer) < self.window_bytes and self.more.is_set():
+                        continue
+
+                # Pace: the client only needs lead_ms of audio buffered
+                ahead_ms = self.sent_ms - (loop.time() - self.clock_start) * 1000
+                if ahead_ms > self.lead_ms:
+                    await asyncio.sleep((ahead_ms - self.lead_ms) / 1000)
+                    continue
+
+                size = min(len(self.buffer), self.window_bytes) & ~1
+                if not size:
+                    break
+                chunk = bytes(self.buffer[:size])
+                del self.buffer[:size]
+                self.sent_ms += size / self.bytes_per_ms
+                self._send(chunk)
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Audio pacer error: {e}")
+
+    def snapshot(self):
+        """Scheduler statistics"""
+        return dict(
+            self.stats,
+            window_ms=self.window_ms,
+            lead_ms=self.lead_ms,
+            queued_bytes=len(self.buffer)
+        )
@@ -0,0 +1,36 @@
+"""
+Audio payload conversion between Socket.IO clients and the upstream API
+Binary clients exchange raw PCM16 bytes, legacy pages keep base64 strings;
+base64 only exists on the upstream side of the server
+"""
+
+import binascii
+
+APPEND_PREFIX = '{"type": "input_audio_buffer.append", "audio": "'
+APPEND_SUFFIX = '"}'
+
+
+def decode_client_audio(audio):
+    """Raw PCM16 from a send_audio payload (binary attachment or base64 string)"""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return audio
+    return binascii.a2b_base64(audio)
+
+
+def encode_client_audio(delta, binary):
+    """Upstream base64 audio delta in the form the client negotiated"""
+    if binary:
+        return binascii.a2b_base64(delta)
+    return delta
+
+
+def encode_client_pcm(pcm, binary):
+    """Merged PCM16 chunk in the form the client negotiated"""
+    if binary:
+        return pcm
+    return binascii.b2a_base64(pcm, newline=False).decode('ascii')
+
+
+def encode_append(pcm):
+    """input_audio_buffer.append message without a json.dumps pass over the audio"""
+    return APPEND_PREFIX + binascii.b2a_base64(pcm, newline=False).decode('ascii') + APPEND_SUFFIX
@@ -0,0 +1,91 @@
+"""
+Coalescing of small PCM16 packets into fixed-duration upstream frames
+"""
+
+import logging
+import os
+import threading
+import time
+
+from src.realtime.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# OpenAI Realtime pcm16: 24 kHz, mono, 16-bit little endian
+SAMPLE_RATE = 24000
+BYTES_PER_SAMPLE = 2
+
+
+class AudioCoalescer:
+    """Buffers incoming audio and forwards it to a sink in frames of frame_ms"""
+
+    def __init__(self, sink, frame_ms=None, sample_rate=SAMPLE_RATE):
+        self.sink = sink
+        self.frame_ms = frame_ms or int(os.environ.get('REALTIME_AUDIO_FRAME_MS', 60))
+        self.frame_bytes = int(sample_rate * self.frame_ms / 1000) * BYTES_PER_SAMPLE
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+
+        self.packets = 0
+        self.frames = 0
+        self.bytes = 0
+        self.first_frame_at = None
+        self.last_frame_at = None
+
+    def push(self, audio_bytes):
+        """Add a packet; returns the sink result of the last frame sent, if any"""
+        result = None
+        with self.lock:
+            self.packets += 1
+            metrics.incr('audio_packets')
+            self.buffer.extend(audio_bytes)
+
+            # Sink is called under the lock so frames keep their order across threads
+            while len(self.buffer) >= self.frame_bytes:
+                frame = bytes(self.buffer[:self.frame_bytes])
+                del self.buffer[:self.frame_bytes]
+                result = self._emit(frame)
+        return result
+
+    def flush(self):
+        """Forward whatever is buffered (commit or end of speech)"""
+        with self.lock:
+            # Keep sample alignment; an odd trailing byte waits for its pair
+            size = len(self.buffer) - len(self.buffer) % BYTES_PER_SAMPLE
+            if not size:
+                return None
+            frame = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return self._emit(frame)
+
+    def clear(self):
+        """Discard buffered audio"""
+        with self.lock:
+            self.buffer.clear()
+
+    def _emit(self, frame):
+        """Count and forward one frame; caller holds the lock"""
+        now = time.monotonic()
+        if self.first_frame_at is None:
+            self.first_frame_at = now
+        self.last_frame_at = now
+        self.frames += 1
+        self.bytes += len(frame)
+        metrics.incr('audio_frames')
+        metrics.incr('audio_frame_bytes', len(frame))
+        return self.sink(frame)
+
+    def snapshot(self):
+        """Frame statistics for tuning frame_ms"""
+        with self.lock:
+            elapsed = (self.last_frame_at - self.first_frame_at) if self.frames > 1 else 0
+            return {
+                'frame_ms': self.frame_ms,
+                'packets': self.packets,
+                'frames': self.frames,
+                'bytes': self.bytes,
+                'buffered_bytes': len(self.buffer),
+                'frames_per_sec': round(self.frames / elapsed, 2) if elapsed else 0.0,
+                'bytes_per_frame': round(self.bytes / self.frames, 1) if self.frames else 0.0,
+                'packets_per_frame': round(self.packets / self.frames, 2) if self.frames else 0.0
+            }
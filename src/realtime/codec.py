@@ -0,0 +1,225 @@
+"""
+Per-session audio codec negotiation for the realtime endpoints
+The upstream takes pcm16 (24 kHz, 2 bytes a sample) or G.711 mu-law/A-law
+(8 kHz, 1 byte a sample, a sixth of the bytes). Clients pick a codec on
+connect_realtime and the upstream follows it unless REALTIME_UPSTREAM_CODEC
+pins one. Between the two the session pipeline (silence gate, coalescer,
+pacer, playback) runs on linear PCM16 at the upstream codec's rate; G.711 is
+converted with lookup tables over whole chunks, rates with StreamResampler
+"""
+
+import os
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src.realtime.coalescer import SAMPLE_RATE, BYTES_PER_SAMPLE
+from src.realtime.resampler import StreamResampler
+
+PCM16 = 'pcm16'
+ULAW = 'g711_ulaw'
+ALAW = 'g711_alaw'
+CODECS = (PCM16, ULAW, ALAW)
+G711_RATE = 8000
+
+# Empty: the upstream uses whatever the client negotiated
+UPSTREAM_CODEC = os.environ.get('REALTIME_UPSTREAM_CODEC', '')
+
+# G.711 mu-law works on 14-bit magnitudes
+ULAW_BIAS = 0x84
+ULAW_BIAS_14 = 0x21
+ULAW_MAX_14 = 0x1FFF
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def bridge_available(client_codec, client_rate=None):
+    """G.711 conversion and resampling need NumPy; pcm16 at 24 kHz end to end needs nothing"""
+    if np is not None:
+        return True
+    upstream_codec = UPSTREAM_CODEC or client_codec
+    return client_codec == PCM16 and upstream_codec == PCM16 and client_rate in (None, SAMPLE_RATE)
+
+
+def parse_codec(value):
+    """Client-requested codec, pcm16 when missing; ValueError for anything else"""
+    if not value:
+        return PCM16
+    if value not in CODECS:
+        raise ValueError(f"codec must be one of {', '.join(CODECS)}")
+    return value
+
+
+def codec_rate(codec):
+    return SAMPLE_RATE if codec == PCM16 else G711_RATE
+
+
+def bytes_per_second(codec):
+    return SAMPLE_RATE * BYTES_PER_SAMPLE if codec == PCM16 else G711_RATE
+
+
+def _ulaw_encode(samples):
+    samples = samples >> 2
+    sign = np.where(samples < 0, 0x80, 0)
+    # Beyond the top segment everything is the largest code
+    magnitude = np.minimum(np.where(samples < 0, -samples, samples) + ULAW_BIAS_14, ULAW_MAX_14)
+    # Segment from the position of the highest set bit above bit 5
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 5, 0, 7)
+    mantissa = (magnitude >> (exponent + 1)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+def _ulaw_decode(codes):
+    codes = ~codes & 0xFF
+    exponent = (codes >> 4) & 0x07
+    magnitude = ((((codes & 0x0F) << 3) + ULAW_BIAS) << exponent) - ULAW_BIAS
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+def _alaw_encode(samples):
+    # A-law codes positive values with the sign bit set, then inverts the even bits
+    mask = np.where(samples >= 0, 0xD5, 0x55)
+    magnitude = np.where(samples >= 0, samples, -samples - 1)
+    exponent = np.clip(np.floor(np.log2(np.maximum(magnitude, 1))).astype(np.int32) - 7, 0, 7)
+    mantissa = np.where(exponent == 0, magnitude >> 4, magnitude >> (exponent + 3)) & 0x0F
+    return (((exponent << 4) | mantissa) ^ mask).astype(np.uint8)
+
+
+def _alaw_decode(codes):
+    codes = codes ^ 0x55
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = np.where(exponent == 0, (mantissa << 4) + 8, ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0))
+    return np.where(codes & 0x80, magnitude, -magnitude).astype(np.int16)
+
+
+def tables(codec):
+    """(decode[256] int16, encode[65536] uint8 indexed by the sample's uint16 bits), built once"""
+    cached = _tables.get(codec)
+    if cached is not None:
+        return cached
+    with _tables_lock:
+        cached = _tables.get(codec)
+        if cached is None:
+            codes = np.arange(256, dtype=np.int32)
+            samples = np.arange(65536, dtype=np.int32).astype(np.uint16).view(np.int16).astype(np.int32)
+            if codec == ULAW:
+                cached = (_ulaw_decode(codes), _ulaw_encode(samples))
+            else:
+                cached = (_alaw_decode(codes), _alaw_encode(samples))
+            _tables[codec] = cached
+    return cached
+
+
+def decode(data, codec):
+    """G.711 bytes to PCM16 bytes at the same rate"""
+    return tables(codec)[0][np.frombuffer(data, np.uint8)].astype('<i2').tobytes()
+
+
+def encode(pcm, codec):
+    """PCM16 bytes to G.711 bytes at the same rate"""
+    return tables(codec)[1][np.frombuffer(pcm, '<u2', len(pcm) // BYTES_PER_SAMPLE)].tobytes()
+
+
+class CodecBridge:
+    """Converts one session's audio between the client's codec, the PCM16 pipeline and the upstream codec
+
+    Calls for one direction are serialized by the caller (capture lock for
+    client audio, the upstream loop for model audio)
+    """
+
+    def __init__(self, client_codec=PCM16, upstream_codec=None, client_rate=None):
+        self.client_codec = client_codec
+        self.upstream_codec = upstream_codec or UPSTREAM_CODEC or client_codec
+        # The pipeline runs at the upstream rate so appends need no resampling
+        self.rate = codec_rate(self.upstream_codec)
+        self.bytes_per_ms = self.rate * BYTES_PER_SAMPLE / 1000
+
+        # pcm16 clients may capture at their native rate (sample_rate on connect)
+        self.client_rate = (client_rate or SAMPLE_RATE) if client_codec == PCM16 else G711_RATE
+        self.inbound = StreamResampler(self.client_rate, self.rate) if self.client_rate != self.rate else None
+        # pcm16 clients always play 24 kHz
+        playback_rate = codec_rate(client_codec)
+        self.outbound = StreamResampler(self.rate, playback_rate) if playback_rate != self.rate else None
+
+        self.started = time.monotonic()
+        self.stats = {
+            'client_in': 0,
+            'client_out': 0,
+            'upstream_in': 0,
+            'upstream_out': 0
+        }
+
+    @property
+    def passthrough(self):
+        """Model audio reaches the client exactly as the upstream sent it"""
+        return self.client_codec == self.upstream_codec and self.outbound is None
+
+    def from_client(self, data):
+        """Client payload to pipeline PCM16"""
+        self.stats['client_in'] += len(data)
+        pcm = decode(data, self.client_codec) if self.client_codec != PCM16 else data
+        if self.inbound:
+            pcm = self.inbound.process(pcm)
+        return pcm
+
+    def to_upstream(self, pcm):
+        """Pipeline PCM16 to the bytes of an input_audio_buffer.append"""
+        data = encode(pcm, self.upstream_codec) if self.upstream_codec != PCM16 else pcm
+        self.stats['upstream_out'] += len(data)
+        return data
+
+    def from_upstream(self, data):
+        """Model audio delta (raw bytes) to pipeline PCM16"""
+        self.stats['upstream_in'] += len(data)
+        return decode(data, self.upstream_codec) if self.upstream_codec != PCM16 else data
+
+    def to_client(self, pcm):
+        """Pipeline PCM16 to the client's codec and playback rate"""
+        if self.outbound:
+            pcm = self.outbound.process(pcm)
+        data = encode(pcm, self.client_codec) if self.client_codec != PCM16 else pcm
+        self.stats['client_out'] += len(data)
+        return data
+
+    def count_passthrough(self, size):
+        """Model audio forwarded untouched (passthrough)"""
+        self.stats['upstream_in'] += size
+        self.stats['client_out'] += size
+
+    def pipeline_bytes(self, size):
+        """PCM16 bytes in the pipeline for `size` bytes of upstream audio"""
+        return size if self.upstream_codec == PCM16 else size * BYTES_PER_SAMPLE
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return {
+            'client_codec': self.client_codec,
+            'upstream_codec': self.upstream_codec,
+            'client_rate': self.client_rate,
+            'pipeline_rate': self.rate,
+            'transcoding': self.client_codec != self.upstream_codec or self.inbound is not None,
+            'bytes': dict(self.stats),
+            # Averages over the session's lifetime, silence included
+            'kbit_per_second': {name: round(count * 8 / elapsed / 1000, 1) for name, count in self.stats.items()}
+        }
+
+
+def bandwidth_by_codec(bridges):
+    """Average per-session kbit/s on each leg, grouped by the client's codec"""
+    groups = {}
+    for bridge in bridges:
+        snapshot = bridge.snapshot()
+        group = groups.setdefault(snapshot['client_codec'], {'sessions': 0, 'kbit_per_second': {}})
+        group['sessions'] += 1
+        for leg, rate in snapshot['kbit_per_second'].items():
+            group['kbit_per_second'][leg] = group['kbit_per_second'].get(leg, 0.0) + rate
+    for group in groups.values():
+        group['kbit_per_second'] = {leg: round(total / group['sessions'], 1)
+                                    for leg, total in group['kbit_per_second'].items()}
+    return groups
@@ -0,0 +1,210 @@
+"""
+Pool of pre-established, pre-configured upstream Realtime sessions
+Only for the server-managed API key: a patient connecting without a key of
+their own gets a session whose TLS/websocket handshake and session.update
+already happened, so audio can flow right away
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+from src.realtime.upstream_loop import get_upstream_loop
+from src.realtime.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PooledUpstream:
+    """An open upstream websocket and the instructions it was configured with"""
+
+    __slots__ = ('websocket', 'instructions', 'created_at')
+
+    def __init__(self, websocket, instructions):
+        self.websocket = websocket
+        self.instructions = instructions
+        self.created_at = time.monotonic()
+
+    def age(self):
+        return time.monotonic() - self.created_at
+
+
+class UpstreamPool:
+    """Keeps between min_size and max_size warm sessions, all on the upstream loop
+
+    factory is a coroutine function returning (websocket, instructions) for a
+    freshly connected and configured session.
+    """
+
+    def __init__(self, factory, min_size=None, max_size=None, ttl=None, health_interval=None):
+        self.factory = factory
+        self.min_size = min_size if min_size is not None else int(os.environ.get('REALTIME_POOL_MIN', 0))
+        self.max_size = max(self.min_size, max_size if max_size is not None else int(os.environ.get('REALTIME_POOL_MAX', 4)))
+        # Sessions are refreshed well before the server-side session limit
+        self.ttl = ttl or float(os.environ.get('REALTIME_POOL_TTL', 600))
+        self.health_interval = health_interval or float(os.environ.get('REALTIME_POOL_HEALTH_INTERVAL', 20))
+
+        self.idle = deque()
+        self.opening = 0
+        self.target = self.min_size
+        self.retry_at = 0.0
+        self.backoff = 1.0
+        self.wakeup = None
+        self.run_future = None
+        self.pid = None
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'opened': 0,
+            'open_failures': 0,
+            'expired': 0,
+            'unhealthy': 0
+        }
+
+    @property
+    def enabled(self):
+        return self.min_size > 0
+
+    def start(self):
+        """Start maintaining the pool on the upstream loop (once per worker process)"""
+        if not self.enabled:
+            return
+        if self.run_future is not None and self.pid == os.getpid() and not self.run_future.done():
+            return
+        if self.pid != os.getpid():
+            # Sessions of a parent process are unusable here
+            self.idle.clear()
+            self.opening = 0
+        self.pid = os.getpid()
+        self.run_future = get_upstream_loop().submit(self.run())
+        logger.info(f"Upstream pool started (min {self.min_size}, max {self.max_size}, ttl {self.ttl:.0f}s)")
+
+    async def run(self):
+        """Fill, refresh and health-check until cancelled"""
+        self.wakeup = asyncio.Event()
+        while True:
+            self.fill()
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Upstream pool health check failed: {e}")
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.health_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def fill(self):
+        """Start opening sessions until idle + opening reaches the target"""
+        if time.monotonic() < self.retry_at:
+            return
+        missing = self.target - len(self.idle) - self.opening
+        for _ in range(max(0, missing)):
+            self.opening += 1
+            asyncio.create_task(self.open_one())
+
+    async def open_one(self):
+        """Open and configure one session for the pool"""
+        started = time.perf_counter()
+        try:
+            websocket, instructions = await self.factory()
+        except Exception as e:
+            self.stats['open_failures'] += 1
+            # Back off so a bad key or an outage doesn't turn into a connect storm
+            self.retry_at = time.monotonic() + self.backoff
+            self.backoff = min(self.backoff * 2, 60.0)
+            logger.error(f"Failed to open pooled upstream session: {e}")
+            return
+        finally:
+            self.opening -= 1
+
+        self.backoff = 1.0
+        self.stats['opened'] += 1
+        metrics.observe('pool_open', time.perf_counter() - started)
+        self.idle.append(PooledUpstream(websocket, instructions))
+
+    def usable(self, entry):
+        """Open and not about to expire"""
+        return entry.websocket.open and entry.age() < self.ttl
+
+    async def acquire(self):
+        """Take a warm session (must run on the upstream loop); None on a miss"""
+        entry = None
+        while self.idle:
+            candidate = self.idle.popleft()
+            if self.usable(candidate):
+                entry = candidate
+                break
+            self.discard(candidate, 'expired')
+
+        if entry is None:
+            self.stats['misses'] += 1
+            metrics.incr('pool_misses')
+            # Demand outgrew the pool; keep more warm sessions, up to max_size
+            self.target = min(self.target + 1, self.max_size)
+        else:
+            self.stats['hits'] += 1
+            metrics.incr('pool_hits')
+
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return entry
+
+    def release(self, entry):
+        """Give back a session that was acquired but never used"""
+        if self.usable(entry):
+            self.idle.appendleft(entry)
+        else:
+            self.discard(entry, 'expired')
+
+    async def check(self):
+        """Replace expired sessions and ping the others"""
+        for entry in [e for e in self.idle if not self.usable(e)]:
+            self.idle.remove(entry)
+            self.discard(entry, 'expired')
+            # Unused sessions expiring means the pool is bigger than demand
+            self.target = max(self.min_size, self.target - 1)
+
+        entries = list(self.idle)
+        results = await asyncio.gather(*(self.ping(entry) for entry in entries))
+        for entry, healthy in zip(entries, results):
+            if not healthy and entry in self.idle:
+                self.idle.remove(entry)
+                self.discard(entry, 'unhealthy')
+
+    async def ping(self, entry):
+        try:
+            pong = await entry.websocket.ping()
+            await asyncio.wait_for(pong, timeout=5)
+            return True
+        except Exception:
+            return False
+
+    def discard(self, entry, reason):
+        """Close a session that leaves the pool without being used"""
+        self.stats[reason] += 1
+        metrics.incr(f'pool_{reason}')
+        asyncio.create_task(self.close(entry))
+
+    async def close(self, entry):
+        try:
+            await entry.websocket.close()
+        except Exception:
+            pass
+
+    def snapshot(self):
+        """Pool size and hit/miss statistics"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(
+            self.stats,
+            enabled=self.enabled,
+            idle=len(self.idle),
+            opening=self.opening,
+            target=self.target,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            hit_rate=round(self.stats['hits'] / lookups, 3) if lookups else 0.0
+        )
@@ -0,0 +1,43 @@
+"""
+Fast-path inspection of raw upstream Realtime frames
+Audio deltas are routed by slicing the frame instead of decoding the full JSON;
+every other event still goes through json.loads
+"""
+
+AUDIO_DELTA = 'response.audio.delta'
+
+
+def _string_value_at(raw, key_index):
+    """Slice the JSON string value that follows the key at key_index"""
+    colon = raw.find(':', key_index)
+    if colon == -1:
+        return None
+    start = raw.find('"', colon + 1)
+    if start == -1 or raw[colon + 1:start].strip():
+        return None
+    end = raw.find('"', start + 1)
+    if end == -1:
+        return None
+    value = raw[start + 1:end]
+    # Escaped content is left to the full parser
+    if '\\' in value:
+        return None
+    return value
+
+
+def peek_event_type(raw):
+    """Event type from a raw frame without parsing it, or None if unsure"""
+    if not isinstance(raw, str):
+        return None
+    index = raw.find('"type"')
+    if index == -1:
+        return None
+    return _string_value_at(raw, index + 6)
+
+
+def extract_string(raw, key):
+    """Top-level string field (ids, base64 delta) sliced out of a raw frame"""
+    index = raw.find(f'"{key}"')
+    if index == -1:
+        return None
+    return _string_value_at(raw, index + len(key) + 2)
@@ -0,0 +1,22 @@
+"""
+Hibernation support for silent Realtime sessions
+A hibernated session has no upstream socket; its consultation state is kept as
+a compressed snapshot and replayed onto a new upstream when the patient speaks
+"""
+
+import json
+import os
+import zlib
+
+# Wake threshold on 16-bit RMS, the silence gate's speech level (REALTIME_GATE_RMS);
+# quiet speakers on laptop mics stay well below 500
+WAKE_RMS = int(os.environ.get('REALTIME_WAKE_RMS', 250))
+
+
+def pack_state(state):
+    """Compact snapshot: compressed JSON"""
+    return zlib.compress(json.dumps(state, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def unpack_state(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
@@ -0,0 +1,116 @@
+"""
+Session instructions for the Realtime cardiology consultation
+Static prompt text is interned once per process and shared by every session,
+rendered prompts are memoized on the state they depend on, and a session only
+sends session.update when its rendered instructions actually change
+"""
+
+import logging
+import sys
+from functools import lru_cache
+
+from src.realtime.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Static fragments (main.py client)
+MEDICAL_INTRO = sys.intern("Je bent een Nederlandse AI cardioloog die een systematische anamnese afneemt. ")
+
+MEDICAL_BODY = sys.intern("""INSTRUCTIES:
+1. Spreek alleen Nederlands
+2. Stel één vraag per keer
+3. Luister aandachtig naar het antwoord
+4. Stel relevante vervolgvragen gebaseerd op het antwoord
+5. Voorkom herhaalde vragen - onthoud wat al is gevraagd
+6. Ga systematisch door de cardiologische anamnese
+
+FASES:
+- hoofdklacht: Wat is de hoofdklacht? Wanneer begon het?
+- symptomen: Pijn op borst, kortademigheid, hartkloppingen, duizeligheid
+- triggers: Wat maakt het erger/beter? Inspanning, rust, stress?
+- voorgeschiedenis: Eerdere hartproblemen, operaties, ziekenhuis opnames
+- medicatie: Huidige medicijnen, allergieën, bijwerkingen
+- familie: Familie geschiedenis van hartproblemen
+- leefstijl: Roken, alcohol, beweging, voeding
+
+Begin met een warme begroeting en de eerste vraag over de hoofdklacht.
+Houd de vragen kort en duidelijk.
+Toon empathie en begrip.
+""")
+
+# Static fragments (realtime proxy)
+PROXY_INTRO = sys.intern("""Je bent een ervaren Nederlandse cardioloog die een systematische anamnese afneemt.
+
+BELANGRIJKE REGELS:
+1. Stel NOOIT dezelfde vraag twee keer
+2. Houd bij welke vragen je al hebt gesteld
+3. Stel één vraag per keer
+4. Wees empathisch en professioneel
+5. Spreek Nederlands""")
+
+PROXY_OUTRO = sys.intern("Analyseer het antwoord van de patiënt, extraheer relevante medische informatie, en stel dan de meest logische vervolgvraag die je nog NIET hebt gesteld.")
+
+
+@lru_cache(maxsize=64)
+def render_medical_instructions(phase):
+    """Instructions for OpenAIRealtimeClient; depend on the phase only"""
+    return f"""{MEDICAL_INTRO}
+
+HUIDIGE FASE: {phase}
+
+{MEDICAL_BODY}"""
+
+
+@lru_cache(maxsize=1024)
+def render_proxy_instructions(phase, covered_summary, next_questions):
+    """Instructions for OpenAIRealtimeProxy; next_questions is a tuple"""
+    return f"""{PROXY_INTRO}
+
+REEDS GESTELDE VRAGEN (NIET HERHALEN):
+{covered_summary}
+
+HUIDIGE FASE: {phase}
+
+VOLGENDE VRAGEN OM TE STELLEN (kies er één die je nog NIET hebt gesteld):
+{chr(10).join(next_questions)}
+
+{PROXY_OUTRO}"""
+
+
+class InstructionSync:
+    """Remembers the instructions a session last sent upstream"""
+
+    def __init__(self, name):
+        self.name = name
+        self.current = None
+        self.stats = {
+            'updates_sent': 0,
+            'updates_skipped': 0,
+            'instructions_chars': 0,
+            'last_delta_chars': 0
+        }
+
+    def changed(self, instructions):
+        """Record the rendered instructions; True when a session.update is needed"""
+        if instructions is self.current or instructions == self.current:
+            self.stats['updates_skipped'] += 1
+            metrics.incr('instruction_updates_skipped')
+            return False
+
+        previous = len(self.current) if self.current is not None else 0
+        delta = len(instructions) - previous
+        self.current = instructions
+        self.stats['updates_sent'] += 1
+        self.stats['instructions_chars'] = len(instructions)
+        self.stats['last_delta_chars'] = delta
+        metrics.incr('instruction_updates_sent')
+        metrics.incr('instruction_chars_sent', len(instructions))
+        logger.info(f"Instructions for {self.name}: {len(instructions)} chars ({delta:+d} since last update)")
+        return True
+
+    def reset(self):
+        """Upstream session is new; next instructions must be sent again"""
+        self.current = None
+
+    def snapshot(self):
+        return dict(self.stats)
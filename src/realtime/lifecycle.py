@@ -0,0 +1,143 @@
+"""
+Session lifecycle: hibernates silent sessions, reaps idle and orphaned ones
+A sweep on the upstream loop puts sessions whose patient has been silent for a
+while into hibernation (no upstream socket, opt-in via REALTIME_HIBERNATE_AFTER),
+and removes sessions whose patient went quiet for good, whose browser is gone
+without a disconnect event, or whose upstream never came up or died; removal
+from the registry tears the upstream connection down
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from src.realtime.upstream_loop import get_upstream_loop
+from src.realtime.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REAP_IDLE = 'idle'
+REAP_ORPHANED = 'orphaned'
+REAP_UPSTREAM_LOST = 'upstream_lost'
+
+
+class SessionLifecycle:
+    """Periodic hibernate/reap sweep over a SessionRegistry
+
+    Sessions expose socket_id, created_at, last_activity and last_voice
+    (time.monotonic), connected, ready, reconnecting, hibernated and an
+    async hibernate().
+    """
+
+    def __init__(self, registry, is_connected=None, idle_after=None, idle_timeout=None,
+                 connect_timeout=None, interval=None, hibernate_after=None):
+        self.registry = registry
+        self.is_connected = is_connected
+        self.idle_after = idle_after or float(os.environ.get('REALTIME_IDLE_AFTER', 60))
+        self.idle_timeout = idle_timeout or float(os.environ.get('REALTIME_IDLE_TIMEOUT', 300))
+        self.connect_timeout = connect_timeout or float(os.environ.get('REALTIME_CONNECT_TIMEOUT', 30))
+        self.interval = interval or float(os.environ.get('REALTIME_REAP_INTERVAL', 15))
+        # Opt-in: seconds of patient silence before hibernating, 0 (the default) disables it
+        self.hibernate_after = hibernate_after if hibernate_after is not None else float(os.environ.get('REALTIME_HIBERNATE_AFTER', 0))
+        self.on_reap = []
+        self.sweep_future = None
+        self.pid = None
+
+        self.hibernations = 0
+        self.reaped = {
+            REAP_IDLE: 0,
+            REAP_ORPHANED: 0,
+            REAP_UPSTREAM_LOST: 0
+        }
+
+    def start(self):
+        """Start the sweep on the upstream loop (once per worker process)"""
+        if self.sweep_future is not None and self.pid == os.getpid() and not self.sweep_future.done():
+            return
+        self.pid = os.getpid()
+        self.sweep_future = get_upstream_loop().submit(self.run())
+        logger.info(f"Session reaper started (idle timeout {self.idle_timeout:.0f}s)")
+
+    async def run(self):
+        """Sweep every interval until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+
+    def reap_reason(self, session, now):
+        """Why a session should go, or None"""
+        if self.is_connected is not None and not self.is_connected(session.socket_id):
+            # Browser vanished without a disconnect reaching us
+            return REAP_ORPHANED
+        if (not session.connected and not session.reconnecting and not session.hibernated
+                and now - session.created_at > self.connect_timeout):
+            # Upstream never came up, or the server closed it
+            return REAP_UPSTREAM_LOST
+        if now - session.last_activity > self.idle_timeout:
+            return REAP_IDLE
+        return None
+
+    def should_hibernate(self, session, now):
+        return (
+            self.hibernate_after > 0
+            and session.ready
+            and not session.hibernated
+            and now - session.last_voice > self.hibernate_after
+        )
+
+    def sweep(self, now=None):
+        """Reap or hibernate every session that is due; returns the number reaped"""
+        now = now if now is not None else time.monotonic()
+        reaped = 0
+        for sid, session in self.registry.items():
+            reason = self.reap_reason(session, now)
+            if reason:
+                if self.reap(sid, session, reason):
+                    reaped += 1
+            elif self.should_hibernate(session, now):
+                self.hibernations += 1
+                asyncio.ensure_future(session.hibernate())
+        return reaped
+
+    def reap(self, sid, session, reason):
+        """Remove one session; the registry hook closes its upstream"""
+        if self.registry.remove(sid, session) is None:
+            # Already gone through a regular disconnect
+            return False
+
+        self.reaped[reason] += 1
+        metrics.incr(f'sessions_reaped_{reason}')
+        logger.info(f"Reaped {reason} session {sid} after {time.monotonic() - session.last_activity:.0f}s without activity")
+        for hook in self.on_reap:
+            try:
+                hook(sid, session, reason)
+            except Exception as e:
+                logger.error(f"Reap hook failed for {sid}: {e}")
+        return True
+
+    def snapshot(self, now=None):
+        """Live, idle and reaped session counts"""
+        now = now if now is not None else time.monotonic()
+        live = idle = hibernated = 0
+        for _, session in self.registry.items():
+            if session.hibernated:
+                hibernated += 1
+            elif now - session.last_activity > self.idle_after:
+                idle += 1
+            else:
+                live += 1
+        return {
+            'live': live,
+            'idle': idle,
+            'hibernated': hibernated,
+            'hibernations': self.hibernations,
+            'reaped': dict(self.reaped),
+            'reaped_total': sum(self.reaped.values()),
+            'idle_after': self.idle_after,
+            'idle_timeout': self.idle_timeout,
+            'hibernate_after': self.hibernate_after
+        }
@@ -0,0 +1,63 @@
+"""
+Process-wide counters and latency summaries for the realtime audio pipeline
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+
+class Metrics:
+    """Thread-safe named counters and latency observations"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.latencies = {}
+        self.started_at = time.time()
+
+    def incr(self, name, value=1):
+        """Increase a counter"""
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, name, seconds):
+        """Record one duration (e.g. connect latency)"""
+        ms = seconds * 1000.0
+        with self.lock:
+            summary = self.latencies.get(name)
+            if summary is None:
+                summary = self.latencies[name] = {'count': 0, 'total_ms': 0.0, 'min_ms': ms, 'max_ms': ms}
+            summary['count'] += 1
+            summary['total_ms'] += ms
+            summary['min_ms'] = min(summary['min_ms'], ms)
+            summary['max_ms'] = max(summary['max_ms'], ms)
+
+    def latency(self):
+        """Count, average, min and max per observed duration"""
+        with self.lock:
+            return {
+                name: {
+                    'count': summary['count'],
+                    'avg_ms': round(summary['total_ms'] / summary['count'], 1),
+                    'min_ms': round(summary['min_ms'], 1),
+                    'max_ms': round(summary['max_ms'], 1)
+                }
+                for name, summary in self.latencies.items()
+            }
+
+    def get(self, name):
+        """Current value of a counter"""
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def snapshot(self):
+        """Copy of all counters"""
+        with self.lock:
+            data = dict(self.counters)
+        data['uptime_seconds'] = round(time.time() - self.started_at, 1)
+        return data
+
+
+# Shared by every session in this worker
+metrics = Metrics()
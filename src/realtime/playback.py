@@ -0,0 +1,52 @@
+"""
+Tracking of assistant audio playback on the client
+Used to truncate an interrupted item to what the patient actually heard
+"""
+
+import time
+
+# Output audio is pcm16, 24 kHz mono
+BYTES_PER_MS = 24000 * 2 / 1000
+
+
+class PlaybackTracker:
+    """Estimates the playback position of the current assistant audio item"""
+
+    def __init__(self, bytes_per_ms=BYTES_PER_MS):
+        self.bytes_per_ms = bytes_per_ms
+        self.reset()
+
+    def reset(self):
+        self.item_id = None
+        self.sent_ms = 0.0
+        self.started_at = None
+        self.reported_ms = None
+
+    def start_item(self, item_id):
+        """A new assistant audio item begins"""
+        self.reset()
+        self.item_id = item_id
+
+    def sent(self, byte_count):
+        """Audio for the current item was emitted to the client"""
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        self.sent_ms += byte_count / self.bytes_per_ms
+
+    def report(self, item_id, played_ms):
+        """Playback position reported by the client itself"""
+        if item_id is None or item_id == self.item_id:
+            self.reported_ms = played_ms
+
+    def played_ms(self):
+        """Best estimate of how much audio has been heard"""
+        if self.started_at is None:
+            return 0
+        if self.reported_ms is not None:
+            return int(min(self.reported_ms, self.sent_ms))
+        elapsed_ms = (time.monotonic() - self.started_at) * 1000
+        return int(min(self.sent_ms, elapsed_ms))
+
+    def is_playing(self):
+        """Client still has audio of this item to play"""
+        return self.started_at is not None and self.played_ms() < int(self.sent_ms)
@@ -0,0 +1,97 @@
+"""
+Bounded buffer for client audio that arrives before the upstream is ready
+Patients start talking right after tapping the button; their first words are
+held here while the websocket handshake and session.update happen, then
+flushed upstream in order
+"""
+
+import logging
+import os
+from collections import deque
+
+from src.realtime.coalescer import SAMPLE_RATE, BYTES_PER_SAMPLE
+from src.realtime.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PreConnectBuffer:
+    """Holds up to max_ms of PCM16 audio; the oldest audio is dropped beyond that
+
+    Dropping from the front keeps what is buffered contiguous with the live
+    audio that follows the flush. Callers serialize push/drain.
+    """
+
+    def __init__(self, max_ms=None, sample_rate=SAMPLE_RATE, metric_prefix='preconnect'):
+        self.max_ms = max_ms or int(os.environ.get('REALTIME_PRECONNECT_MS', 5000))
+        self.metric_prefix = metric_prefix
+        self.max_bytes = int(sample_rate * self.max_ms / 1000) * BYTES_PER_SAMPLE
+        self.bytes_per_ms = sample_rate * BYTES_PER_SAMPLE / 1000
+        self.chunks = deque()
+        self.size = 0
+
+        self.stats = {
+            'buffered_bytes': 0,
+            'dropped_bytes': 0,
+            'flushed_bytes': 0,
+            'flushes': 0
+        }
+
+    def push(self, audio_bytes):
+        """Buffer one packet; returns the status used as the client ack"""
+        self.chunks.append(audio_bytes)
+        self.size += len(audio_bytes)
+        self.stats['buffered_bytes'] += len(audio_bytes)
+        metrics.incr(f'{self.metric_prefix}_bytes_buffered', len(audio_bytes))
+
+        dropped = 0
+        while self.size > self.max_bytes and self.chunks:
+            excess = self.size - self.max_bytes
+            head = self.chunks[0]
+            if len(head) <= excess:
+                self.chunks.popleft()
+                cut = len(head)
+            else:
+                # Trim on a sample boundary
+                cut = excess + excess % BYTES_PER_SAMPLE
+                self.chunks[0] = head[cut:]
+            self.size -= cut
+            dropped += cut
+
+        if dropped:
+            self.stats['dropped_bytes'] += dropped
+            metrics.incr(f'{self.metric_prefix}_bytes_dropped', dropped)
+
+        return {
+            'accepted': True,
+            'buffered': True,
+            'buffered_ms': self.buffered_ms(),
+            'dropped_bytes': dropped
+        }
+
+    def drain(self):
+        """Remove and return the buffered packets, oldest first"""
+        chunks = list(self.chunks)
+        if chunks:
+            self.stats['flushed_bytes'] += self.size
+            self.stats['flushes'] += 1
+            metrics.incr(f'{self.metric_prefix}_bytes_flushed', self.size)
+        self.chunks.clear()
+        self.size = 0
+        return chunks
+
+    def clear(self):
+        """Discard buffered audio; returns the number of bytes dropped"""
+        dropped = self.size
+        if dropped:
+            self.stats['dropped_bytes'] += dropped
+            metrics.incr(f'{self.metric_prefix}_bytes_dropped', dropped)
+        self.chunks.clear()
+        self.size = 0
+        return dropped
+
+    def buffered_ms(self):
+        return int(self.size / self.bytes_per_ms)
+
+    def snapshot(self):
+        return dict(self.stats, buffered_ms=self.buffered_ms(), max_ms=self.max_ms)
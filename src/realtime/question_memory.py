@@ -0,0 +1,118 @@
+"""
+Compact memory of the questions an assistant has asked
+Free-form model output is normalized and fuzzy-matched to canonical question
+IDs; the prompt only carries a fixed-budget summary of covered topics
+"""
+
+import re
+import unicodedata
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+# Dutch function words that carry no topic information
+STOPWORDS = frozenset("""
+de het een en of u uw je jij jouw ik mij mijn we wij ons onze ze zij hun hij
+is zijn was waren bent ben heeft hebt heb had hadden wordt worden kan kunt
+kunnen zou zouden wil wilt moet doet doen er ook nog al dan die dat deze dit
+wat wie waar hoe welke wanneer met van voor naar op aan in uit bij om over
+tot te niet geen wel zo als maar dus even eens graag misschien veel heel zeer
+""".split())
+
+SENTENCE_SPLIT = re.compile(r'(?<=[?.!])\s+')
+NON_WORD = re.compile(r'[^a-z0-9\s]')
+
+
+def normalize(text):
+    """Lowercase, accent-free text without punctuation"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(NON_WORD.sub(' ', text).split())
+
+
+def content_tokens(normalized):
+    """Topic-bearing words with a crude Dutch suffix strip"""
+    tokens = set()
+    for word in normalized.split():
+        if word in STOPWORDS or len(word) < 3:
+            continue
+        for suffix in ('heden', 'ingen', 'en', 'e', 's'):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        tokens.add(word)
+    return tokens
+
+
+class QuestionMemory:
+    """Maps assistant utterances onto canonical question IDs"""
+
+    def __init__(self, question_phases, threshold=0.5, single_token_threshold=0.8, summary_budget=600):
+        self.threshold = threshold
+        # One shared topic word only counts when the phrasing is nearly the same as well
+        self.single_token_threshold = single_token_threshold
+        self.summary_budget = summary_budget
+
+        # phase -> [(question_id, text, normalized, tokens)]
+        self.canonical = {}
+        for phase, questions in question_phases.items():
+            self.canonical[phase] = [
+                (f"{phase}:{index}", text, normalize(text), content_tokens(normalize(text)))
+                for index, text in enumerate(questions)
+            ]
+
+        self.covered = OrderedDict()
+        self.turns = 0
+
+    def match(self, sentence):
+        """Best canonical question ID for one sentence, or None"""
+        normalized = normalize(sentence)
+        tokens = content_tokens(normalized)
+        if not normalized:
+            return None
+
+        best_id, best_score = None, 0.0
+        for questions in self.canonical.values():
+            for question_id, _, canonical_norm, canonical_tokens in questions:
+                shared = len(tokens & canonical_tokens)
+                if not shared:
+                    # Without a shared topic word, similar phrasing is not the same question
+                    continue
+                ratio = SequenceMatcher(None, normalized, canonical_norm).ratio()
+                if shared < min(2, len(canonical_tokens)) and ratio < self.single_token_threshold:
+                    # "Kunt u de pijn beschrijven?" shares only "beschrijven" with the complaints question
+                    continue
+                score = max(shared / len(canonical_tokens), ratio)
+                if score > best_score:
+                    best_id, best_score = question_id, score
+        if best_score >= self.threshold:
+            return best_id
+        return None
+
+    def record(self, utterance):
+        """Remember the questions in an assistant utterance; returns matched IDs"""
+        self.turns += 1
+        matched = []
+        sentences = [s for s in SENTENCE_SPLIT.split(utterance.strip()) if s.endswith('?')] or [utterance]
+        for sentence in sentences:
+            question_id = self.match(sentence)
+            if question_id:
+                self.covered[question_id] = True
+                matched.append(question_id)
+        return matched
+
+    def remaining(self, phase):
+        """Canonical questions of a phase that have not been asked yet"""
+        return [text for question_id, text, _, _ in self.canonical.get(phase, []) if question_id not in self.covered]
+
+    def summary(self):
+        """Covered topics per phase, capped at summary_budget characters"""
+        parts = []
+        for phase, questions in self.canonical.items():
+            asked = [text for question_id, text, _, _ in questions if question_id in self.covered]
+            if asked:
+                parts.append(f"{phase}: {' '.join(asked)}")
+
+        text = '\n'.join(parts)
+        if len(text) > self.summary_budget:
+            text = text[:self.summary_budget - 4].rsplit(' ', 1)[0] + ' ...'
+        return text
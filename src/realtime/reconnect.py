@@ -0,0 +1,89 @@
+"""
+Upstream reconnect support
+Jittered exponential backoff between attempts, and replay of a compacted
+consultation so a fresh upstream session continues where the old one stopped
+"""
+
+import os
+import random
+
+# medical_data keys as the model should read them
+MEDICAL_LABELS = {
+    'symptoms': 'symptomen',
+    'medications': 'medicatie',
+    'family_history': 'familieanamnese',
+    'risk_factors': 'risicofactoren'
+}
+
+
+class Backoff:
+    """Full-jitter exponential backoff: delay n is uniform in [0, min(cap, base * 2**n)]"""
+
+    def __init__(self, base=None, cap=None, max_attempts=None, rng=None):
+        self.base = base or float(os.environ.get('REALTIME_RECONNECT_BASE', 0.5))
+        self.cap = cap or float(os.environ.get('REALTIME_RECONNECT_CAP', 15))
+        self.max_attempts = max_attempts or int(os.environ.get('REALTIME_RECONNECT_ATTEMPTS', 6))
+        self.rng = rng or random.Random()
+        self.attempt = 0
+
+    def next_delay(self):
+        """Delay before the next attempt, or None when attempts are exhausted"""
+        if self.attempt >= self.max_attempts:
+            return None
+        ceiling = min(self.cap, self.base * (2 ** self.attempt))
+        self.attempt += 1
+        # The first retry goes out quickly; a brief blip shouldn't cost seconds
+        return self.rng.uniform(0, ceiling)
+
+    def reset(self):
+        self.attempt = 0
+
+
+def _clip(text, limit):
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + '...'
+
+
+def _message(role, text):
+    return {
+        "type": "conversation.item.create",
+        "item": {
+            "type": "message",
+            "role": role,
+            "content": [{
+                # Assistant items carry output text, user/system items input text
+                "type": "text" if role == 'assistant' else "input_text",
+                "text": text
+            }]
+        }
+    }
+
+
+def build_replay_items(history, medical_data, phase, max_turns=None, max_chars=None):
+    """conversation.item.create events rebuilding a consultation on a new upstream session
+
+    One system item carries the phase, the extracted medical data and the
+    older turns in condensed form; only the last max_turns turns are replayed
+    as messages, each clipped to max_chars.
+    """
+    max_turns = max_turns or int(os.environ.get('REALTIME_REPLAY_TURNS', 12))
+    max_chars = max_chars or int(os.environ.get('REALTIME_REPLAY_CHARS', 400))
+
+    older = history[:-max_turns] if len(history) > max_turns else []
+    recent = history[-max_turns:]
+
+    lines = [f"Het consult wordt hervat na een onderbreking. Huidige fase: {phase}. Begroet de patiënt niet opnieuw."]
+    for key, label in MEDICAL_LABELS.items():
+        values = medical_data.get(key) or []
+        if values:
+            lines.append(f"{label}: {', '.join(values)}")
+    if older:
+        asked = [_clip(' '.join(entry['content'].split()), 80) for entry in older if entry.get('role') == 'assistant']
+        lines.append(f"Eerdere beurten: {len(older)}. Al gevraagd: {' | '.join(asked)}" if asked else f"Eerdere beurten: {len(older)}.")
+
+    items = [_message('system', _clip('\n'.join(lines), max_chars * 4))]
+    for entry in recent:
+        role = entry.get('role')
+        content = entry.get('content')
+        if role in ('user', 'assistant') and content:
+            items.append(_message(role, _clip(' '.join(content.split()), max_chars)))
+    return items
@@ -0,0 +1,105 @@
+"""
+Registry of live Realtime sessions keyed by Socket.IO sid
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRegistry:
+    """Thread-safe sid -> session map with per-session locks and lifecycle hooks"""
+
+    def __init__(self, name, capacity=None):
+        self.name = name
+        self.capacity = capacity or int(os.environ.get('REALTIME_MAX_SESSIONS', 500))
+        self.sessions = {}
+        self.session_locks = {}
+        self.created_at = {}
+        self.lock = threading.Lock()
+
+        self.on_add = []
+        self.on_remove = []
+
+        self.stats = {
+            'added': 0,
+            'removed': 0,
+            'rejected': 0,
+            'peak': 0
+        }
+
+    def add(self, sid, session):
+        """Register a session; returns (accepted, replaced_session)"""
+        with self.lock:
+            replaced = self.sessions.pop(sid, None)
+            if replaced is None and len(self.sessions) >= self.capacity:
+                self.stats['rejected'] += 1
+                return False, None
+
+            self.sessions[sid] = session
+            self.session_locks.setdefault(sid, threading.RLock())
+            self.created_at[sid] = time.time()
+            self.stats['added'] += 1
+            self.stats['peak'] = max(self.stats['peak'], len(self.sessions))
+
+        if replaced is not None:
+            self._run_hooks(self.on_remove, sid, replaced)
+        self._run_hooks(self.on_add, sid, session)
+        return True, replaced
+
+    def get(self, sid):
+        """Session for a sid, or None"""
+        return self.sessions.get(sid)
+
+    def lock_for(self, sid):
+        """Per-session lock serializing handlers of one consultation"""
+        with self.lock:
+            return self.session_locks.setdefault(sid, threading.RLock())
+
+    def remove(self, sid, session=None):
+        """Unregister a sid (only if it still maps to session, when given)"""
+        with self.lock:
+            current = self.sessions.get(sid)
+            if current is None or (session is not None and current is not session):
+                return None
+            del self.sessions[sid]
+            self.session_locks.pop(sid, None)
+            self.created_at.pop(sid, None)
+            self.stats['removed'] += 1
+
+        self._run_hooks(self.on_remove, sid, current)
+        return current
+
+    def items(self):
+        """Snapshot of (sid, session) pairs"""
+        with self.lock:
+            return list(self.sessions.items())
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, sid):
+        return sid in self.sessions
+
+    def _run_hooks(self, hooks, sid, session):
+        for hook in hooks:
+            try:
+                hook(sid, session)
+            except Exception as e:
+                logger.error(f"Session hook failed for {sid} in {self.name}: {e}")
+
+    def snapshot(self):
+        """Capacity statistics"""
+        with self.lock:
+            active = len(self.sessions)
+            oldest = min(self.created_at.values()) if self.created_at else None
+            return dict(
+                self.stats,
+                active=active,
+                capacity=self.capacity,
+                utilization=round(active / self.capacity, 3) if self.capacity else 0.0,
+                oldest_session_age=round(time.time() - oldest, 1) if oldest else 0.0
+            )
@@ -0,0 +1,125 @@
+"""
+Streaming PCM16 resampler for realtime microphone audio
+Browsers capture at 44.1 or 48 kHz while the session is configured for pcm16
+at 24 kHz. Each session that declares another sample_rate gets a polyphase
+resampler (the windowed-sinc bank used for Whisper uploads) that carries its
+input history from one chunk to the next, so the output matches resampling
+the whole recording in one go (to the last bit of rounding) and chunk
+boundaries don't click
+"""
+
+import logging
+import math
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src.audio_dsp import filter_bank, FILTER_PHASES
+from src.realtime.coalescer import SAMPLE_RATE, BYTES_PER_SAMPLE
+
+logger = logging.getLogger(__name__)
+
+MIN_RATE = 8000
+MAX_RATE = 96000
+
+_period_matrices = {}
+
+
+def parse_sample_rate(value):
+    """Client-declared capture rate as an int, or None when missing; ValueError when unusable"""
+    if value in (None, '', 0):
+        return None
+    rate = int(value)
+    if not MIN_RATE <= rate <= MAX_RATE:
+        raise ValueError(f"sample_rate must be between {MIN_RATE} and {MAX_RATE} Hz")
+    return rate
+
+
+def period_matrix(src_rate, dst_rate):
+    """Resampling as one matrix product per period: (matrix[window, outputs], inputs per period)
+
+    A period is the smallest run of outputs whose input positions repeat the
+    same phases, widened to at least one filter length of input. Its outputs
+    depend on a fixed-size window of input, so a chunk of periods is a strided
+    view of the input times this matrix
+    """
+    key = (src_rate, dst_rate)
+    cached = _period_matrices.get(key)
+    if cached is not None:
+        return cached
+    divisor = math.gcd(src_rate, dst_rate)
+    up, step = dst_rate // divisor, src_rate // divisor
+    phases = min(up, FILTER_PHASES)
+    bank, offsets = filter_bank(src_rate, dst_rate, phases=phases)
+    taps = len(offsets)
+    periods = max(1, -(-taps // step))
+    period_in, period_out = step * periods, up * periods
+
+    # Column j holds output j's taps, starting at its integer input position
+    matrix = np.zeros((period_in + taps, period_out), np.float32)
+    for j in range(period_out):
+        base, remainder = divmod(j * step, up)
+        matrix[base:base + taps, j] = bank[remainder * phases // up]
+    cached = _period_matrices[key] = (matrix, period_in)
+    return cached
+
+
+class StreamResampler:
+    """Per-session PCM16 rate converter; callers serialize process (the capture lock)"""
+
+    def __init__(self, src_rate, dst_rate=SAMPLE_RATE):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.matrix, self.period_in = period_matrix(src_rate, dst_rate)
+        self.window = self.matrix.shape[0]
+        half = (self.window - self.period_in) // 2
+
+        # Input history as int16-scaled float32, starting at the next period's window;
+        # the zeros stand in for the audio before the first sample
+        self.history = np.zeros(half - 1, np.float32)
+        self.remainder = b''
+        self.received = 0
+        self.processing = 0.0
+
+    def process(self, audio):
+        """PCM16 at dst_rate for every whole period this chunk completes; the rest waits for the next one"""
+        started = time.perf_counter()
+        data = self.remainder + audio if self.remainder else audio
+        usable = len(data) - len(data) % BYTES_PER_SAMPLE
+        self.remainder = data[usable:]
+        if usable:
+            samples = np.frombuffer(data, '<i2', usable // BYTES_PER_SAMPLE).astype(np.float32)
+            self.history = np.concatenate([self.history, samples])
+            self.received += len(samples)
+
+        count = (len(self.history) - self.window) // self.period_in + 1
+        if count <= 0:
+            self.processing += time.perf_counter() - started
+            return b''
+
+        # Overlapping windows, one row per period, as a view on the history (as_strided costs more than the product)
+        itemsize = self.history.itemsize
+        windows = np.ndarray((count, self.window), np.float32, self.history, 0, (self.period_in * itemsize, itemsize))
+        out = np.dot(windows, self.matrix)
+        self.history = self.history[count * self.period_in:]
+
+        # In place: np.clip's wrapper alone is a sizeable share of a 20 ms packet
+        np.rint(out, out=out)
+        np.maximum(out, -32768, out=out)
+        np.minimum(out, 32767, out=out)
+        pcm = out.astype('<i2').tobytes()
+        self.processing += time.perf_counter() - started
+        return pcm
+
+    def snapshot(self):
+        seconds = self.received / self.src_rate
+        return {
+            'input_rate': self.src_rate,
+            'output_rate': self.dst_rate,
+            'input_seconds': round(seconds, 2),
+            'processing_ms': round(self.processing * 1000, 1),
+            'realtime_factor': round(self.processing / seconds, 5) if seconds else 0.0
+        }
@@ -0,0 +1,225 @@
+"""
+Ordered outbound queue for upstream OpenAI Realtime messages
+Socket.IO handlers enqueue from any thread, a single writer task on the
+upstream loop drains the queue so appends always precede their commit
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+
+from src.realtime.audio_transport import encode_append
+
+logger = logging.getLogger(__name__)
+
+AUDIO = 'audio'
+EVENT = 'event'
+
+POLICIES = ('drop_oldest', 'merge')
+
+
+class SendQueue:
+    """Bounded per-session send queue with drop/merge policy for stale audio"""
+
+    def __init__(self, name, max_items=None, max_audio_bytes=None, policy=None, encode_audio=None):
+        self.name = name
+        # Queued audio stays PCM16 (replayable after a reconnect); the upstream codec is applied on send
+        self.encode_audio = encode_audio
+        self.max_items = max_items or int(os.environ.get('REALTIME_SEND_QUEUE_SIZE', 64))
+        self.max_audio_bytes = max_audio_bytes or int(os.environ.get('REALTIME_SEND_QUEUE_BYTES', 480000))
+        self.policy = policy or os.environ.get('REALTIME_SEND_QUEUE_POLICY', 'merge')
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown send queue policy: {self.policy}")
+
+        # Backpressure is signalled once the queue is this full
+        self.high_watermark = max(1, int(self.max_items * 0.75))
+
+        self.items = deque()
+        self.audio_bytes = 0
+        self.lock = threading.Lock()
+
+        self.loop = None
+        self.wakeup = None
+        self.writer_task = None
+        self.send = None
+
+        self.stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'merged': 0,
+            'dropped': 0,
+            'dropped_bytes': 0,
+            'backpressure': 0,
+            'errors': 0
+        }
+
+    def start(self, send):
+        """Start the writer task; must be called on the upstream loop"""
+        self.send = send
+        self.wakeup = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.writer_task = asyncio.create_task(self.run_writer())
+        if self.items:
+            self.wakeup.set()
+
+    async def stop(self):
+        """Stop the writer task and discard anything still queued"""
+        task = self.writer_task
+        self.writer_task = None
+        if task and task is not asyncio.current_task():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.clear()
+
+    def clear(self):
+        """Drop all queued messages"""
+        with self.lock:
+            self.items.clear()
+            self.audio_bytes = 0
+
+    def take_audio(self):
+        """Remove everything queued and return the pending audio, oldest first"""
+        with self.lock:
+            audio = [bytes(payload) for kind, payload in self.items if kind == AUDIO]
+            self.items.clear()
+            self.audio_bytes = 0
+        return audio
+
+    def put_audio(self, audio_bytes):
+        """Queue PCM16 audio for input_audio_buffer.append and report fill level"""
+        with self.lock:
+            self.stats['enqueued'] += 1
+            was_full = self._above_watermark()
+            last = self.items[-1] if self.items else None
+
+            if len(self.items) >= self.max_items and self.policy == 'merge' and last and last[0] == AUDIO:
+                # Fold into the newest pending append instead of growing the queue
+                merged = last[1] if isinstance(last[1], bytearray) else bytearray(last[1])
+                merged.extend(audio_bytes)
+                self.items[-1] = (AUDIO, merged)
+                self.stats['merged'] += 1
+            else:
+                if len(self.items) >= self.max_items:
+                    self._drop_oldest_audio()
+                # Frames are handed over as-is; only merging makes a mutable copy
+                self.items.append((AUDIO, audio_bytes))
+
+            self.audio_bytes += len(audio_bytes)
+            while self.audio_bytes > self.max_audio_bytes and self._drop_oldest_audio():
+                pass
+
+            status = self._status()
+            self._count_backpressure(was_full, status)
+
+        self._notify()
+        return status
+
+    def put_event(self, event, urgent=False):
+        """Queue a control event; control events are never dropped"""
+        return self.put_events([event], urgent=urgent)
+
+    def put_events(self, events, urgent=False):
+        """Queue control events that must reach the upstream in the given order"""
+        with self.lock:
+            self.stats['enqueued'] += len(events)
+            was_full = self._above_watermark()
+            if urgent:
+                # The batch jumps pending audio as a whole, keeping its own order
+                # (response.cancel before conversation.item.truncate on barge-in)
+                self.items.extendleft((EVENT, event) for event in reversed(events))
+            else:
+                self.items.extend((EVENT, event) for event in events)
+            status = self._status()
+            self._count_backpressure(was_full, status)
+
+        self._notify()
+        return status
+
+    def status(self):
+        """Current fill level"""
+        with self.lock:
+            return self._status()
+
+    def _drop_oldest_audio(self):
+        """Discard the oldest queued audio; caller holds the lock"""
+        for index, (kind, payload) in enumerate(self.items):
+            if kind == AUDIO:
+                del self.items[index]
+                self.audio_bytes -= len(payload)
+                self.stats['dropped'] += 1
+                self.stats['dropped_bytes'] += len(payload)
+                return True
+        return False
+
+    def _above_watermark(self):
+        """Queue is past the high-water mark (items or bytes); caller holds the lock"""
+        return len(self.items) >= self.high_watermark or self.audio_bytes >= self.max_audio_bytes * 0.75
+
+    def _count_backpressure(self, was_full, status):
+        """Count an episode only when this enqueue crossed the high-water mark"""
+        if status['backpressure'] and not was_full:
+            self.stats['backpressure'] += 1
+
+    def _status(self):
+        """Fill level reported back to the browser in the Socket.IO ack"""
+        return {
+            'accepted': True,
+            'queued': len(self.items),
+            'queued_bytes': self.audio_bytes,
+            'backpressure': self._above_watermark()
+        }
+
+    def _notify(self):
+        """Wake the writer task from any thread"""
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            # Loop is shutting down
+            pass
+
+    def encode(self, kind, payload):
+        """Serialize a queued item into an upstream message"""
+        if kind == AUDIO:
+            return encode_append(self.encode_audio(payload) if self.encode_audio else payload)
+        return json.dumps(payload)
+
+    async def run_writer(self):
+        """Drain the queue in order, one message at a time"""
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+
+                while True:
+                    with self.lock:
+                        if not self.items:
+                            break
+                        kind, payload = self.items.popleft()
+                        if kind == AUDIO:
+                            self.audio_bytes -= len(payload)
+
+                    try:
+                        await self.send(self.encode(kind, payload))
+                        self.stats['sent'] += 1
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        self.stats['errors'] += 1
+                        logger.error(f"Failed to send queued message for {self.name}: {e}")
+
+        except asyncio.CancelledError:
+            logger.info(f"Send queue writer stopped for {self.name}")
+            raise
+
+    def snapshot(self):
+        """Queue statistics for metrics endpoints"""
+        with self.lock:
+            return dict(self.stats, queued=len(self.items), queued_bytes=self.audio_bytes, policy=self.policy)
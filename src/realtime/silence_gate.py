@@ -0,0 +1,176 @@
+"""
+Server-side silence gate for realtime microphone audio
+Classifies 20 ms PCM16 frames by energy and zero-crossing rate and forwards
+only speech upstream. A short pre-roll of the frames before an onset goes up
+with it, and after speech the gate stays open for a hangover longer than the
+session's server-VAD silence_duration_ms, so the upstream VAD still sees the
+pause that ends the turn
+"""
+
+import logging
+import math
+import os
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src.realtime.coalescer import SAMPLE_RATE, BYTES_PER_SAMPLE
+from src.realtime.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Off unless enabled here or per session on connect_realtime
+GATE_ENABLED = os.environ.get('REALTIME_SILENCE_GATE', '0') == '1'
+GATE_RMS = float(os.environ.get('REALTIME_GATE_RMS', 250))
+# Fricatives ("s", "f", "sch") are quiet but cross zero often
+GATE_ZCR = float(os.environ.get('REALTIME_GATE_ZCR', 0.25))
+GATE_PREROLL_MS = int(os.environ.get('REALTIME_GATE_PREROLL_MS', 300))
+GATE_HANGOVER_MARGIN_MS = int(os.environ.get('REALTIME_GATE_HANGOVER_MARGIN_MS', 300))
+# Speech must stand out this far above the room's noise floor
+NOISE_RATIO = 3.0
+FRAME_MS = 20
+
+
+def gate_available():
+    return np is not None
+
+
+class SilenceGate:
+    """Per-session speech gate; callers serialize process/flush (the capture lock)"""
+
+    def __init__(self, vad_silence_ms, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, rms_threshold=None,
+                 zcr_threshold=None, hangover_ms=None, preroll_ms=None):
+        self.frame_ms = frame_ms
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.frame_bytes = self.frame_samples * BYTES_PER_SAMPLE
+        self.bytes_per_second = sample_rate * BYTES_PER_SAMPLE
+        self.rms_threshold = rms_threshold or GATE_RMS
+        self.zcr_threshold = zcr_threshold or GATE_ZCR
+
+        # Closing before the upstream VAD has seen silence_duration_ms would leave the turn open
+        minimum = vad_silence_ms + frame_ms
+        self.hangover_ms = hangover_ms or vad_silence_ms + GATE_HANGOVER_MARGIN_MS
+        if self.hangover_ms < minimum:
+            logger.warning(f"Gate hangover {self.hangover_ms} ms is below the VAD silence of {vad_silence_ms} ms, using {minimum} ms")
+            self.hangover_ms = minimum
+        self.hangover_frames = math.ceil(self.hangover_ms / frame_ms)
+        self.preroll_ms = preroll_ms if preroll_ms is not None else GATE_PREROLL_MS
+        self.preroll = deque(maxlen=math.ceil(self.preroll_ms / frame_ms))
+
+        self.remainder = b''
+        self.open = False
+        self.hang = 0
+        self.noise_floor = None
+
+        self.stats = {
+            'kept_bytes': 0,
+            'dropped_bytes': 0,
+            'openings': 0
+        }
+
+    def classify(self, data, count):
+        """Speech flag per frame; energy and zero crossings come from two dot products over the chunk"""
+        frames = np.frombuffer(data, '<i2', count * self.frame_samples).reshape(count, self.frame_samples).astype(np.float32)
+        energy = np.einsum('ij,ij->i', frames, frames).tolist()
+        signs = np.sign(frames)
+        # Neighbours with equal sign add 1, a crossing subtracts 1
+        agreement = np.einsum('ij,ij->i', signs[:, 1:], signs[:, :-1]).tolist()
+
+        threshold = self.rms_threshold
+        if self.noise_floor is not None:
+            threshold = max(threshold, self.noise_floor * NOISE_RATIO)
+        pairs = self.frame_samples - 1
+
+        speech = []
+        quiet = []
+        for frame_energy, frame_agreement in zip(energy, agreement):
+            rms = math.sqrt(frame_energy / self.frame_samples)
+            zcr = (pairs - frame_agreement) / (2 * pairs)
+            is_speech = rms >= threshold or (rms >= threshold / 2 and zcr >= self.zcr_threshold)
+            speech.append(is_speech)
+            if not is_speech:
+                quiet.append(rms)
+
+        if quiet:
+            level = sum(quiet) / len(quiet)
+            self.noise_floor = level if self.noise_floor is None else 0.9 * self.noise_floor + 0.1 * level
+        return speech
+
+    def process(self, audio):
+        """Bytes to forward for this packet (possibly empty); a partial frame waits for the next one"""
+        data = self.remainder + audio if self.remainder else audio
+        count = len(data) // self.frame_bytes
+        self.remainder = data[count * self.frame_bytes:]
+        if not count:
+            return b''
+
+        out = []
+        dropped = 0
+        fb = self.frame_bytes
+        for index, is_speech in enumerate(self.classify(data, count)):
+            frame = data[index * fb:(index + 1) * fb]
+            if is_speech:
+                if not self.open:
+                    self.open = True
+                    self.stats['openings'] += 1
+                    # The frames just before the onset carry its attack
+                    out.extend(self.preroll)
+                    self.preroll.clear()
+                self.hang = self.hangover_frames
+                out.append(frame)
+            elif self.open:
+                out.append(frame)
+                self.hang -= 1
+                if self.hang <= 0:
+                    self.open = False
+            else:
+                if len(self.preroll) == self.preroll.maxlen:
+                    dropped += fb
+                self.preroll.append(frame)
+
+        forwarded = b''.join(out)
+        self._count(len(forwarded), dropped)
+        return forwarded
+
+    def flush(self):
+        """Partial frame at a commit: forwarded while open, dropped otherwise"""
+        tail, self.remainder = self.remainder, b''
+        if self.open:
+            self._count(len(tail), 0)
+            return tail
+        self._count(0, len(tail))
+        return b''
+
+    def reset(self):
+        """Closed gate, nothing held (reconnect, teardown)"""
+        self._count(0, len(self.remainder) + sum(len(frame) for frame in self.preroll))
+        self.preroll.clear()
+        self.remainder = b''
+        self.open = False
+        self.hang = 0
+
+    def _count(self, kept, dropped):
+        # Process-wide totals in milliseconds; sessions may run at different rates
+        if kept:
+            self.stats['kept_bytes'] += kept
+            metrics.incr('gate_ms_kept', kept * 1000 // self.bytes_per_second)
+        if dropped:
+            self.stats['dropped_bytes'] += dropped
+            metrics.incr('gate_ms_dropped', dropped * 1000 // self.bytes_per_second)
+
+    def snapshot(self):
+        kept = self.stats['kept_bytes'] / self.bytes_per_second
+        dropped = self.stats['dropped_bytes'] / self.bytes_per_second
+        return {
+            'open': self.open,
+            'kept_seconds': round(kept, 2),
+            'dropped_seconds': round(dropped, 2),
+            'dropped_ratio': round(dropped / (kept + dropped), 3) if kept + dropped else 0.0,
+            'openings': self.stats['openings'],
+            'hangover_ms': self.hangover_ms,
+            'preroll_ms': self.preroll_ms,
+            'noise_floor': round(self.noise_floor, 1) if self.noise_floor is not None else None
+        }
@@ -0,0 +1,122 @@
+"""
+Turn state per Realtime session
+With server VAD the API commits the input buffer and creates a response by
+itself; the turn manager collapses client commit/response.create requests
+that would duplicate that work
+"""
+
+import logging
+import threading
+
+from src.realtime.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+IDLE = 'idle'
+LISTENING = 'listening'
+COMMITTED = 'committed'
+RESPONDING = 'responding'
+
+
+class TurnManager:
+    """Tracks whether a response is pending or in progress for one session"""
+
+    def __init__(self, name, server_vad=True):
+        self.name = name
+        self.server_vad = server_vad
+        self.state = IDLE
+        self.response_pending = False
+        self.audio_since_commit = False
+        self.deferred_response = False
+        self.lock = threading.Lock()
+
+        self.stats = {
+            'commits_sent': 0,
+            'responses_requested': 0,
+            'commits_avoided': 0,
+            'responses_avoided': 0
+        }
+
+    def note_audio(self):
+        """Client audio went upstream since the last commit"""
+        self.audio_since_commit = True
+
+    def on_event(self, event_type, event=None):
+        """Follow the upstream turn lifecycle; True when a deferred response.create is due"""
+        with self.lock:
+            if event_type == 'input_audio_buffer.speech_started':
+                if self.state != RESPONDING:
+                    self.state = LISTENING
+            elif event_type == 'input_audio_buffer.committed':
+                self.audio_since_commit = False
+                if self.state != RESPONDING:
+                    self.state = COMMITTED
+                if self.server_vad:
+                    # VAD commits are followed by an automatic response
+                    self.response_pending = True
+            elif event_type == 'response.created':
+                self.state = RESPONDING
+                self.response_pending = False
+            elif event_type == 'response.done':
+                self.state = IDLE
+                self.response_pending = False
+                if self.deferred_response:
+                    self.deferred_response = False
+                    self.response_pending = True
+                    return True
+            elif event_type == 'error' and event:
+                code = event.get('error', {}).get('code')
+                if code in ('input_audio_buffer_commit_empty', 'conversation_already_has_active_response'):
+                    self.response_pending = False
+                    if self.state == COMMITTED:
+                        self.state = IDLE
+        return False
+
+    def request_commit(self):
+        """Client asked to commit audio; returns (send_commit, send_response_create)"""
+        with self.lock:
+            busy = self.response_pending or self.state in (COMMITTED, RESPONDING)
+            nothing_new = self.server_vad and self.state == IDLE and not self.audio_since_commit
+
+            if busy or nothing_new:
+                # Server VAD already took care of this turn
+                self.stats['commits_avoided'] += 1
+                self.stats['responses_avoided'] += 1
+                metrics.incr('turn_commits_avoided')
+                metrics.incr('turn_responses_avoided')
+                return False, False
+
+            self.audio_since_commit = False
+            self.response_pending = True
+            self.state = COMMITTED
+            self.stats['commits_sent'] += 1
+            self.stats['responses_requested'] += 1
+            return True, True
+
+    def request_response(self):
+        """A response.create is about to be sent (e.g. after text input); False if redundant"""
+        with self.lock:
+            if self.state == RESPONDING and not self.response_pending:
+                # The running response won't see the new input; answer it afterwards
+                self.deferred_response = True
+                return False
+            if self.response_pending:
+                self.stats['responses_avoided'] += 1
+                metrics.incr('turn_responses_avoided')
+                return False
+            self.response_pending = True
+            self.stats['responses_requested'] += 1
+            return True
+
+    def reset(self):
+        """Forget turn state (reconnect, teardown)"""
+        with self.lock:
+            self.state = IDLE
+            self.response_pending = False
+            self.audio_since_commit = False
+            self.deferred_response = False
+
+    def snapshot(self):
+        """Turn statistics"""
+        with self.lock:
+            return dict(self.stats, state=self.state, response_pending=self.response_pending)
@@ -0,0 +1,93 @@
+"""
+Dedicated asyncio event loop for upstream OpenAI Realtime connections
+Every upstream websocket in a worker process is created and used on this loop
+"""
+
+import asyncio
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamLoop:
+    """Background thread running a single long-lived asyncio event loop"""
+
+    def __init__(self, name='realtime-upstream'):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.pid = None
+        self._lock = threading.Lock()
+
+    def is_running(self):
+        """Check whether the loop thread is alive in the current process"""
+        return (
+            self.loop is not None
+            and self.pid == os.getpid()
+            and self.thread is not None
+            and self.thread.is_alive()
+        )
+
+    def start(self):
+        """Start the loop thread (once per process) and return the loop"""
+        if self.is_running():
+            return self.loop
+
+        with self._lock:
+            if self.is_running():
+                return self.loop
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                try:
+                    loop.run_forever()
+                finally:
+                    # Cancel whatever is still pending before closing the loop
+                    pending = asyncio.all_tasks(loop)
+                    for task in pending:
+                        task.cancel()
+                    if pending:
+                        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                    loop.close()
+
+            thread = threading.Thread(target=run, name=self.name, daemon=True)
+            thread.start()
+            ready.wait()
+
+            self.loop = loop
+            self.thread = thread
+            self.pid = os.getpid()
+            logger.info(f"Upstream event loop started in process {self.pid}")
+            return loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the upstream loop from any thread"""
+        loop = self.start()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def stop(self, timeout=5):
+        """Stop the loop and wait for the thread to finish"""
+        if not self.is_running():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        logger.info(f"Upstream event loop stopped in process {self.pid}")
+        self.loop = None
+        self.thread = None
+        self.pid = None
+
+
+# One loop per worker process
+_upstream_loop = UpstreamLoop()
+
+
+def get_upstream_loop():
+    """Get the upstream loop for this worker, starting it on first use"""
+    _upstream_loop.start()
+    return _upstream_loop
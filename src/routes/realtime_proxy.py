@@ -3,14 +3,28 @@ OpenAI Realtime API Proxy for Speech-to-Speech functionality
 Handles WebSocket connections and audio streaming
 """
 
-import asyncio
+import binascii
 import websockets
 import json
-import base64
 import logging
 from flask import Blueprint, request, jsonify
 from flask_socketio import SocketIO, emit, disconnect
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.realtime.upstream_loop import get_upstream_loop
+from src.realtime.send_queue import SendQueue
+from src.realtime.coalescer import AudioCoalescer, SAMPLE_RATE
+from src.realtime.audio_transport import decode_client_audio, encode_client_audio, encode_client_pcm
+from src.realtime.event_router import AUDIO_DELTA, peek_event_type, extract_string
+from src.realtime.turns import TurnManager
+from src.realtime.instructions import InstructionSync, render_proxy_instructions
+from src.realtime.question_memory import QuestionMemory
+from src.realtime.registry import SessionRegistry
+from src.realtime.silence_gate import SilenceGate, GATE_ENABLED, gate_available
+from src.realtime.resampler import parse_sample_rate
+from src.realtime.codec import CodecBridge, PCM16, parse_codec, bridge_available, bandwidth_by_codec
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,13 +32,27 @@ logger = logging.getLogger(__name__)
 
 realtime_bp = Blueprint('realtime', __name__)
 
+# Server VAD ends a turn after this much silence; the silence gate's hangover must outlast it
+VAD_SILENCE_MS = 500
+
+REALTIME_URL = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01"
+
 class OpenAIRealtimeProxy:
-    def __init__(self, api_key):
+    def __init__(self, api_key, socketio=None, binary_audio=False, client_sid=None, silence_gate=False,
+                 sample_rate=SAMPLE_RATE, codec=PCM16):
         self.api_key = api_key
+        self.socketio = socketio
+        self.binary_audio = binary_audio
+        # Client and upstream codecs; the gate and coalescer see PCM16 at codec.rate
+        self.codec = CodecBridge(codec, client_rate=sample_rate)
+        self.gate = SilenceGate(VAD_SILENCE_MS, sample_rate=self.codec.rate) if silence_gate and gate_available() else None
         self.openai_ws = None
-        self.client_sid = None
+        self.send_queue = None
+        self.coalescer = None
+        self.turns = TurnManager(client_sid or 'proxy', server_vad=True)
+        self.instructions = InstructionSync(client_sid or 'proxy')
+        self.client_sid = client_sid
         self.conversation_history = []
-        self.asked_questions = set()
         self.current_phase = 'initial'
         
         # Cardiological question phases
@@ -67,6 +95,9 @@ class OpenAIRealtimeProxy:
                 "Ervaart u veel stress?"
             ]
         }
+        
+        # Asked questions as canonical IDs; keeps the prompt flat over long consultations
+        self.question_memory = QuestionMemory(self.question_phases)
     
     async def connect_to_openai(self):
         """Connect to OpenAI Realtime API"""
@@ -76,14 +107,18 @@ class OpenAIRealtimeProxy:
                 'OpenAI-Beta': 'realtime=v1'
             }
             
-            uri = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01"
-            
-            self.openai_ws = await websockets.connect(uri, extra_headers=headers)
+            self.openai_ws = await websockets.connect(REALTIME_URL, extra_headers=headers)
             logger.info("Connected to OpenAI Realtime API")
             
             # Send session configuration
             await self.send_session_config()
             
+            # Everything after the session config goes through one ordered writer
+            send_queue = SendQueue(self.client_sid, encode_audio=self.codec.to_upstream)
+            send_queue.start(self.openai_ws.send)
+            self.coalescer = AudioCoalescer(send_queue.put_audio, sample_rate=self.codec.rate)
+            self.send_queue = send_queue
+            
             return True
             
         except Exception as e:
@@ -92,14 +127,18 @@ class OpenAIRealtimeProxy:
     
     async def send_session_config(self):
         """Send session configuration to OpenAI"""
+        instructions = self.get_system_instructions()
+        self.instructions.reset()
+        self.instructions.changed(instructions)
+        
         config = {
             "type": "session.update",
             "session": {
                 "modalities": ["text", "audio"],
-                "instructions": self.get_system_instructions(),
+                "instructions": instructions,
                 "voice": "alloy",
-                "input_audio_format": "pcm16",
-                "output_audio_format": "pcm16",
+                "input_audio_format": self.codec.upstream_codec,
+                "output_audio_format": self.codec.upstream_codec,
                 "input_audio_transcription": {
                     "model": "whisper-1"
                 },
@@ -107,7 +146,7 @@ class OpenAIRealtimeProxy:
                     "type": "server_vad",
                     "threshold": 0.5,
                     "prefix_padding_ms": 300,
-                    "silence_duration_ms": 500
+                    "silence_duration_ms": VAD_SILENCE_MS
                 },
                 "temperature": 0.7,
                 "max_response_output_tokens": 4096
@@ -118,71 +157,93 @@ class OpenAIRealtimeProxy:
         logger.info("Session configuration sent")
     
     def get_system_instructions(self):
-        """Get system instructions for the AI"""
-        asked_questions_list = list(self.asked_questions)
-        next_questions = self.get_next_questions()
-        
-        return f"""Je bent een ervaren Nederlandse cardioloog die een systematische anamnese afneemt.
-
-BELANGRIJKE REGELS:
-1. Stel NOOIT dezelfde vraag twee keer
-2. Houd bij welke vragen je al hebt gesteld
-3. Stel één vraag per keer
-4. Wees empathisch en professioneel
-5. Spreek Nederlands
-
-REEDS GESTELDE VRAGEN (NIET HERHALEN):
-{', '.join(asked_questions_list)}
-
-HUIDIGE FASE: {self.current_phase}
-
-VOLGENDE VRAGEN OM TE STELLEN (kies er één die je nog NIET hebt gesteld):
-{chr(10).join(next_questions)}
-
-Analyseer het antwoord van de patiënt, extraheer relevante medische informatie, en stel dan de meest logische vervolgvraag die je nog NIET hebt gesteld."""
+        """Get system instructions for the AI (memoized on phase and covered topics)"""
+        return render_proxy_instructions(
+            self.current_phase,
+            self.question_memory.summary(),
+            tuple(self.get_next_questions())
+        )
+    
+    def sync_instructions(self):
+        """Queue a session.update only when the rendered instructions changed"""
+        instructions = self.get_system_instructions()
+        if self.instructions.changed(instructions):
+            self.send_queue.put_event({
+                "type": "session.update",
+                "session": {
+                    "instructions": instructions
+                }
+            })
+    
+    def create_response(self):
+        """Request a response using the instructions already on the session"""
+        self.sync_instructions()
+        return self.send_queue.put_event({
+            "type": "response.create",
+            "response": {
+                "modalities": ["text", "audio"]
+            }
+        })
     
     def get_next_questions(self):
         """Get next questions for current phase"""
-        current_phase_questions = self.question_phases.get(self.current_phase, [])
-        return [q for q in current_phase_questions if q not in self.asked_questions]
+        return self.question_memory.remaining(self.current_phase)
     
     async def handle_openai_message(self, message):
         """Handle messages from OpenAI Realtime API"""
         try:
+            # Fast path: forward audio deltas without decoding the frame
+            if peek_event_type(message) == AUDIO_DELTA:
+                delta = extract_string(message, 'delta')
+                if delta is not None:
+                    self.forward_audio(delta)
+                    return
+            
             data = json.loads(message)
             message_type = data.get('type')
             
             logger.info(f"Received from OpenAI: {message_type}")
             
-            if message_type == 'response.text.done':
-                text = data.get('text', '')
+            if self.turns.on_event(message_type, data):
+                # Text that arrived mid-response gets its answer now
+                self.create_response()
+            
+            if message_type in ('response.text.done', 'response.audio_transcript.done'):
+                # Spoken answers only arrive as transcripts
+                text = data.get('text') or data.get('transcript', '')
                 if text:
-                    self.asked_questions.add(text)
+                    self.question_memory.record(text)
                     self.update_conversation_phase()
                     
+                    # Server VAD responses use the session instructions, keep them current
+                    if self.send_queue:
+                        self.sync_instructions()
+                    
                     # Send to client
                     if self.client_sid:
-                        emit('ai_response', {
+                        self.socketio.emit('ai_response', {
                             'text': text,
                             'phase': self.current_phase,
-                            'questions_asked': len(self.asked_questions)
+                            'questions_asked': self.question_memory.turns
                         }, room=self.client_sid)
             
             elif message_type == 'response.audio.delta':
                 # Forward audio to client
-                if self.client_sid and 'delta' in data:
-                    emit('audio_delta', {
-                        'audio': data['delta']
-                    }, room=self.client_sid)
+                if 'delta' in data:
+                    self.forward_audio(data['delta'])
+            
+            elif message_type == 'input_audio_buffer.speech_stopped':
+                if self.coalescer:
+                    self.coalescer.flush()
             
             elif message_type == 'response.audio.done':
                 if self.client_sid:
-                    emit('audio_done', {}, room=self.client_sid)
+                    self.socketio.emit('audio_done', {}, room=self.client_sid)
             
             elif message_type == 'error':
                 logger.error(f"OpenAI error: {data}")
                 if self.client_sid:
-                    emit('error', {
+                    self.socketio.emit('error', {
                         'message': data.get('error', {}).get('message', 'Unknown error')
                     }, room=self.client_sid)
                     
@@ -191,7 +252,7 @@ Analyseer het antwoord van de patiënt, extraheer relevante medische informatie,
     
     def update_conversation_phase(self):
         """Update conversation phase based on questions asked"""
-        total_questions = len(self.asked_questions)
+        total_questions = self.question_memory.turns
         
         if total_questions < 3:
             self.current_phase = 'symptoms'
@@ -204,151 +265,211 @@ Analyseer het antwoord van de patiënt, extraheer relevante medische informatie,
         else:
             self.current_phase = 'lifestyle'
     
-    async def send_audio_to_openai(self, audio_data):
-        """Send audio data to OpenAI"""
-        try:
-            message = {
-                "type": "input_audio_buffer.append",
-                "audio": audio_data
-            }
-            await self.openai_ws.send(json.dumps(message))
-            
-        except Exception as e:
-            logger.error(f"Error sending audio to OpenAI: {e}")
+    def forward_audio(self, delta):
+        """Model audio delta (base64) to the client in its codec"""
+        if not self.client_sid:
+            return
+        if self.codec.passthrough:
+            self.codec.count_passthrough(len(delta) * 3 // 4 - delta[-2:].count('='))
+            audio = encode_client_audio(delta, self.binary_audio)
+        else:
+            pcm = self.codec.to_client(self.codec.from_upstream(binascii.a2b_base64(delta)))
+            if not pcm:
+                return
+            audio = encode_client_pcm(pcm, self.binary_audio)
+        self.socketio.emit('audio_delta', {'audio': audio}, room=self.client_sid)
+    
+    def send_audio_to_openai(self, audio_data):
+        """Queue audio data for OpenAI"""
+        # Client codec and capture rate to the session's PCM16
+        audio = self.codec.from_client(decode_client_audio(audio_data))
+        if not audio:
+            return dict(self.send_queue.status(), buffered=True)
+        if self.gate:
+            audio = self.gate.process(audio)
+            if not audio:
+                return dict(self.send_queue.status(), gated=True)
+        self.coalescer.push(audio)
+        self.turns.note_audio()
+        return self.send_queue.status()
     
-    async def commit_audio_and_respond(self):
+    def commit_audio_and_respond(self):
         """Commit audio buffer and request response"""
-        try:
-            # Commit audio
-            commit_message = {
-                "type": "input_audio_buffer.commit"
-            }
-            await self.openai_ws.send(json.dumps(commit_message))
-            
-            # Request response
-            response_message = {
-                "type": "response.create",
-                "response": {
-                    "modalities": ["text", "audio"],
-                    "instructions": self.get_system_instructions()
-                }
-            }
-            await self.openai_ws.send(json.dumps(response_message))
-            
-        except Exception as e:
-            logger.error(f"Error committing audio: {e}")
+        # Commit audio, including the partially filled frame
+        if self.gate:
+            tail = self.gate.flush()
+            if tail:
+                self.coalescer.push(tail)
+        self.coalescer.flush()
+        
+        send_commit, send_create = self.turns.request_commit()
+        if not send_commit and not send_create:
+            # Server VAD already committed this turn and is responding
+            return dict(self.send_queue.status(), deduplicated=True)
+        
+        self.send_queue.put_event({
+            "type": "input_audio_buffer.commit"
+        })
+        
+        # Request response
+        return self.create_response()
     
-    async def send_text_to_openai(self, text):
+    def send_text_to_openai(self, text):
         """Send text message to OpenAI"""
-        try:
-            # Add conversation item
-            item_message = {
-                "type": "conversation.item.create",
-                "item": {
-                    "type": "message",
-                    "role": "user",
-                    "content": [{
-                        "type": "input_text",
-                        "text": text
-                    }]
-                }
-            }
-            await self.openai_ws.send(json.dumps(item_message))
-            
-            # Request response
-            response_message = {
-                "type": "response.create",
-                "response": {
-                    "modalities": ["text", "audio"],
-                    "instructions": self.get_system_instructions()
-                }
+        # Add conversation item
+        self.send_queue.put_event({
+            "type": "conversation.item.create",
+            "item": {
+                "type": "message",
+                "role": "user",
+                "content": [{
+                    "type": "input_text",
+                    "text": text
+                }]
             }
-            await self.openai_ws.send(json.dumps(response_message))
-            
-        except Exception as e:
-            logger.error(f"Error sending text to OpenAI: {e}")
+        })
+        
+        if not self.turns.request_response():
+            # A pending response picks up the new item; a running one is followed up on response.done
+            return dict(self.send_queue.status(), deduplicated=True)
+        
+        # Request response
+        return self.create_response()
     
     async def disconnect(self):
         """Disconnect from OpenAI"""
+        if self.coalescer:
+            # Nothing drains the queue after this; buffered microphone audio goes with it
+            self.coalescer.clear()
+        if self.send_queue:
+            await self.send_queue.stop()
         if self.openai_ws:
             await self.openai_ws.close()
             self.openai_ws = None
 
-# Global proxy instance
-proxy_instance = None
+# Live proxies by Socket.IO sid
+proxy_sessions = SessionRegistry('realtime-proxy')
+
+def _teardown_proxy(sid, proxy):
+    """Close the upstream side of a proxy leaving the registry"""
+    get_upstream_loop().submit(proxy.disconnect())
+
+proxy_sessions.on_remove.append(_teardown_proxy)
 
 def init_socketio(socketio):
     """Initialize SocketIO events"""
     
+    def connected_proxy(sid):
+        """Proxy for this sid with an open upstream, or None after emitting an error"""
+        proxy = proxy_sessions.get(sid)
+        if not proxy or not proxy.send_queue:
+            emit('error', {'message': 'Not connected to OpenAI'})
+            return None
+        return proxy
+    
     @socketio.on('connect_realtime')
     def handle_connect_realtime(data):
-        global proxy_instance
-        
         api_key = data.get('api_key')
         if not api_key:
             emit('error', {'message': 'API key is required'})
             return
         
-        # Create proxy instance
-        proxy_instance = OpenAIRealtimeProxy(api_key)
-        proxy_instance.client_sid = request.sid
+        sid = request.sid
+        
+        try:
+            sample_rate = parse_sample_rate(data.get('sample_rate')) or SAMPLE_RATE
+        except (TypeError, ValueError) as e:
+            emit('error', {'message': f'Invalid sample_rate: {e}'})
+            return
+        try:
+            codec = parse_codec(data.get('codec'))
+        except ValueError as e:
+            emit('error', {'message': f'Invalid codec: {e}'})
+            return
+        if not bridge_available(codec, sample_rate):
+            emit('error', {'message': f'Server cannot convert {codec} at {sample_rate} Hz, send pcm16 at {SAMPLE_RATE} Hz'})
+            return
+        
+        # Create proxy instance; a reconnect on the same sid replaces (and closes) the old one
+        proxy = OpenAIRealtimeProxy(api_key, socketio, binary_audio=bool(data.get('binary_audio')), client_sid=sid,
+                                    silence_gate=bool(data.get('silence_gate', GATE_ENABLED)), sample_rate=sample_rate,
+                                    codec=codec)
+        with proxy_sessions.lock_for(sid):
+            accepted, _ = proxy_sessions.add(sid, proxy)
+        if not accepted:
+            logger.warning(f"Session capacity reached, rejecting {sid}")
+            emit('error', {'message': 'Server is vol, probeer het later opnieuw'})
+            return
         
         # Connect to OpenAI in background
         async def connect():
-            success = await proxy_instance.connect_to_openai()
+            success = await proxy.connect_to_openai()
+            if proxy_sessions.get(sid) is not proxy:
+                # Client left (or reconnected) while the upstream was opening
+                await proxy.disconnect()
+                return
             if success:
-                emit('connected', {'message': 'Connected to OpenAI Realtime API'})
+                socketio.emit('connected', {
+                    'message': 'Connected to OpenAI Realtime API',
+                    'binary_audio': proxy.binary_audio,
+                    'sample_rate': proxy.codec.client_rate,
+                    'codec': proxy.codec.client_codec,
+                    'upstream_codec': proxy.codec.upstream_codec
+                }, room=sid)
                 
                 # Start listening for OpenAI messages
-                async for message in proxy_instance.openai_ws:
-                    await proxy_instance.handle_openai_message(message)
+                async for message in proxy.openai_ws:
+                    await proxy.handle_openai_message(message)
             else:
-                emit('error', {'message': 'Failed to connect to OpenAI Realtime API'})
+                proxy_sessions.remove(sid, proxy)
+                socketio.emit('error', {'message': 'Failed to connect to OpenAI Realtime API'}, room=sid)
         
-        # Run connection in event loop
-        asyncio.create_task(connect())
+        # Run connection on the shared upstream loop
+        get_upstream_loop().submit(connect())
     
     @socketio.on('send_audio')
     def handle_send_audio(data):
-        global proxy_instance
-        
-        if not proxy_instance or not proxy_instance.openai_ws:
-            emit('error', {'message': 'Not connected to OpenAI'})
+        proxy = connected_proxy(request.sid)
+        if not proxy:
             return
         
         audio_data = data.get('audio')
         if audio_data:
-            asyncio.create_task(proxy_instance.send_audio_to_openai(audio_data))
+            # Queue status doubles as the Socket.IO ack (backpressure signal)
+            with proxy_sessions.lock_for(request.sid):
+                return proxy.send_audio_to_openai(audio_data)
     
     @socketio.on('commit_audio')
     def handle_commit_audio():
-        global proxy_instance
-        
-        if not proxy_instance or not proxy_instance.openai_ws:
-            emit('error', {'message': 'Not connected to OpenAI'})
+        proxy = connected_proxy(request.sid)
+        if not proxy:
             return
         
-        asyncio.create_task(proxy_instance.commit_audio_and_respond())
+        with proxy_sessions.lock_for(request.sid):
+            return proxy.commit_audio_and_respond()
     
     @socketio.on('send_text')
     def handle_send_text(data):
-        global proxy_instance
-        
-        if not proxy_instance or not proxy_instance.openai_ws:
-            emit('error', {'message': 'Not connected to OpenAI'})
+        proxy = connected_proxy(request.sid)
+        if not proxy:
             return
         
         text = data.get('text')
         if text:
-            asyncio.create_task(proxy_instance.send_text_to_openai(text))
+            with proxy_sessions.lock_for(request.sid):
+                return proxy.send_text_to_openai(text)
     
     @socketio.on('disconnect')
     def handle_disconnect():
-        global proxy_instance
-        
-        if proxy_instance:
-            asyncio.create_task(proxy_instance.disconnect())
-            proxy_instance = None
+        # Teardown runs through the registry's on_remove hook
+        with proxy_sessions.lock_for(request.sid):
+            proxy_sessions.remove(request.sid)
+
+@realtime_bp.route('/sessions', methods=['GET'])
+def realtime_sessions():
+    """Session registry capacity statistics and bandwidth by codec"""
+    return jsonify(dict(proxy_sessions.snapshot(),
+                        bandwidth=bandwidth_by_codec(proxy.codec for _, proxy in proxy_sessions.items())))
 
 @realtime_bp.route('/test', methods=['GET'])
 def test_realtime():
@@ -357,7 +478,8 @@ def test_realtime():
         'status': 'Realtime API proxy is running',
         'endpoints': [
             'WebSocket: /socket.io/',
-            'Events: connect_realtime, send_audio, commit_audio, send_text'
+            'Events: connect_realtime, send_audio, commit_audio, send_text',
+            'GET /sessions'
         ]
     })
 
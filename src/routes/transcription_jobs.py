@@ -0,0 +1,127 @@
+"""
+Batch transcription API
+Submit many recordings at once, get a job id back and poll or stream the
+results while a bounded worker pool does the transcribing
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from flask import Blueprint, Response, request, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.routes.whisper import allowed_file, ALLOWED_EXTENSIONS
+from src.transcription.jobs import job_store, batch_runner, ITEM_FINISHED
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+jobs_bp = Blueprint('transcription_jobs', __name__)
+
+MAX_FILES = int(os.environ.get('WHISPER_BATCH_MAX_FILES', 200))
+STREAM_INTERVAL = float(os.environ.get('WHISPER_BATCH_STREAM_INTERVAL', 1))
+
+
+@jobs_bp.before_app_request
+def start_batch_runner():
+    # Resumes jobs left over from a previous run on the first request of each worker
+    batch_runner.start()
+
+
+@jobs_bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a batch transcription
+    Expects multipart/form-data with one or more 'audio' files
+    """
+    openai_api_key = os.getenv('OPENAI_API_KEY')
+    if not openai_api_key or openai_api_key == 'your_openai_api_key_here':
+        return jsonify({'error': 'OpenAI API key not configured'}), 503
+
+    files = [file for file in request.files.getlist('audio') if file.filename]
+    if not files:
+        return jsonify({'error': 'No audio files provided'}), 400
+    if len(files) > MAX_FILES:
+        return jsonify({'error': f'Too many files, maximum is {MAX_FILES} per job'}), 400
+
+    rejected = [file.filename for file in files if not allowed_file(file.filename)]
+    if rejected:
+        return jsonify({
+            'error': f'File type not allowed. Supported: {", ".join(ALLOWED_EXTENSIONS)}',
+            'rejected': rejected
+        }), 400
+
+    language = request.form.get('language', 'nl')
+    prompt = request.form.get('prompt', 'Dit is een medisch gesprek in het Nederlands.')
+
+    job_id = job_store.create_job(files, language, prompt)
+    batch_runner.notify()
+    logger.info(f"Queued batch transcription {job_id} with {len(files)} files")
+
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'total': len(files),
+        'status_url': f"{request.script_root}{request.path}/{job_id}",
+        'stream_url': f"{request.script_root}{request.path}/{job_id}/stream"
+    }), 202
+
+
+@jobs_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Worker pool and queue counters only; job ids are the sole key to their transcripts"""
+    return jsonify({
+        'workers': batch_runner.snapshot()
+    })
+
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Progress, throughput and the transcripts finished so far"""
+    job = job_store.job(job_id, items=request.args.get('items', '1') != '0')
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@jobs_bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel the items that haven't started yet"""
+    if job_store.job(job_id, items=False) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    cancelled = job_store.cancel(job_id)
+    return jsonify({'job_id': job_id, 'cancelled': cancelled})
+
+
+@jobs_bp.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """Server-sent events: one 'item' per finished file, 'progress' updates, then 'done'"""
+    if job_store.job(job_id, items=False) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def events():
+        sent = set()
+        last_progress = None
+        while True:
+            job = job_store.job(job_id)
+            for item in job['items']:
+                if item['status'] in ITEM_FINISHED and item['id'] not in sent:
+                    sent.add(item['id'])
+                    yield f"event: item\ndata: {json.dumps(item)}\n\n"
+
+            job.pop('items')
+            if job['finished_at']:
+                yield f"event: done\ndata: {json.dumps(job)}\n\n"
+                return
+            if job['counts'] != last_progress:
+                last_progress = job['counts']
+                yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+            time.sleep(STREAM_INTERVAL)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
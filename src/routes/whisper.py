@@ -1,9 +1,14 @@
 import os
-import tempfile
+import sys
 import logging
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
-from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.transcription.clients import get_openai_client, client_stats
+from src.transcription.cache import transcription_cache
+from src.transcription.normalize import normalization_stats
+from src.transcription.transcribe import transcribe_upload
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -90,51 +95,24 @@ def transcribe_audio():
 
         # For production deployment with OpenAI Whisper API
         try:
-            # Initialize OpenAI client with API key
-            client = OpenAI(api_key=openai_api_key)
+            # Shared client for this key; reuses pooled keep-alive connections
+            client = get_openai_client(openai_api_key)
             
-            # Create a temporary file to save the uploaded audio
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-                file.save(temp_file.name)
-                temp_file_path = temp_file.name
-
-            try:
-                # Call OpenAI Whisper API
-                with open(temp_file_path, 'rb') as audio_file:
-                    logger.info(f"Calling Whisper API with file: {temp_file_path}")
-                    transcript_response = client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language=language,
-                        prompt=prompt
-                    )
-
-                # Extract transcript from response
-                transcript = transcript_response.text
-                
-                # Log the full response for debugging
-                logger.info(f"Whisper API response: {transcript_response}")
-                
-                # Whisper doesn't provide confidence scores in the API response
-                # We'll estimate based on transcript length and content
-                confidence = estimate_confidence(transcript)
-
-                logger.info(f"Transcription successful: '{transcript}' (confidence: {confidence})")
-
-                return jsonify({
-                    'transcript': transcript,
-                    'confidence': confidence,
-                    'language': language,
-                    'mode': 'production'
-                }), 200
-
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(temp_file_path)
-                except OSError as e:
-                    logger.error(f"Error removing temporary file: {e}")
-                    pass
+            # Long recordings go up in parallel segments, short ones in one cached call
+            result = transcribe_upload(client, file, language, prompt)
+
+            # Whisper doesn't provide confidence scores in the API response
+            # We'll estimate based on transcript length and content
+            confidence = estimate_confidence(result['transcript'])
+
+            logger.info(f"Transcription successful: '{result['transcript']}' (confidence: {confidence})")
+
+            return jsonify(dict(
+                result,
+                confidence=confidence,
+                language=language,
+                mode='production'
+            )), 200
 
         except ImportError as e:
             logger.warning(f"OpenAI package not available: {e}, using demo mode")
@@ -216,8 +194,7 @@ def whisper_health():
     api_key_configured = bool(openai_api_key and openai_api_key != 'your_openai_api_key_here')
     
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=openai_api_key if api_key_configured else "test")
+        import openai
         openai_available = True
     except ImportError:
         openai_available = False
@@ -228,6 +205,9 @@ def whisper_health():
         'api_key_configured': api_key_configured,
         'openai_available': openai_available,
         'supported_formats': list(ALLOWED_EXTENSIONS),
-        'mode': 'production' if (api_key_configured and openai_available) else 'demo'
+        'mode': 'production' if (api_key_configured and openai_available) else 'demo',
+        'http_pool': client_stats(),
+        'cache': transcription_cache.snapshot(),
+        'normalization': normalization_stats()
     }), 200
 
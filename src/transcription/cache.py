@@ -0,0 +1,204 @@
+"""
+Content-addressed cache for Whisper transcriptions
+Entries are keyed by a hash of (audio bytes, model, language, prompt), evicted
+by LRU size and TTL, optionally persisted as one JSON file per key so worker
+processes share them; identical concurrent requests share one upstream call
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK = 1024 * 1024
+
+
+class _InFlight:
+    """Result slot for an upstream call other requests are waiting on"""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TranscriptionCache:
+    """LRU/TTL cache with in-flight request coalescing"""
+
+    def __init__(self, max_entries=None, ttl=None, directory=None, wait_timeout=None):
+        self.max_entries = max_entries or int(os.environ.get('WHISPER_CACHE_ENTRIES', 512))
+        self.ttl = ttl or float(os.environ.get('WHISPER_CACHE_TTL', 3600))
+        # Unset keeps the cache in memory only
+        self.directory = directory if directory is not None else os.environ.get('WHISPER_CACHE_DIR')
+        self.wait_timeout = wait_timeout or float(os.environ.get('WHISPER_CACHE_WAIT_TIMEOUT', 120))
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+        self.stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expired': 0,
+            'errors': 0
+        }
+
+    def key(self, stream, language, prompt, model='whisper-1'):
+        """Content hash of an upload stream; the stream is rewound afterwards"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{model}\0{language}\0{prompt}\0".encode('utf-8'))
+        stream.seek(0)
+        while True:
+            block = stream.read(HASH_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+        stream.seek(0)
+        return digest.hexdigest()
+
+    def _get_memory(self, key, now):
+        """Caller holds the lock"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if now - stored_at > self.ttl:
+            del self.entries[key]
+            self.stats['expired'] += 1
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def _store_memory(self, key, value, stored_at):
+        """Caller holds the lock"""
+        self.entries[key] = (stored_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _get_disk(self, key, now):
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        try:
+            if now - os.path.getmtime(path) > self.ttl:
+                os.unlink(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store_disk(self, key, value):
+        if not self.directory:
+            return
+        try:
+            # Write-then-rename so other workers never read half a file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'value': value}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            logger.error(f"Failed to persist transcription cache entry: {e}")
+
+    def get(self, key):
+        """Cached value or None"""
+        now = time.time()
+        with self.lock:
+            value = self._get_memory(key, now)
+        if value is not None:
+            return value
+
+        value = self._get_disk(key, now)
+        if value is not None:
+            with self.lock:
+                self.stats['disk_hits'] += 1
+                self._store_memory(key, value, now)
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self._store_memory(key, value, time.time())
+        self._store_disk(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Cached value, or compute() once for all concurrent callers; returns (value, source)"""
+        value = self.get(key)
+        if value is not None:
+            with self.lock:
+                self.stats['hits'] += 1
+            return value, 'hit'
+
+        with self.lock:
+            # The leader may have finished between get() and here
+            value = self._get_memory(key, time.time())
+            if value is not None:
+                self.stats['hits'] += 1
+                return value, 'hit'
+
+            flight = self.inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.inflight[key] = _InFlight()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            if flight.event.wait(self.wait_timeout) and flight.error is None:
+                return flight.value, 'coalesced'
+            if flight.error is not None:
+                raise flight.error
+            # Leader is stuck; don't keep the patient waiting on it
+            return compute(), 'miss'
+
+        try:
+            value = compute()
+            flight.value = value
+            self.put(key, value)
+            return value, 'miss'
+        except Exception as e:
+            # Failures are shared with waiters but never cached
+            flight.error = e
+            with self.lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            flight.event.set()
+
+    def snapshot(self):
+        """Counters for /api/whisper/health"""
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses'] + self.stats['coalesced']
+            return dict(
+                self.stats,
+                entries=len(self.entries),
+                in_flight=len(self.inflight),
+                max_entries=self.max_entries,
+                ttl=self.ttl,
+                persistent=bool(self.directory),
+                hit_rate=round((self.stats['hits'] + self.stats['coalesced']) / lookups, 3) if lookups else 0.0
+            )
+
+
+# Shared by every transcription route in this worker
+transcription_cache = TranscriptionCache()
@@ -0,0 +1,243 @@
+"""
+Long-recording transcription
+Recordings longer than WHISPER_CHUNK_THRESHOLD seconds are cut near the
+quietest point around every WHISPER_CHUNK_SECONDS, each segment padded with
+WHISPER_CHUNK_OVERLAP seconds of its neighbours, transcribed in parallel and
+stitched back with the words repeated across the overlap removed. WAV is read
+with the stdlib; other containers are decoded with ffmpeg when it is installed,
+and only when they are big enough to possibly be long. The decoded audio is
+handed on to normalize_upload, so a recording is decoded once either way
+"""
+
+import io
+import logging
+import os
+import re
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from src.audio_dsp import speech_rms
+from src.transcription.cache import transcription_cache
+from src.transcription.normalize import TARGET_RATE, compact_pcm, ffmpeg_pcm
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SECONDS = float(os.environ.get('WHISPER_CHUNK_SECONDS', 120))
+CHUNK_THRESHOLD = float(os.environ.get('WHISPER_CHUNK_THRESHOLD', 180))
+CHUNK_OVERLAP = float(os.environ.get('WHISPER_CHUNK_OVERLAP', 1.0))
+# How far either side of the target cut to look for a pause
+CHUNK_SEARCH = float(os.environ.get('WHISPER_CHUNK_SEARCH', 10))
+CHUNK_CONCURRENCY = int(os.environ.get('WHISPER_CHUNK_CONCURRENCY', 4))
+# Whisper rejects uploads over 25 MB; segments stay under this
+SEGMENT_MAX_BYTES = int(os.environ.get('WHISPER_SEGMENT_MAX_BYTES', 20 * 1024 * 1024))
+STITCH_WORDS = int(os.environ.get('WHISPER_STITCH_WORDS', 12))
+# Lowest bitrate a compressed upload is assumed to have; anything smaller than
+# CHUNK_THRESHOLD seconds at this rate is short without decoding it
+MIN_KBPS = float(os.environ.get('WHISPER_CHUNK_MIN_KBPS', 16))
+
+FRAME_MS = 30
+DECODE_RATE = TARGET_RATE
+
+
+class WavSource:
+    """PCM frames of a WAV upload, read in place"""
+
+    def __init__(self, stream):
+        self.wav = wave.open(stream, 'rb')
+        self.rate = self.wav.getframerate()
+        self.channels = self.wav.getnchannels()
+        self.width = self.wav.getsampwidth()
+        self.frames = self.wav.getnframes()
+
+    def read(self, start, count):
+        self.wav.setpos(start)
+        return self.wav.readframes(count)
+
+
+class RawSource:
+    """16 kHz mono PCM16 decoded by ffmpeg into a spooled file"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.rate = DECODE_RATE
+        self.channels = 1
+        self.width = 2
+        stream.seek(0, os.SEEK_END)
+        self.frames = stream.tell() // 2
+
+    def read(self, start, count):
+        self.stream.seek(start * 2)
+        return self.stream.read(count * 2)
+
+
+def _is_wav(filename):
+    return filename.lower().endswith('.wav')
+
+
+def _decode_with_ffmpeg(stream, filename):
+    """RawSource for a compressed upload, or None without ffmpeg"""
+    pcm = ffmpeg_pcm(stream, filename, max_memory=SEGMENT_MAX_BYTES)
+    return RawSource(pcm) if pcm is not None else None
+
+
+def _may_be_long(stream):
+    """False when the upload is too small to last CHUNK_THRESHOLD at MIN_KBPS"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size > CHUNK_THRESHOLD * MIN_KBPS * 1000 / 8
+
+
+def open_audio(stream, filename):
+    """PCM source for the upload, or None when it is short for sure or can't be read here (stream rewound)
+
+    WAV headers are read in place; other formats are decoded only past the size
+    bound. Pass the result to is_long, and to normalize_upload when it isn't
+    """
+    source = None
+    if _is_wav(filename):
+        try:
+            source = WavSource(stream)
+        except (wave.Error, EOFError) as e:
+            logger.warning(f"Could not read {filename} as WAV: {e}")
+    elif _may_be_long(stream):
+        source = _decode_with_ffmpeg(stream, filename)
+    stream.seek(0)
+    return source
+
+
+def is_long(source):
+    """Whether an opened upload is long enough to split"""
+    return source is not None and source.frames / source.rate > CHUNK_THRESHOLD
+
+
+def find_cut(source, target):
+    """Frame index of the quietest 30 ms near target; the nearest one wins ties"""
+    if source.width != 2:
+        return target
+    frame = int(source.rate * FRAME_MS / 1000)
+    search = int(source.rate * CHUNK_SEARCH)
+    start = max(0, target - search)
+    window = source.read(start, min(source.frames, target + search) - start)
+    step = frame * source.channels * 2
+
+    best, best_score = target, None
+    for offset in range(0, len(window) - step + 1, step):
+        position = start + offset // (source.channels * 2)
+        score = (speech_rms(window[offset:offset + step], stride=2), abs(position + frame // 2 - target))
+        if best_score is None or score < best_score:
+            best, best_score = position + frame // 2, score
+    return best
+
+
+def plan_segments(source):
+    """[(start_frame, end_frame)] covering the recording, overlapping by CHUNK_OVERLAP"""
+    bytes_per_second = source.rate * source.channels * source.width
+    budget = (SEGMENT_MAX_BYTES - 44) / bytes_per_second - 2 * CHUNK_OVERLAP - CHUNK_SEARCH
+    # Cuts must move forward even when the pause search is wide
+    seconds = max(2 * CHUNK_SEARCH, min(CHUNK_SECONDS, budget))
+    length = int(seconds * source.rate)
+    overlap = int(CHUNK_OVERLAP * source.rate)
+
+    cuts = [0]
+    while source.frames - cuts[-1] > length + int(CHUNK_SEARCH * source.rate):
+        cuts.append(find_cut(source, cuts[-1] + length))
+    cuts.append(source.frames)
+
+    return [(max(0, cuts[i] - overlap), min(source.frames, cuts[i + 1] + overlap)) for i in range(len(cuts) - 1)]
+
+
+def _encode_wav(source, pcm):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(source.channels)
+        wav.setsampwidth(source.width)
+        wav.setframerate(source.rate)
+        wav.writeframes(pcm)
+    buffer.seek(0)
+    return buffer
+
+
+def _normalize(word):
+    return re.sub(r'\W+', '', word.lower())
+
+
+def _overlap_words(previous, incoming):
+    """Number of leading incoming words that repeat the end of previous"""
+    tail = [_normalize(w) for w in previous[-STITCH_WORDS:]]
+    head = [_normalize(w) for w in incoming[:STITCH_WORDS]]
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            # A single short word ("de", "en") repeats by chance too often
+            if size == 1 and len(head[0]) < 4:
+                return 0
+            return size
+    return 0
+
+
+def stitch(texts):
+    """Join segment transcripts, dropping words repeated across the overlap"""
+    words = []
+    for text in texts:
+        incoming = (text or '').split()
+        if words and incoming:
+            incoming = incoming[_overlap_words(words, incoming):]
+        words.extend(incoming)
+    return ' '.join(words)
+
+
+def transcribe_long_audio(client, source, filename, language, prompt):
+    """Transcribe segments in parallel; returns transcript, per-segment timing and totals"""
+    plan = plan_segments(source)
+    read_lock = threading.Lock()
+    base = os.path.splitext(filename)[0] or 'audio'
+
+    def transcribe_segment(index):
+        start, end = plan[index]
+        with read_lock:
+            pcm = source.read(start, end - start)
+        # Segments go up as 16 kHz mono when NumPy is available
+        compact = compact_pcm(pcm, source.rate, source.channels, source.width)
+        extension, audio = compact if compact is not None else ('.wav', _encode_wav(source, pcm))
+        size = len(audio.getbuffer())
+        cache_key = transcription_cache.key(audio, language, prompt)
+
+        def call_whisper():
+            return client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(f"{base}-{index:03d}{extension}", audio),
+                language=language,
+                prompt=prompt
+            ).text
+
+        started = time.perf_counter()
+        text, source_label = transcription_cache.get_or_compute(cache_key, call_whisper)
+        return text, {
+            'index': index,
+            'start': round(start / source.rate, 2),
+            'end': round(end / source.rate, 2),
+            'bytes': size,
+            'seconds': round(time.perf_counter() - started, 3),
+            'cache': source_label
+        }
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(CHUNK_CONCURRENCY, len(plan))) as pool:
+        results = list(pool.map(transcribe_segment, range(len(plan))))
+    wall = time.perf_counter() - started
+
+    upstream = sum(segment['seconds'] for _, segment in results)
+    logger.info(f"Transcribed {filename} in {len(plan)} segments: {wall:.1f}s wall, {upstream:.1f}s upstream")
+    return {
+        'transcript': stitch([text for text, _ in results]),
+        'duration': round(source.frames / source.rate, 2),
+        'segments': [segment for _, segment in results],
+        'timing': {
+            'wall_seconds': round(wall, 3),
+            'upstream_seconds': round(upstream, 3),
+            'speedup': round(upstream / wall, 2) if wall else None,
+            'concurrency': min(CHUNK_CONCURRENCY, len(plan))
+        }
+    }
@@ -0,0 +1,96 @@
+"""
+Process-wide OpenAI clients, one per API key
+Each client owns a keep-alive httpx connection pool, so transcriptions reuse
+warm TLS connections instead of handshaking on every request. OpenAI clients
+are thread-safe; handlers on any thread share them.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.environ.get('OPENAI_HTTP_MAX_CONNECTIONS', 20))
+MAX_KEEPALIVE = int(os.environ.get('OPENAI_HTTP_MAX_KEEPALIVE', 10))
+KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_HTTP_KEEPALIVE_EXPIRY', 60))
+CONNECT_TIMEOUT = float(os.environ.get('OPENAI_HTTP_CONNECT_TIMEOUT', 5))
+# Whisper on a long clip can take a while; reads get the full budget
+REQUEST_TIMEOUT = float(os.environ.get('OPENAI_HTTP_TIMEOUT', 120))
+MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 2))
+
+_clients = {}
+_lock = threading.Lock()
+_pid = None
+
+
+def key_id(api_key):
+    """Loggable stand-in for an API key"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+def _create_client(api_key, base_url):
+    # Imported lazily so callers keep their ImportError fallback to demo mode
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+    )
+    kwargs = {'api_key': api_key, 'http_client': http_client, 'max_retries': MAX_RETRIES}
+    if base_url:
+        kwargs['base_url'] = base_url
+    logger.info(f"Created pooled OpenAI client for key {key_id(api_key)}")
+    return OpenAI(**kwargs)
+
+
+def get_openai_client(api_key, base_url=None):
+    """Shared OpenAI client for api_key, created on first use"""
+    global _pid
+    cache_key = (api_key, base_url)
+    if _pid == os.getpid():
+        client = _clients.get(cache_key)
+        if client is not None:
+            return client
+
+    with _lock:
+        if _pid != os.getpid():
+            # Pooled sockets of a parent process must not be shared after fork
+            _clients.clear()
+            _pid = os.getpid()
+        client = _clients.get(cache_key)
+        if client is None:
+            client = _clients[cache_key] = _create_client(api_key, base_url)
+        return client
+
+
+def close_clients():
+    """Close every pooled client (shutdown, tests)"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.error(f"Error closing OpenAI client: {e}")
+
+
+def client_stats():
+    """Pooled clients and their limits"""
+    with _lock:
+        keys = [key_id(api_key) for api_key, _ in _clients]
+    return {
+        'clients': len(keys),
+        'keys': keys,
+        'max_connections': MAX_CONNECTIONS,
+        'max_keepalive': MAX_KEEPALIVE,
+        'keepalive_expiry': KEEPALIVE_EXPIRY,
+        'timeout': REQUEST_TIMEOUT
+    }
@@ -0,0 +1,413 @@
+"""
+Batch transcription jobs
+Uploads are spooled to WHISPER_JOBS_DIR and tracked in a SQLite database next
+to them, so queued work survives restarts; a bounded pool of worker threads
+claims items from the database and runs them through the shared client and
+transcription cache, off the request threads
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+from src.transcription.clients import get_openai_client
+from src.transcription.transcribe import transcribe_stream
+from src.transcription.uploads import upload_filename
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.environ.get('WHISPER_JOBS_DIR', os.path.join(os.environ.get('UPLOAD_FOLDER', 'uploads'), 'jobs'))
+
+ITEM_QUEUED = 'queued'
+ITEM_RUNNING = 'running'
+ITEM_DONE = 'done'
+ITEM_FAILED = 'failed'
+ITEM_CANCELLED = 'cancelled'
+ITEM_FINISHED = (ITEM_DONE, ITEM_FAILED, ITEM_CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    language TEXT,
+    prompt TEXT,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT,
+    bytes INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner INTEGER,
+    claimed_at REAL,
+    finished_at REAL,
+    seconds REAL,
+    transcript TEXT,
+    cache TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS items_status ON items(status, id);
+CREATE INDEX IF NOT EXISTS items_job ON items(job_id, position);
+"""
+
+
+def transcribe_file(path, filename, language, prompt):
+    """Transcribe a spooled upload; returns (transcript, cache source)"""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key or api_key == 'your_openai_api_key_here':
+        raise RuntimeError('OpenAI API key not configured')
+    client = get_openai_client(api_key)
+    with open(path, 'rb') as stream:
+        # Whisper rejects files over 25 MB; long recordings go up in segments
+        result = transcribe_stream(client, stream, filename, language, prompt)
+    return result['transcript'], result.get('cache', 'chunked')
+
+
+class JobStore:
+    """SQLite-backed jobs and their items; safe across threads and worker processes"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or JOBS_DIR
+        self.path = os.path.join(self.directory, 'jobs.db')
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if not self.ready:
+            with self.lock:
+                if not self.ready:
+                    os.makedirs(self.directory, exist_ok=True)
+                    with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+                        # Readers (polling clients) don't block the workers' writes
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.executescript(SCHEMA)
+                    self.ready = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_job(self, files, language, prompt):
+        """Spool FileStorage uploads to disk and queue them; returns the job id"""
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.directory, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        rows = []
+        for position, file in enumerate(files):
+            filename = upload_filename(file.filename)
+            path = os.path.join(job_dir, f"{position:04d}-{filename}")
+            file.save(path)
+            rows.append((job_id, position, filename, path, os.path.getsize(path), ITEM_QUEUED))
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                'INSERT INTO jobs (id, language, prompt, total, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, language, prompt, len(rows), time.time())
+            )
+            conn.executemany(
+                'INSERT INTO items (job_id, position, filename, path, bytes, status) VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+        return job_id
+
+    def claim(self, owner):
+        """Oldest queued item with its job's settings, marked running; None when idle"""
+        with closing(self.connect()) as conn:
+            conn.isolation_level = None
+            # IMMEDIATE takes the write lock up front so two workers never claim the same row
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT items.*, jobs.language, jobs.prompt FROM items JOIN jobs ON jobs.id = items.job_id '
+                    'WHERE items.status = ? ORDER BY items.id LIMIT 1',
+                    (ITEM_QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    row = dict(row)
+                    row['attempts'] += 1
+                    now = time.time()
+                    conn.execute(
+                        'UPDATE items SET status = ?, owner = ?, claimed_at = ?, attempts = attempts + 1 WHERE id = ?',
+                        (ITEM_RUNNING, owner, now, row['id'])
+                    )
+                    conn.execute('UPDATE jobs SET started_at = COALESCE(started_at, ?) WHERE id = ?', (now, row['job_id']))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return row
+
+    def finish(self, item, status, seconds, transcript=None, cache=None, error=None):
+        with closing(self.connect()) as conn, conn:
+            now = time.time()
+            conn.execute(
+                'UPDATE items SET status = ?, finished_at = ?, seconds = ?, transcript = ?, cache = ?, error = ?, '
+                'path = CASE WHEN ? THEN NULL ELSE path END WHERE id = ?',
+                (status, now, seconds, transcript, cache, error, status in ITEM_FINISHED, item['id'])
+            )
+            self._close_if_finished(conn, item['job_id'], now)
+
+    def _close_if_finished(self, conn, job_id, now):
+        pending = conn.execute(
+            'SELECT COUNT(*) FROM items WHERE job_id = ? AND status IN (?, ?)',
+            (job_id, ITEM_QUEUED, ITEM_RUNNING)
+        ).fetchone()[0]
+        if not pending:
+            conn.execute('UPDATE jobs SET finished_at = COALESCE(finished_at, ?) WHERE id = ?', (now, job_id))
+
+    def recover(self, lease, stale_owner=None, max_attempts=None):
+        """Requeue items left running by a dead process (or stale_owner) or held past the lease
+
+        Items that already had max_attempts fail instead: a file that takes its
+        worker down with it would otherwise be claimed again forever
+        """
+        with closing(self.connect()) as conn, conn:
+            rows = conn.execute(
+                'SELECT id, job_id, path, owner, claimed_at, attempts FROM items WHERE status = ?', (ITEM_RUNNING,)
+            ).fetchall()
+            now = time.time()
+            stale = [row for row in rows
+                     if row['owner'] == stale_owner or not _pid_alive(row['owner']) or now - (row['claimed_at'] or 0) > lease]
+            exhausted = [row for row in stale if max_attempts and row['attempts'] >= max_attempts]
+            requeued = [row['id'] for row in stale if row not in exhausted]
+            conn.executemany('UPDATE items SET status = ?, owner = NULL WHERE id = ?', [(ITEM_QUEUED, i) for i in requeued])
+            conn.executemany(
+                'UPDATE items SET status = ?, owner = NULL, finished_at = ?, error = ?, path = NULL WHERE id = ?',
+                [(ITEM_FAILED, now, f"Interrupted after {row['attempts']} attempts", row['id']) for row in exhausted]
+            )
+            for job_id in {row['job_id'] for row in exhausted}:
+                self._close_if_finished(conn, job_id, now)
+        for row in exhausted:
+            remove_quietly(row['path'])
+        if requeued:
+            logger.info(f"Requeued {len(requeued)} interrupted transcription items")
+        if exhausted:
+            logger.error(f"Failed {len(exhausted)} transcription items interrupted {max_attempts} times")
+        return len(stale)
+
+    def cancel(self, job_id):
+        """Cancel the job's queued items; running ones complete. Returns the number cancelled"""
+        with closing(self.connect()) as conn, conn:
+            paths = [row['path'] for row in conn.execute(
+                'SELECT path FROM items WHERE job_id = ? AND status = ?', (job_id, ITEM_QUEUED)
+            )]
+            now = time.time()
+            conn.execute(
+                'UPDATE items SET status = ?, finished_at = ?, path = NULL WHERE job_id = ? AND status = ?',
+                (ITEM_CANCELLED, now, job_id, ITEM_QUEUED)
+            )
+            self._close_if_finished(conn, job_id, now)
+        for path in paths:
+            remove_quietly(path)
+        return len(paths)
+
+    def job(self, job_id, items=True):
+        """Job summary with progress and throughput, or None"""
+        with closing(self.connect()) as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            item_rows = conn.execute(
+                'SELECT id, position, filename, bytes, status, attempts, seconds, transcript, cache, error '
+                'FROM items WHERE job_id = ? ORDER BY position',
+                (job_id,)
+            ).fetchall()
+        return summarize(dict(row), [dict(r) for r in item_rows], items)
+
+    def queue_depth(self):
+        with closing(self.connect()) as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM items GROUP BY status').fetchall())
+
+
+def summarize(job, items, include_items=True):
+    counts = {status: 0 for status in (ITEM_QUEUED, ITEM_RUNNING) + ITEM_FINISHED}
+    for item in items:
+        counts[item['status']] += 1
+    finished = [item for item in items if item['status'] == ITEM_DONE]
+    processed = counts[ITEM_DONE] + counts[ITEM_FAILED] + counts[ITEM_CANCELLED]
+
+    if counts[ITEM_QUEUED] or counts[ITEM_RUNNING]:
+        status = 'running' if job['started_at'] else 'queued'
+    elif counts[ITEM_CANCELLED]:
+        status = 'cancelled'
+    elif counts[ITEM_FAILED] == job['total']:
+        status = 'failed'
+    elif counts[ITEM_FAILED]:
+        status = 'completed_with_errors'
+    else:
+        status = 'completed'
+
+    elapsed = None
+    if job['started_at']:
+        elapsed = (job['finished_at'] or time.time()) - job['started_at']
+    done_bytes = sum(item['bytes'] for item in finished)
+
+    summary = {
+        'job_id': job['id'],
+        'status': status,
+        'language': job['language'],
+        'total': job['total'],
+        'counts': counts,
+        'progress': round(processed / job['total'], 3) if job['total'] else 1.0,
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'elapsed_seconds': round(elapsed, 2) if elapsed is not None else None,
+        'throughput': {
+            'files_per_minute': round(counts[ITEM_DONE] * 60 / elapsed, 2) if elapsed else 0.0,
+            'bytes_per_second': round(done_bytes / elapsed) if elapsed else 0,
+            'avg_item_seconds': round(sum(item['seconds'] or 0 for item in finished) / len(finished), 3) if finished else None
+        }
+    }
+    if include_items:
+        summary['items'] = items
+    return summary
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_quietly(path):
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class BatchRunner:
+    """Bounded pool of worker threads draining the job store"""
+
+    def __init__(self, store, transcribe=None, workers=None, poll_interval=None, lease=None, max_attempts=None):
+        self.store = store
+        self.transcribe = transcribe or transcribe_file
+        self.workers = workers or int(os.environ.get('WHISPER_BATCH_WORKERS', 4))
+        # Picks up jobs submitted to other worker processes
+        self.poll_interval = poll_interval or float(os.environ.get('WHISPER_BATCH_POLL', 2))
+        self.lease = lease or float(os.environ.get('WHISPER_BATCH_LEASE', 900))
+        self.max_attempts = max_attempts or int(os.environ.get('WHISPER_BATCH_ATTEMPTS', 2))
+        self.wakeup = threading.Event()
+        self.threads = []
+        self.pid = None
+        self.lock = threading.Lock()
+        self.recovered_at = 0.0
+
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        """Start the workers (once per worker process) and resume interrupted jobs"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            # A restarted container can reuse our pid; nothing is ours before the workers start
+            self.store.recover(self.lease, stale_owner=self.pid, max_attempts=self.max_attempts)
+            self.recovered_at = time.monotonic()
+            self.threads = [
+                threading.Thread(target=self.work, name=f"batch-transcribe-{n}", daemon=True)
+                for n in range(self.workers)
+            ]
+            for thread in self.threads:
+                thread.start()
+        logger.info(f"Batch transcription started with {self.workers} workers")
+
+    def notify(self):
+        self.wakeup.set()
+
+    def work(self):
+        while True:
+            try:
+                item = self.store.claim(os.getpid())
+            except sqlite3.Error as e:
+                logger.error(f"Failed to claim transcription item: {e}")
+                item = None
+            if item is None:
+                self.recover_abandoned()
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            try:
+                self.process(item)
+            except Exception as e:
+                # The store failed while recording the outcome; recover() requeues the item after the lease
+                logger.error(f"Transcription worker error on {item['filename']}: {e}")
+
+    def recover_abandoned(self):
+        """Now and then, pick up items from worker processes that died mid-job"""
+        with self.lock:
+            if time.monotonic() - self.recovered_at < self.poll_interval * 30:
+                return
+            self.recovered_at = time.monotonic()
+        try:
+            self.store.recover(self.lease, max_attempts=self.max_attempts)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to recover transcription items: {e}")
+
+    def process(self, item):
+        with self.lock:
+            self.busy += 1
+        started = time.perf_counter()
+        try:
+            transcript, source = self.transcribe(item['path'], item['filename'], item['language'], item['prompt'])
+            self.store.finish(item, ITEM_DONE, time.perf_counter() - started, transcript=transcript, cache=source)
+            remove_quietly(item['path'])
+            with self.lock:
+                self.processed += 1
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            if item['attempts'] < self.max_attempts:
+                logger.warning(f"Transcription of {item['filename']} failed, retrying: {e}")
+                self.store.finish(item, ITEM_QUEUED, elapsed, error=str(e))
+                with self.lock:
+                    self.retried += 1
+            else:
+                logger.error(f"Transcription of {item['filename']} failed: {e}")
+                self.store.finish(item, ITEM_FAILED, elapsed, error=str(e))
+                remove_quietly(item['path'])
+                with self.lock:
+                    self.failed += 1
+        finally:
+            with self.lock:
+                self.busy -= 1
+
+    def snapshot(self):
+        with self.lock:
+            stats = {
+                'workers': self.workers,
+                'alive': sum(thread.is_alive() for thread in self.threads),
+                'busy': self.busy,
+                'processed': self.processed,
+                'failed': self.failed,
+                'retried': self.retried
+            }
+        stats['queue'] = self.store.queue_depth()
+        return stats
+
+
+job_store = JobStore()
+batch_runner = BatchRunner(job_store)
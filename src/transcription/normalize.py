@@ -0,0 +1,293 @@
+"""
+Upload normalization before Whisper
+Decodes the upload (WAV with the stdlib, other containers with ffmpeg when it
+is installed), downmixes to mono, resamples to 16 kHz with a NumPy polyphase
+filter, trims leading and trailing silence and re-encodes compactly (Opus
+when ffmpeg is available, else 16 kHz mono PCM16 WAV). Whisper works at 16 kHz
+mono internally, so nothing it uses is lost; the original is sent whenever the
+result would not be smaller, and Opus uploads that are already at a low bitrate
+are sent as they are without re-encoding
+"""
+
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src.audio_dsp import filter_bank
+
+logger = logging.getLogger(__name__)
+
+TARGET_RATE = 16000
+NORMALIZE = os.environ.get('WHISPER_NORMALIZE', '1') != '0'
+TRIM_DBFS = float(os.environ.get('WHISPER_TRIM_DBFS', -45))
+# Kept either side of the speech so onsets and trailing consonants survive
+TRIM_PAD = float(os.environ.get('WHISPER_TRIM_PAD', 0.25))
+CODEC = os.environ.get('WHISPER_NORMALIZE_CODEC', 'opus')
+OPUS_BITRATE = os.environ.get('WHISPER_OPUS_BITRATE', '24k')
+# Opus uploads (browser recordings) at or below this many kbit/s go up untouched;
+# re-encoding them saves little and costs a generation of quality
+PASSTHROUGH_KBPS = float(os.environ.get('WHISPER_PASSTHROUGH_KBPS', 32))
+PASSTHROUGH_EXTENSIONS = ('.webm', '.ogg', '.opus')
+
+RESAMPLE_BLOCK = 65536
+TRIM_FRAME_MS = 20
+
+_stats_lock = threading.Lock()
+_stats = {
+    'uploads': 0,
+    'normalized': 0,
+    'skipped': 0,
+    'passthrough': 0,
+    'bytes_in': 0,
+    'bytes_out': 0,
+    'trimmed_seconds': 0.0,
+    'processing_ms': 0.0
+}
+
+
+def available():
+    return NORMALIZE and np is not None
+
+
+def resample(samples, src_rate, dst_rate=TARGET_RATE):
+    """Polyphase resampling of mono float32 samples"""
+    if src_rate == dst_rate or not len(samples):
+        return samples
+    bank, offsets = filter_bank(src_rate, dst_rate)
+    phases, taps = bank.shape
+    half = taps // 2
+    padded = np.concatenate([np.zeros(half, np.float32), samples, np.zeros(half + 1, np.float32)])
+    count = len(samples) * dst_rate // src_rate
+    out = np.empty(count, np.float32)
+
+    for start in range(0, count, RESAMPLE_BLOCK):
+        n = np.arange(start, min(count, start + RESAMPLE_BLOCK), dtype=np.int64)
+        # Exact input position n * src / dst as integer part + phase
+        position = n * src_rate
+        base = position // dst_rate
+        phase = (position % dst_rate) * phases // dst_rate
+        taps_at = padded[(base + half)[:, None] + offsets[None, :]]
+        out[start:start + len(n)] = np.einsum('ij,ij->i', taps_at, bank[phase])
+    return out
+
+
+def pcm_to_float(pcm, width, channels):
+    """Interleaved PCM bytes to float32 [frames, channels] in [-1, 1]"""
+    if width == 1:
+        samples = (np.frombuffer(pcm, np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(pcm, '<i2').astype(np.float32) / 32768
+    elif width == 3:
+        raw = np.frombuffer(pcm, np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)) << 8 >> 8).astype(np.float32) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(pcm, '<i4').astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported sample width {width}")
+    return samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+
+
+def downmix(frames):
+    channels = frames.shape[1]
+    if channels == 1:
+        return frames[:, 0]
+    # A matrix-vector product is several times faster than mean() over the short axis
+    return frames @ np.full(channels, 1 / channels, np.float32)
+
+
+def ffmpeg_pcm(stream, filename, max_memory=16 * 1024 * 1024):
+    """16 kHz mono PCM16 of a compressed upload in a spooled file (rewound), or None
+
+    The one ffmpeg decode for uploads; long recordings read their segments from it
+    """
+    if not shutil.which('ffmpeg'):
+        return None
+    # Containers like m4a need a seekable input, so ffmpeg reads from a file
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1]) as source:
+        stream.seek(0)
+        shutil.copyfileobj(stream, source)
+        source.flush()
+        pcm = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        result = subprocess.run(
+            ['ffmpeg', '-v', 'error', '-i', source.name, '-ac', '1', '-ar', str(TARGET_RATE), '-f', 's16le', 'pipe:1'],
+            stdout=pcm, stderr=subprocess.PIPE
+        )
+    stream.seek(0)
+    if result.returncode != 0:
+        logger.error(f"ffmpeg could not decode {filename}: {result.stderr.decode('utf-8', 'replace')[:200]}")
+        pcm.close()
+        return None
+    pcm.seek(0)
+    return pcm
+
+
+def decode(stream, filename):
+    """(float32 [frames, channels], rate) or None if the format can't be decoded here"""
+    stream.seek(0)
+    if filename.lower().endswith('.wav'):
+        try:
+            with wave.open(stream, 'rb') as wav:
+                pcm = wav.readframes(wav.getnframes())
+                return pcm_to_float(pcm, wav.getsampwidth(), wav.getnchannels()), wav.getframerate()
+        except (wave.Error, EOFError, ValueError) as e:
+            logger.warning(f"Could not decode {filename} as WAV: {e}")
+            return None
+        finally:
+            stream.seek(0)
+
+    pcm = ffmpeg_pcm(stream, filename)
+    if pcm is None:
+        return None
+    with pcm:
+        return pcm_to_float(pcm.read(), 2, 1), TARGET_RATE
+
+
+def trim_silence(samples, rate):
+    """Drop leading and trailing audio below TRIM_DBFS, keeping TRIM_PAD around the speech"""
+    frame = int(rate * TRIM_FRAME_MS / 1000)
+    usable = len(samples) - len(samples) % frame
+    if not usable:
+        return samples
+    energy = np.sqrt(np.mean(np.square(samples[:usable].reshape(-1, frame)), axis=1))
+    voiced = np.flatnonzero(energy > 10 ** (TRIM_DBFS / 20))
+    if not len(voiced):
+        # All quiet: leave it to Whisper rather than upload nothing
+        return samples
+    pad = int(rate * TRIM_PAD)
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def to_pcm16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+def encode(samples, rate=TARGET_RATE):
+    """(extension, bytes): Opus in Ogg via ffmpeg when configured and present, else PCM16 WAV"""
+    pcm = to_pcm16(samples)
+    if CODEC == 'opus' and shutil.which('ffmpeg'):
+        result = subprocess.run(
+            ['ffmpeg', '-v', 'error', '-f', 's16le', '-ar', str(rate), '-ac', '1', '-i', 'pipe:0',
+             '-c:a', 'libopus', '-b:a', OPUS_BITRATE, '-application', 'voip', '-f', 'ogg', 'pipe:1'],
+            input=pcm, capture_output=True
+        )
+        if result.returncode == 0 and result.stdout:
+            return '.ogg', result.stdout
+        logger.warning("Opus encoding failed, sending WAV")
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm)
+    return '.wav', buffer.getvalue()
+
+
+def compact_pcm(pcm, rate, channels, width):
+    """16 kHz mono encoding of raw PCM (a long-recording segment), or None without NumPy"""
+    if not available():
+        return None
+    samples = resample(downmix(pcm_to_float(pcm, width, channels)), rate)
+    extension, data = encode(samples)
+    return extension, io.BytesIO(data)
+
+
+def normalize_upload(stream, filename, source=None):
+    """(filename, stream, stats) to send to Whisper; the original when normalizing doesn't pay
+
+    source is the upload already opened by chunking.open_audio; its PCM is used
+    instead of decoding the upload a second time
+    """
+    stream.seek(0, os.SEEK_END)
+    input_bytes = stream.tell()
+    stream.seek(0)
+    stats = {'applied': False, 'input_bytes': input_bytes, 'output_bytes': input_bytes}
+    if not available():
+        return filename, stream, stats
+
+    started = time.perf_counter()
+    opus = os.path.splitext(filename)[1].lower() in PASSTHROUGH_EXTENSIONS
+    if source is not None and opus and _low_bitrate(input_bytes, source.frames / source.rate):
+        # Already compact; the shared decode told us how long it is
+        return _passthrough(filename, stream, stats, started)
+
+    if source is not None:
+        decoded = pcm_to_float(source.read(0, source.frames), source.width, source.channels), source.rate
+        # A WAV source reads the upload itself
+        stream.seek(0)
+    else:
+        decoded = decode(stream, filename)
+    if decoded is None:
+        _record(stats, started)
+        return filename, stream, stats
+
+    frames, rate = decoded
+    if opus and _low_bitrate(input_bytes, len(frames) / rate):
+        return _passthrough(filename, stream, stats, started)
+    mono = resample(downmix(frames), rate)
+    trimmed = trim_silence(mono, TARGET_RATE)
+    extension, data = encode(trimmed)
+
+    stats.update({
+        'input_rate': rate,
+        'input_channels': frames.shape[1],
+        'input_seconds': round(len(frames) / rate, 2) if rate else 0,
+        'output_seconds': round(len(trimmed) / TARGET_RATE, 2),
+        'codec': extension.lstrip('.')
+    })
+    if len(data) < input_bytes:
+        stats.update({'applied': True, 'output_bytes': len(data)})
+        filename = f"{os.path.splitext(filename)[0] or 'audio'}{extension}"
+        stream = io.BytesIO(data)
+    _record(stats, started)
+    return filename, stream, stats
+
+
+def _low_bitrate(input_bytes, seconds):
+    return seconds > 0 and input_bytes * 8 / seconds / 1000 <= PASSTHROUGH_KBPS
+
+
+def _passthrough(filename, stream, stats, started):
+    """Send the upload unchanged without re-encoding it"""
+    stats['passthrough'] = True
+    _record(stats, started)
+    return filename, stream, stats
+
+
+def _record(stats, started):
+    stats['ms'] = round((time.perf_counter() - started) * 1000, 1)
+    with _stats_lock:
+        _stats['uploads'] += 1
+        _stats['normalized' if stats['applied'] else 'skipped'] += 1
+        if stats.get('passthrough'):
+            _stats['passthrough'] += 1
+        _stats['bytes_in'] += stats['input_bytes']
+        _stats['bytes_out'] += stats['output_bytes']
+        if stats['applied']:
+            _stats['trimmed_seconds'] += stats['input_seconds'] - stats['output_seconds']
+        _stats['processing_ms'] += stats['ms']
+
+
+def normalization_stats():
+    """Counters for the health endpoints"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['enabled'] = available()
+    stats['codec'] = CODEC if shutil.which('ffmpeg') else 'wav'
+    stats['byte_reduction'] = round(1 - stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else 0.0
+    stats['trimmed_seconds'] = round(stats['trimmed_seconds'], 2)
+    stats['processing_ms'] = round(stats['processing_ms'], 1)
+    return stats
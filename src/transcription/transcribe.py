@@ -0,0 +1,57 @@
+"""
+One transcription path for uploads and batch items
+Long recordings are split at pauses and transcribed in parallel; anything
+shorter is normalized and sent in one Whisper call through the transcription
+cache. Every /transcribe route and the batch workers go through here
+"""
+
+import logging
+
+from src.transcription.cache import transcription_cache
+from src.transcription.chunking import open_audio, is_long, transcribe_long_audio
+from src.transcription.normalize import normalize_upload
+from src.transcription.uploads import upload_payload, upload_in_memory
+
+logger = logging.getLogger(__name__)
+
+
+def transcribe_stream(client, stream, filename, language, prompt):
+    """Transcribe a seekable audio stream; returns a dict with at least 'transcript'
+
+    Chunked results carry chunked=True plus segments and duration, single
+    calls carry 'cache' (how the transcription cache served it)
+    """
+    # Decoded once here (only when it could be long) and reused by normalize_upload
+    audio = open_audio(stream, filename)
+    if is_long(audio):
+        result = transcribe_long_audio(client, audio, filename, language, prompt)
+        logger.info(f"Chunked transcription successful: {len(result['segments'])} segments, {result['duration']}s")
+        return dict(result, chunked=True)
+
+    cache_key = transcription_cache.key(stream, language, prompt)
+
+    def call_whisper():
+        # Mono 16 kHz, silence trimmed, compactly encoded; the original if that isn't smaller
+        upload_name, upload_stream, normalized = normalize_upload(stream, filename, audio)
+        logger.info(f"Calling Whisper API with {upload_name} "
+                    f"({normalized['input_bytes']} -> {normalized['output_bytes']} bytes)")
+        transcript_response = client.audio.transcriptions.create(
+            model="whisper-1",
+            file=(upload_name, upload_stream),
+            language=language,
+            prompt=prompt
+        )
+        # Log the full response for debugging
+        logger.info(f"Whisper API response: {transcript_response}")
+        return transcript_response.text
+
+    # Re-sent clips come from the cache; identical concurrent uploads share one call
+    transcript, cache_source = transcription_cache.get_or_compute(cache_key, call_whisper)
+    return {'transcript': transcript, 'cache': cache_source}
+
+
+def transcribe_upload(client, file_storage, language, prompt):
+    """Transcribe an uploaded FileStorage as parsed, without copying it to disk first"""
+    filename, stream = upload_payload(file_storage)
+    logger.info(f"Transcribing {filename} ({'memory' if upload_in_memory(file_storage) else 'spooled'})")
+    return transcribe_stream(client, stream, filename, language, prompt)
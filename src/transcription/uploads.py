@@ -0,0 +1,57 @@
+"""
+Upload handling for transcription requests
+Uploads up to WHISPER_UPLOAD_MEMORY_BYTES stay in memory, larger ones spool
+to disk; either way the parsed stream goes to the OpenAI client as-is, with no
+tempfile save/reopen in between
+"""
+
+import io
+import os
+import tempfile
+
+from flask import Request
+from werkzeug.utils import secure_filename
+
+UPLOAD_MEMORY_LIMIT = int(os.environ.get('WHISPER_UPLOAD_MEMORY_BYTES', 8 * 1024 * 1024))
+
+
+class UploadSpool(tempfile.SpooledTemporaryFile):
+    """SpooledTemporaryFile that remembers whether it rolled over to disk"""
+
+    on_disk = False
+
+    def rollover(self):
+        super().rollover()
+        self.on_disk = True
+
+
+class SpooledUploadRequest(Request):
+    """Request class whose file parts spool to disk only beyond UPLOAD_MEMORY_LIMIT"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(max_size=UPLOAD_MEMORY_LIMIT, mode='rb+')
+
+
+def upload_filename(filename):
+    """audio<ext> from the client's filename
+
+    Only the extension matters (it tells Whisper the container format); secure_filename
+    drops non-ASCII names down to "m4a" without the dot, so it only sees the suffix
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    return secure_filename(f"audio{extension}")
+
+
+def upload_payload(file_storage):
+    """(filename, stream) tuple for client.audio.transcriptions.create; the stream is not copied"""
+    stream = file_storage.stream
+    stream.seek(0)
+    return upload_filename(file_storage.filename), stream
+
+
+def upload_in_memory(file_storage):
+    """Whether the upload never touched disk"""
+    stream = file_storage.stream
+    if isinstance(stream, UploadSpool):
+        return not stream.on_disk
+    return isinstance(stream, io.BytesIO)